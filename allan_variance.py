@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+# allan_variance.py - Allan variance of radiometer power series (streaming and offline)
+# The streaming estimator keeps a handful of block averages per octave of averaging time,
+# so it can run for the whole observation in O(log N) memory. The offline estimator works
+# on archived power series with cumulative sums.
+
+import argparse
+from datetime import datetime
+import numpy as np
+
+from dump_index import DumpIndex
+
+LEVEL_HISTORY = 4  # block averages kept per octave (enough for the half-overlap estimator)
+GAP_FACTOR = 10    # an interval this many times the median interval starts a new run
+
+
+class StreamingAllan:
+    """
+    Octave-spaced Allan variance estimator for a continuous stream.
+
+    Level k holds consecutive non-overlapping block averages of 2**k samples.
+    Each new level-k average updates the plain (non-overlapping) Allan sum at
+    tau = 2**k * tau0 and, from the last four level-k averages, a
+    half-overlapping Allan sum at tau = 2**(k+1) * tau0 (block pairs
+    advanced by tau/2), which has markedly lower variance than the
+    non-overlapping estimate. Pairs of averages are promoted to level k+1.
+
+    Parameters:
+    -----------
+    shape : tuple
+        Shape of each sample: () for total power, (n_chan,) for per-channel
+    max_levels : int
+        Number of octaves tracked (2**max_levels samples at the longest tau)
+    """
+
+    def __init__(self, shape=(), max_levels=32):
+        self.shape = tuple(shape)
+        self.max_levels = max_levels
+        self._hist = np.zeros((max_levels, LEVEL_HISTORY) + self.shape, dtype=np.float64)
+        self._seen = np.zeros(max_levels, dtype=np.int64)
+        self._sq = np.zeros((max_levels,) + self.shape, dtype=np.float64)
+        self._n = np.zeros(max_levels, dtype=np.int64)
+        self._osq = np.zeros((max_levels,) + self.shape, dtype=np.float64)
+        self._on = np.zeros(max_levels, dtype=np.int64)
+        self.count = 0
+        self._t_first = None
+        self._t_last = None
+
+    def update(self, x, t=None):
+        """
+        Add one sample.
+
+        Parameters:
+        -----------
+        x : float or numpy.ndarray
+            Power sample of the configured shape
+        t : float, optional
+            Sample time in seconds; used to estimate the sample interval tau0
+        """
+        if t is not None:
+            if self._t_first is None:
+                self._t_first = t
+            self._t_last = t
+        self.count += 1
+        self._push(0, np.asarray(x, dtype=np.float64))
+
+    def _push(self, k, x):
+        while k < self.max_levels:
+            hist = self._hist[k]
+            hist[:-1] = hist[1:]
+            hist[-1] = x
+            self._seen[k] += 1
+            seen = self._seen[k]
+            if seen >= 2:
+                d = hist[-1] - hist[-2]
+                self._sq[k] += d * d
+                self._n[k] += 1
+            if seen >= 4 and k + 1 < self.max_levels:
+                d = 0.5 * (hist[3] + hist[2] - hist[1] - hist[0])
+                self._osq[k + 1] += d * d
+                self._on[k + 1] += 1
+            if seen % 2:
+                return
+            x = 0.5 * (hist[-2] + hist[-1])
+            k += 1
+
+    def break_run(self):
+        """
+        Start a new contiguous run (after a gap in the data).
+
+        The accumulated Allan sums are kept; only the block averages are
+        dropped, so no difference spans the gap.
+        """
+        self._hist[:] = 0.0
+        self._seen[:] = 0
+
+    @property
+    def tau0(self):
+        """Mean sample interval in seconds (1.0 if no times were given)."""
+        if self._t_first is None or self.count < 2:
+            return 1.0
+        return (self._t_last - self._t_first) / (self.count - 1)
+
+    def result(self, overlapping=True):
+        """
+        Return the Allan variance at every populated octave.
+
+        Parameters:
+        -----------
+        overlapping : bool
+            Use the half-overlapping estimate where it exists (tau >= 2 tau0)
+
+        Returns:
+        --------
+        (numpy.ndarray, numpy.ndarray, numpy.ndarray)
+            tau in seconds, Allan variance (levels x sample shape) and the
+            number of differences behind each estimate
+        """
+        levels = np.flatnonzero(self._n)
+        sq = self._sq[levels].copy()
+        n = self._n[levels].copy()
+        if overlapping:
+            use = self._on[levels] > 0
+            sq[use] = self._osq[levels][use]
+            n[use] = self._on[levels][use]
+        nn = n.reshape((-1,) + (1,) * len(self.shape))
+        avar = sq / (2.0 * nn)
+        taus = self.tau0 * 2.0 ** levels
+        return taus, avar, n
+
+
+def allan_variance(x, m_list=None, overlapping=True):
+    """
+    Allan variance of a power series via cumulative sums.
+
+    Parameters:
+    -----------
+    x : numpy.ndarray
+        Series of shape (n_samples,) or (n_samples, n_chan)
+    m_list : sequence of int, optional
+        Averaging lengths in samples (default: octaves up to n_samples // 3)
+    overlapping : bool
+        Use every start sample (overlapping estimator) rather than
+        non-overlapping blocks
+
+    Returns:
+    --------
+    (numpy.ndarray, numpy.ndarray)
+        Averaging lengths and Allan variance of shape (len(m_list),) + x.shape[1:]
+    """
+    x = np.asarray(x, dtype=np.float64)
+    x = x - x.mean(axis=0)  # keeps the cumulative sum well conditioned
+    n = x.shape[0]
+    if m_list is None:
+        m_list = 2 ** np.arange(int(np.log2(max(n // 3, 1))) + 1)
+    m_list = np.asarray([m for m in m_list if 2 * m < n], dtype=np.int64)
+    csum = np.zeros((n + 1,) + x.shape[1:], dtype=np.float64)
+    np.cumsum(x, axis=0, out=csum[1:])
+    avar = np.empty((len(m_list),) + x.shape[1:], dtype=np.float64)
+    for i, m in enumerate(m_list):
+        avg = (csum[m:] - csum[:-m]) / m
+        if not overlapping:
+            avg = avg[::m]
+            d = avg[1:] - avg[:-1]
+        else:
+            d = avg[m:] - avg[:-m]
+        avar[i] = 0.5 * np.mean(d * d, axis=0)
+    return m_list, avar
+
+
+def optimal_tau(taus, avar):
+    """
+    Averaging time at which the Allan deviation stops falling.
+
+    Beyond this tau gain drifts dominate over radiometer noise, so it is the
+    longest useful integration (dump) time. Works per channel for 2-D avar.
+    """
+    idx = np.argmin(avar, axis=0)
+    return np.asarray(taus)[idx]
+
+
+def allan_variance_runs(x, runs, m_list=None, overlapping=True):
+    """
+    Allan variance of a series made of separate contiguous runs.
+
+    Each run is analysed on its own and the estimates are combined weighted
+    by their number of differences, so no difference spans a gap.
+
+    Parameters:
+    -----------
+    x : numpy.ndarray
+        Series of shape (n_samples,) or (n_samples, n_chan)
+    runs : list of slice
+        Contiguous runs of x (see split_runs)
+    m_list : sequence of int, optional
+        Averaging lengths in samples (default: octaves up to the longest run // 3)
+
+    Returns:
+    --------
+    (numpy.ndarray, numpy.ndarray)
+        Averaging lengths with at least one estimate and their Allan variance
+    """
+    longest = max((r.stop - r.start for r in runs), default=0)
+    if m_list is None:
+        m_list = 2 ** np.arange(int(np.log2(max(longest // 3, 1))) + 1)
+    m_list = np.asarray(m_list, dtype=np.int64)
+    total = np.zeros((len(m_list),) + np.shape(x)[1:], dtype=np.float64)
+    count = np.zeros(len(m_list), dtype=np.int64)
+    for r in runs:
+        n = r.stop - r.start
+        m_run, avar = allan_variance(x[r], m_list=m_list, overlapping=overlapping)
+        if not len(m_run):
+            continue
+        k = np.searchsorted(m_list, m_run)
+        nd = n - 2 * m_run + 1 if overlapping else n // m_run - 1
+        total[k] += avar * nd.reshape((-1,) + (1,) * (avar.ndim - 1))
+        count[k] += nd
+    keep = count > 0
+    return m_list[keep], total[keep] / count[keep].reshape((-1,) + (1,) * (total.ndim - 1))
+
+
+def split_runs(times, gap_factor=GAP_FACTOR):
+    """
+    Cut a time series into contiguous runs.
+
+    Returns:
+    --------
+    (list of slice, float)
+        Runs, split where an interval exceeds gap_factor times the median
+        interval, and the median interval (tau0) in seconds
+    """
+    if len(times) < 2:
+        return [slice(0, len(times))], 1.0
+    dt = np.diff(times)
+    tau0 = float(np.median(dt))
+    cuts = np.flatnonzero(dt > gap_factor * tau0) + 1
+    edges = np.concatenate([[0], cuts, [len(times)]])
+    return [slice(int(a), int(b)) for a, b in zip(edges[:-1], edges[1:])], tau0
+
+
+def load_power_series(dump_dir="LIVE_DISPLAY_DUMP", t_start=None, t_stop=None):
+    """
+    Load the archived per-frame power between two times from live dumps.
+
+    Records come from the dump index, so legacy dump_*.npz files, their daily
+    shards and dump segments are all included.
+
+    Returns:
+    --------
+    (numpy.ndarray, numpy.ndarray, DumpIndex, slice)
+        Frame times in seconds since the first frame, total power, the index
+        and the index slice of the frames (for channel_allan)
+    """
+    index = DumpIndex(dump_dir)
+    index.update()
+    sl = index.range(t_start, t_stop)
+    times = np.asarray(index.time_us[sl]) / 1e6
+    power = np.asarray(index.power[sl])
+    if len(times):
+        times = times - times[0]
+    return times, power, index, sl
+
+
+def channel_allan(index, sl, runs, overlapping=True):
+    """
+    Fractional per-channel Allan variance of the stored spectra, streamed.
+
+    Spectra are read one at a time into a StreamingAllan, which restarts at
+    every run boundary and at frames stored without a spectrum, so memory
+    does not depend on the number of frames.
+
+    Returns:
+    --------
+    (numpy.ndarray, numpy.ndarray, int)
+        Averaging lengths in frames (octaves), Allan variance of shape
+        (n_lengths, n_bins) normalised by the squared channel mean, and the
+        number of spectra used
+    """
+    starts = {sl.start + r.start for r in runs}
+    allan = None
+    total = None
+    prev = None
+    for row, _, fft in index.iter_spectra(sl, with_rows=True):
+        p = np.abs(fft) ** 2
+        if allan is None:
+            allan = StreamingAllan(shape=p.shape)
+            total = np.zeros(p.shape, dtype=np.float64)
+        elif row in starts or row != prev + 1:
+            allan.break_run()
+        allan.update(p)
+        total += p
+        prev = row
+    if allan is None or allan.count < 4:
+        return np.zeros(0, dtype=np.int64), None, 0 if allan is None else allan.count
+    m, avar, _ = allan.result(overlapping)
+    mean = total / allan.count
+    return np.round(m).astype(np.int64), avar / np.where(mean > 0, mean, np.nan) ** 2, allan.count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Allan variance of archived radiometer power')
+    parser.add_argument('--dump-dir', default='LIVE_DISPLAY_DUMP', help='Directory of live dumps')
+    parser.add_argument('--start', help='Start time (YYYY-MM-DD HH:MM:SS, default: first record)')
+    parser.add_argument('--stop', help='Stop time (YYYY-MM-DD HH:MM:SS, default: last record)')
+    parser.add_argument('--channels', action='store_true', help='Also analyse every spectral channel')
+    parser.add_argument('--non-overlapping', action='store_true', help='Use the non-overlapping estimator')
+    parser.add_argument('--plot', action='store_true', help='Plot the Allan deviation')
+    args = parser.parse_args()
+
+    try:
+        t_start, t_stop = (datetime.strptime(v, "%Y-%m-%d %H:%M:%S") if v else None
+                           for v in (args.start, args.stop))
+    except ValueError:
+        parser.error("times must be given as YYYY-MM-DD HH:MM:SS")
+    times, power, index, sl = load_power_series(args.dump_dir, t_start, t_stop)
+    if len(power) < 4:
+        print("Not enough frames for an Allan variance.")
+        return
+    runs, tau0 = split_runs(times)
+    overlapping = not args.non_overlapping
+
+    m, avar = allan_variance_runs(power / np.mean(power), runs, overlapping=overlapping)
+    if not len(m):
+        print("No run is long enough for an Allan variance.")
+        return
+    taus = m * tau0
+    print(f"{len(power)} frames in {len(runs)} runs, median interval {tau0:.4f} s")
+    print(f"{'tau (s)':>12} {'ADEV (frac)':>14}")
+    for tau, a in zip(taus, avar):
+        print(f"{tau:12.3f} {np.sqrt(a):14.6e}")
+    print(f"Optimal integration time (total power): {optimal_tau(taus, avar):.3f} s")
+
+    if args.channels:
+        m_ch, avar_ch, n_spec = channel_allan(index, sl, runs, overlapping)
+        if avar_ch is None or not len(m_ch):
+            print("Not enough frames with spectra for the per-channel analysis.")
+        else:
+            if n_spec < len(power):
+                print(f"{len(power) - n_spec} frames have no stored spectrum; "
+                      f"per-channel analysis uses the other {n_spec}")
+            tau_ch = optimal_tau(m_ch * tau0, avar_ch)
+            print(f"Per-channel optimal integration time: median {np.median(tau_ch):.3f} s, "
+                  f"min {np.min(tau_ch):.3f} s, max {np.max(tau_ch):.3f} s")
+
+    if args.plot:
+        import matplotlib.pyplot as plt
+        plt.figure()
+        plt.loglog(taus, np.sqrt(avar), 'o-', label='Measured')
+        plt.loglog(taus, np.sqrt(avar[0]) * (taus / taus[0]) ** -0.5, '--', label=r'$\tau^{-1/2}$')
+        plt.xlabel("Averaging time (s)")
+        plt.ylabel("Allan deviation (fractional)")
+        plt.title("Radiometer Stability")
+        plt.legend()
+        plt.grid(True, which='both')
+        plt.show()
+
+
+if __name__ == '__main__':
+    main()
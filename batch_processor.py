@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+# batch_processor.py - Resumable, multi-core batch processing of archived IF captures
+# A capture set is cut into per-file sample chunks, each chunk is processed by a task
+# function in a process pool and its result saved as a checkpoint .npz named after the
+# chunk and the task parameters. Re-running the same command skips every chunk that
+# already has a checkpoint, so a crash or Ctrl+C only loses the chunks in flight.
+# Results are reassembled in time order, e.g. into a SpectrogramStore.
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import importlib
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import numpy as np
+
+from r3f_reader import R3FReader
+from capture_index import suffix_time, CAPTURE_EXTS
+
+CHECKPOINT_DIR = "chunks"
+PLAN_NAME = "plan.json"
+
+
+def fft_power_task(path, start, count, t0, window_size=1024, sample_rate=None):
+    """
+    Power spectra of consecutive windows of one chunk (as fft_r3a.py computes them).
+
+    Returns:
+    --------
+    dict
+        'times' (s, time of each window's first sample) and 'power' of
+        shape (n_windows, window_size // 2)
+    """
+    r = R3FReader(path)
+    fs = sample_rate or r.sample_rate
+    n = count // window_size
+    x = np.asarray(r.read(start, n * window_size), dtype=np.float32).reshape(n, window_size)
+    spec = np.fft.rfft(x, axis=1)[:, :window_size // 2]
+    power = (spec.real ** 2 + spec.imag ** 2).astype(np.float32)
+    times = t0 + np.arange(n) * (window_size / fs)
+    return {'times': times, 'power': power}
+
+
+def total_power_task(path, start, count, t0, block_size=65536, sample_rate=None):
+    """Mean square of consecutive blocks of one chunk: 'times' and 'power'."""
+    r = R3FReader(path)
+    fs = sample_rate or r.sample_rate
+    n = count // block_size
+    x = np.asarray(r.read(start, n * block_size), dtype=np.float64).reshape(n, block_size)
+    return {'times': t0 + np.arange(n) * (block_size / fs), 'power': np.mean(x * x, axis=1)}
+
+
+TASKS = {
+    'fft': fft_power_task,
+    'power': total_power_task,
+}
+
+
+def resolve_task(name):
+    """Task function from TASKS or a 'module:function' reference."""
+    if name in TASKS:
+        return TASKS[name]
+    module, _, func = name.partition(':')
+    if not func:
+        raise ValueError(f"Unknown task '{name}' (use one of {sorted(TASKS)} or module:function)")
+    return getattr(importlib.import_module(module), func)
+
+
+def plan_chunks(directory, chunk_samples, align=1):
+    """
+    Split every capture file of a directory into chunks.
+
+    Chunks never span files; each one starts on a multiple of `align`
+    samples and holds a multiple of `align` samples, so a trailing partial
+    window of a file is dropped. A chunk_samples shorter than one window is
+    raised to one window. Chunk times come from the file header or
+    file name, else from the running sample count across files.
+
+    Returns:
+    --------
+    list of dict
+        'path', 'start', 'count' and 't0' (time of the first sample) per chunk
+    """
+    chunk_samples = max(chunk_samples - chunk_samples % align, align)
+    chunks = []
+    t_run = 0.0
+    names = sorted(f for f in os.listdir(directory) if f.lower().endswith(CAPTURE_EXTS))
+    for name in names:
+        path = os.path.join(directory, name)
+        r = R3FReader(path)
+        fs = r.sample_rate
+        t_file = r.start_time
+        if t_file is None:
+            t_file = suffix_time(path)
+        if t_file is None:
+            t_file = t_run
+        usable = r.n_samples - r.n_samples % align
+        for s in range(0, usable, chunk_samples):
+            chunks.append({'path': path, 'start': s, 'count': min(chunk_samples, usable - s),
+                           't0': t_file + s / fs})
+        t_run = t_file + r.n_samples / fs
+    return chunks
+
+
+def _chunk_key(task_name, params, chunk):
+    # size and mtime make a capture rewritten under the same name miss its old checkpoints
+    st = os.stat(chunk['path'])
+    text = json.dumps([task_name, params, os.path.abspath(chunk['path']), st.st_size, st.st_mtime_ns,
+                       chunk['start'], chunk['count']], sort_keys=True)
+    return hashlib.sha1(text.encode()).hexdigest()[:20]
+
+
+def _run_chunk(task_name, params, chunk, out_path):
+    """Worker: process one chunk and save its checkpoint atomically."""
+    func = resolve_task(task_name)
+    result = func(chunk['path'], chunk['start'], chunk['count'], chunk['t0'], **params)
+    tmp = out_path + '.tmp.npz'
+    np.savez(tmp, **result)
+    os.replace(tmp, out_path)
+    return out_path
+
+
+class BatchProcessor:
+    """
+    Checkpointed process-pool execution of a task over a list of chunks.
+
+    Parameters:
+    -----------
+    work_dir : str
+        Directory for the plan and the per-chunk checkpoints
+    task_name : str
+        Key of TASKS or 'module:function'; the function is called as
+        func(path, start, count, t0, **params) and returns a dict of arrays
+    params : dict
+        JSON-serialisable task parameters (part of every checkpoint key)
+    """
+
+    def __init__(self, work_dir, task_name, params=None):
+        self.work_dir = work_dir
+        self.task_name = task_name
+        self.params = params or {}
+        resolve_task(task_name)  # fail early on a bad name
+        self.chunk_dir = os.path.join(work_dir, CHECKPOINT_DIR)
+        os.makedirs(self.chunk_dir, exist_ok=True)
+        self.chunks = []
+
+    def set_chunks(self, chunks):
+        """Use these chunks (in time order) and record the plan."""
+        self.chunks = list(chunks)
+        for c in self.chunks:
+            c['key'] = _chunk_key(self.task_name, self.params, c)
+        plan = {'task': self.task_name, 'params': self.params, 'chunks': self.chunks}
+        tmp = os.path.join(self.work_dir, PLAN_NAME + '.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(plan, f)
+        os.replace(tmp, os.path.join(self.work_dir, PLAN_NAME))
+
+    def checkpoint_path(self, chunk):
+        return os.path.join(self.chunk_dir, chunk['key'] + '.npz')
+
+    def pending(self):
+        return [c for c in self.chunks if not os.path.exists(self.checkpoint_path(c))]
+
+    def run(self, jobs=None, max_in_flight=None):
+        """
+        Process every chunk without a checkpoint.
+
+        At most max_in_flight chunks (default 2 per worker) are queued at a
+        time, so Ctrl+C stops promptly and only in-flight work is lost.
+
+        Returns:
+        --------
+        (int, int)
+            Chunks completed in this run and chunks that failed
+        """
+        todo = self.pending()
+        skipped = len(self.chunks) - len(todo)
+        if skipped:
+            print(f"Resuming: {skipped} of {len(self.chunks)} chunks already done")
+        if not todo:
+            return 0, 0
+        jobs = jobs or os.cpu_count() or 1
+        max_in_flight = max_in_flight or 2 * jobs
+        done = failed = 0
+        t_start = time.time()
+        pool = ProcessPoolExecutor(max_workers=jobs)
+        in_flight = {}
+        queue = iter(todo)
+        try:
+            while True:
+                while len(in_flight) < max_in_flight:
+                    c = next(queue, None)
+                    if c is None:
+                        break
+                    fut = pool.submit(_run_chunk, self.task_name, self.params, c, self.checkpoint_path(c))
+                    in_flight[fut] = c
+                if not in_flight:
+                    break
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    c = in_flight.pop(fut)
+                    try:
+                        fut.result()
+                        done += 1
+                    except Exception as e:
+                        failed += 1
+                        print(f"Chunk {os.path.basename(c['path'])}[{c['start']}:+{c['count']}] failed: {e}")
+                rate = done / max(time.time() - t_start, 1e-9)
+                print(f"\r{skipped + done}/{len(self.chunks)} chunks ({rate:.2f}/s)", end='', flush=True)
+        except KeyboardInterrupt:
+            print("\nInterrupted; completed chunks are kept, re-run to resume.")
+            for fut in in_flight:
+                fut.cancel()
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+        pool.shutdown()
+        print()
+        return done, failed
+
+    def results(self):
+        """Yield (chunk, result dict) for completed chunks in time order."""
+        for c in self.chunks:
+            path = self.checkpoint_path(c)
+            if not os.path.exists(path):
+                continue
+            with np.load(path) as d:
+                yield c, {k: d[k] for k in d.files}
+
+    def concatenate(self, key):
+        """One result field of all completed chunks, concatenated in time order."""
+        parts = [r[key] for _, r in self.results()]
+        return np.concatenate(parts) if parts else np.zeros(0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Resumable multi-core processing of an IF capture set')
+    parser.add_argument('directory', help='Capture directory (.r3f/.r3a files)')
+    parser.add_argument('work_dir', help='Directory for the plan and chunk checkpoints')
+    parser.add_argument('--task', default='fft', help=f"Task: {', '.join(TASKS)} or module:function")
+    parser.add_argument('--window', type=int, default=1024, help='FFT length (fft) or block size (power)')
+    parser.add_argument('--chunk-seconds', type=float, default=0.5, help='Capture time per chunk')
+    parser.add_argument('--jobs', type=int, help='Worker processes (default: all CPUs)')
+    parser.add_argument('--output', help='Reassemble fft results into this spectrogram store')
+    parser.add_argument('--restart', action='store_true', help='Discard existing checkpoints first')
+    args = parser.parse_args()
+
+    if args.chunk_seconds <= 0:
+        parser.error("--chunk-seconds must be positive")
+    if not os.path.isdir(args.directory):
+        print(f"Error: directory '{args.directory}' not found")
+        sys.exit(1)
+    if args.task == 'fft':
+        params = {'window_size': args.window}
+    elif args.task == 'power':
+        params = {'block_size': args.window}
+    else:
+        params = {}
+    bp = BatchProcessor(args.work_dir, args.task, params)
+    if args.restart:
+        for f in os.listdir(bp.chunk_dir):
+            os.remove(os.path.join(bp.chunk_dir, f))
+
+    fs = 112e6
+    names = sorted(f for f in os.listdir(args.directory) if f.lower().endswith(CAPTURE_EXTS))
+    if names:
+        fs = R3FReader(os.path.join(args.directory, names[0])).sample_rate
+    bp.set_chunks(plan_chunks(args.directory, int(args.chunk_seconds * fs), align=args.window))
+    print(f"{len(bp.chunks)} chunks from {len(names)} files")
+    try:
+        done, failed = bp.run(args.jobs)
+    except KeyboardInterrupt:
+        sys.exit(130)
+    print(f"Processed {done} chunks, {failed} failed")
+    if failed:
+        sys.exit(1)
+
+    if args.output and args.task == 'fft':
+        from spectrogram_store import SpectrogramStore
+        freqs = np.fft.rfftfreq(args.window, d=1 / fs)[:args.window // 2] / 1e6
+        with SpectrogramStore(args.output, mode='w', freqs=freqs,
+                              metadata={'source': os.path.abspath(args.directory), 'window_size': args.window,
+                                        'sample_rate': fs, 'time_unit': 's', 'freq_unit': 'MHz (IF)',
+                                        'quantity': 'power'}) as store:
+            for _, r in bp.results():
+                store.append(r['times'], r['power'])
+            print(f"Wrote {store.n_times} spectra to {args.output}")
+    elif args.output:
+        first = next(bp.results(), None)
+        keys = first[1].keys() if first else ()
+        np.savez(args.output, **{k: bp.concatenate(k) for k in keys})
+        print(f"Wrote {', '.join(keys)} of {len(bp.chunks)} chunks to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
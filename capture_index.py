@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+# capture_index.py - Persistent time index over a directory of IF capture files
+# Maps absolute time to (file, sample, byte offset) across a whole IFSTREAM capture set so
+# a time window can be read with a seek and a memory-mapped slice instead of a full scan.
+# The index lives next to the data and is updated incrementally as new files appear.
+
+import os
+import re
+import sys
+import argparse
+import calendar
+from datetime import datetime
+import numpy as np
+
+from r3f_reader import R3FReader
+
+INDEX_NAME = ".capture_index.npz"
+CAPTURE_EXTS = ('.r3f', '.r3a')
+# IFSSDFN_SUFFIX_TIMESTAMP file name suffix: -YYYY.MM.DD.hh.mm.ss.msec
+SUFFIX_RE = re.compile(r'-(\d{4})\.(\d{2})\.(\d{2})\.(\d{2})\.(\d{2})\.(\d{2})\.(\d{3})$')
+
+_SEG_FIELDS = ('seg_file', 'seg_t0_ns', 'seg_sample0', 'seg_nsamp', 'seg_rate')
+
+
+def suffix_time(path):
+    """POSIX time from a timestamp file-name suffix, or None."""
+    m = SUFFIX_RE.search(os.path.splitext(os.path.basename(path))[0])
+    if not m:
+        return None
+    y, mo, d, h, mi, s, ms = (int(v) for v in m.groups())
+    return calendar.timegm((y, mo, d, h, mi, s)) + ms * 1e-3
+
+
+def scan_file(path):
+    """
+    Split one capture file into contiguous time segments.
+
+    Framed files are split wherever the footer frame_id sequence has a gap,
+    with each segment timed by its first footer timestamp. Formatted files
+    form a single segment timed from the .r3h header, else the file name.
+
+    Returns:
+    --------
+    list of (t0_posix, first_sample, n_samples, sample_rate)
+    """
+    r = R3FReader(path)
+    if r.n_samples == 0:
+        return []
+    fs = r.sample_rate
+    if r.framed and r.header['time_sample_rate']:
+        times = r.frame_times()
+        gaps = r.check_frames()['gaps']
+        starts = np.concatenate([[0], gaps + 1])
+        stops = np.concatenate([gaps + 1, [r.n_frames]])
+        spf = r.samples_per_frame
+        return [(float(times[a]), int(a * spf), int((b - a) * spf), fs)
+                for a, b in zip(starts, stops)]
+    t0 = r.start_time
+    if t0 is None:
+        t0 = suffix_time(path)
+    return [(t0, 0, r.n_samples, fs)]
+
+
+class CaptureIndex:
+    """
+    Time index over all .r3f/.r3a files of one capture directory.
+
+    Parameters:
+    -----------
+    directory : str
+        Capture directory (the IFSTREAM_SetDiskFilePath output directory)
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.index_path = os.path.join(directory, INDEX_NAME)
+        self.files = []
+        self.file_stat = np.zeros((0, 2), dtype=np.int64)  # size, mtime_ns
+        for name in _SEG_FIELDS:
+            setattr(self, name, np.zeros(0, dtype=np.float64 if name == 'seg_rate' else np.int64))
+        self._readers = {}
+        if os.path.exists(self.index_path):
+            self._load()
+
+    def _load(self):
+        with np.load(self.index_path) as d:
+            self.files = list(d['files'])
+            self.file_stat = d['file_stat']
+            for name in _SEG_FIELDS:
+                setattr(self, name, d[name])
+
+    def save(self):
+        tmp = self.index_path + '.tmp.npz'
+        np.savez(tmp, files=np.array(self.files, dtype=str), file_stat=self.file_stat,
+                 **{name: getattr(self, name) for name in _SEG_FIELDS})
+        os.replace(tmp, self.index_path)
+
+    def update(self, save=True):
+        """
+        Scan files that are new or changed since the last update.
+
+        Only headers and footers are read. Files without any time information
+        are placed directly after the preceding file.
+
+        Returns:
+        --------
+        int
+            Number of files (re)scanned
+        """
+        names = sorted(f for f in os.listdir(self.directory) if f.lower().endswith(CAPTURE_EXTS))
+        stats = {}
+        for f in names:
+            st = os.stat(os.path.join(self.directory, f))
+            stats[f] = (st.st_size, st.st_mtime_ns)
+        known = {f: tuple(s) for f, s in zip(self.files, self.file_stat)}
+        changed = [f for f in names if known.get(f) != stats[f]]
+        removed = [f for f in self.files if f not in stats]
+        if not changed and not removed:
+            return 0
+
+        old_id = {f: i for i, f in enumerate(self.files)}
+        new_files = [f for f in self.files if f in stats and f not in changed] + changed
+        new_id = {f: i for i, f in enumerate(new_files)}
+        remap = np.full(len(self.files) + 1, -1, dtype=np.int64)
+        for f, i in old_id.items():
+            if f in stats and f not in changed:
+                remap[i] = new_id[f]
+        keep = remap[self.seg_file] >= 0 if len(self.seg_file) else np.zeros(0, dtype=bool)
+        segs = {name: list(getattr(self, name)[keep]) for name in _SEG_FIELDS}
+        segs['seg_file'] = list(remap[self.seg_file[keep]])
+
+        for f in changed:
+            for t0, s0, n, fs in scan_file(os.path.join(self.directory, f)):
+                if t0 is None:
+                    t0 = self._following_time(segs, new_files, f)
+                segs['seg_file'].append(new_id[f])
+                segs['seg_t0_ns'].append(int(round(t0 * 1e9)))
+                segs['seg_sample0'].append(s0)
+                segs['seg_nsamp'].append(n)
+                segs['seg_rate'].append(fs)
+            self._readers.pop(f, None)
+        for f in removed:
+            self._readers.pop(f, None)
+
+        order = np.argsort(np.asarray(segs['seg_t0_ns'], dtype=np.int64), kind='stable')
+        for name in _SEG_FIELDS:
+            dtype = np.float64 if name == 'seg_rate' else np.int64
+            setattr(self, name, np.asarray(segs[name], dtype=dtype)[order])
+        self.files = new_files
+        self.file_stat = np.array([stats[f] for f in new_files], dtype=np.int64).reshape(-1, 2)
+        if save:
+            self.save()
+        return len(changed)
+
+    @staticmethod
+    def _following_time(segs, files, name):
+        """Start time for an untimed file: end of the data in files sorting before it."""
+        end = 0.0
+        for fid, t0, n, fs in zip(segs['seg_file'], segs['seg_t0_ns'],
+                                  segs['seg_nsamp'], segs['seg_rate']):
+            if files[fid] < name:
+                end = max(end, t0 * 1e-9 + n / fs)
+        return end
+
+    # --- queries ---
+
+    @property
+    def start_time(self):
+        return self.seg_t0_ns[0] * 1e-9 if len(self.seg_t0_ns) else None
+
+    @property
+    def end_time(self):
+        if not len(self.seg_t0_ns):
+            return None
+        return float(np.max(self.seg_t0_ns * 1e-9 + self.seg_nsamp / self.seg_rate))
+
+    def _reader(self, fid):
+        name = self.files[fid]
+        r = self._readers.get(name)
+        if r is None:
+            if len(self._readers) > 32:
+                self._readers.clear()
+            r = self._readers[name] = R3FReader(os.path.join(self.directory, name))
+        return r
+
+    def locate(self, t):
+        """
+        Find the sample at POSIX time t.
+
+        Returns:
+        --------
+        (str, int, int) or None
+            File path, sample index within the file and byte offset of that
+            sample in the file; None if t falls outside every segment
+        """
+        t_ns = int(round(t * 1e9))
+        i = np.searchsorted(self.seg_t0_ns, t_ns, side='right') - 1
+        if i < 0:
+            return None
+        off = int(round((t_ns - self.seg_t0_ns[i]) * 1e-9 * self.seg_rate[i]))
+        if off >= self.seg_nsamp[i]:
+            return None
+        fid = int(self.seg_file[i])
+        sample = int(self.seg_sample0[i]) + off
+        r = self._reader(fid)
+        if r.framed:
+            spf = r.samples_per_frame
+            byte = (r.data_offset + (sample // spf) * r.frame_size +
+                    r.sample_offset + (sample % spf) * 2)
+        else:
+            byte = sample * 2
+        return os.path.join(self.directory, self.files[fid]), sample, byte
+
+    def read(self, t, duration):
+        """
+        Read the samples covering [t, t + duration) across file boundaries.
+
+        Returns:
+        --------
+        (float, numpy.ndarray)
+            POSIX time of the first returned sample and the int16 samples.
+            Within one formatted file the result is a memory-mapped view;
+            samples in recording gaps are simply absent.
+        """
+        t_end = t + duration
+        t0s = self.seg_t0_ns * 1e-9
+        t1s = t0s + self.seg_nsamp / self.seg_rate
+        hits = np.flatnonzero((t1s > t) & (t0s < t_end))
+        parts = []
+        first_time = None
+        for i in hits:
+            fs = self.seg_rate[i]
+            a = max(0, int(np.floor((t - t0s[i]) * fs)))
+            b = min(int(self.seg_nsamp[i]), int(np.ceil((t_end - t0s[i]) * fs)))
+            if b <= a:
+                continue
+            if first_time is None:
+                first_time = t0s[i] + a / fs
+            r = self._reader(int(self.seg_file[i]))
+            parts.append(r.read(int(self.seg_sample0[i]) + a, b - a))
+        if not parts:
+            return None, np.zeros(0, dtype=np.int16)
+        return first_time, parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+
+def parse_time(text):
+    """Parse 'YYYY-MM-DD HH:MM:SS[.f]' (UTC) or a POSIX timestamp."""
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    fmt = "%Y-%m-%d %H:%M:%S.%f" if '.' in text else "%Y-%m-%d %H:%M:%S"
+    dt = datetime.strptime(text, fmt)
+    return calendar.timegm(dt.timetuple()) + dt.microsecond * 1e-6
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build/query the time index of an IF capture directory')
+    parser.add_argument('directory', nargs='?', default='IF_data_dump', help='Capture directory')
+    parser.add_argument('--at', help="Centre time, 'YYYY-MM-DD HH:MM:SS.f' UTC or POSIX seconds")
+    parser.add_argument('--duration', type=float, default=0.05, help='Window length in seconds')
+    parser.add_argument('--output', help='Save the window to this .npy file')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.directory):
+        print(f"Error: directory '{args.directory}' not found")
+        sys.exit(1)
+    idx = CaptureIndex(args.directory)
+    n = idx.update()
+    print(f"Indexed {len(idx.files)} files ({n} new/changed), {len(idx.seg_t0_ns)} segments")
+    if idx.start_time is not None:
+        print(f"Coverage: {idx.start_time:.6f} .. {idx.end_time:.6f} (POSIX s)")
+    if args.at:
+        centre = parse_time(args.at)
+        t_first, samples = idx.read(centre - args.duration / 2, args.duration)
+        if samples.size == 0:
+            print("No data in the requested window.")
+            return
+        loc = idx.locate(t_first)
+        print(f"{samples.size} samples from {t_first:.9f}, starting in {loc[0]} at byte {loc[2]}")
+        if args.output:
+            np.save(args.output, samples)
+            print(f"Saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
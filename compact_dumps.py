@@ -0,0 +1,445 @@
+#!/usr/bin/env python3
+# compact_dumps.py - Merge a day's small dump files into one columnar shard
+# Handles the per-frame files of LIVE_DISPLAY_DUMP (dump_*.npz), IQ_data_dump (IQ_*.bin)
+# and spectra_dump (spectrum_*.npz). A shard is a magic string, a JSON header and one
+# contiguous, page-aligned array per column (timestamps, power, spectra, raw IQ, ...);
+# values identical in every file of the day (frequency axes) are stored once. The shard
+# is read back and compared with every original before the originals are removed, so a
+# day is then a few large sequential reads instead of one open per frame.
+
+import os
+import sys
+import json
+import struct
+import argparse
+from collections import Counter
+from datetime import datetime, date
+import numpy as np
+from numpy.lib import format as npy_format
+
+SHARD_MAGIC = b"DSHARD01"
+SHARD_PREFIX = "shard_"
+SHARD_EXT = ".dshard"
+SHARD_VERSION = 1
+ALIGN = 4096
+
+# kind -> (file prefix, extension, fields stored once per shard when identical)
+KINDS = {
+    'dump': ("dump_", ".npz", ('freq',)),
+    'IQ': ("IQ_", ".bin", ()),
+    'spectrum': ("spectrum_", ".npz", ('freqs',)),
+}
+
+
+def file_time(name, prefix, ext):
+    """Local time stamp of a <prefix>YYYYMMDD_HHMMSS_ffffff<ext> name, or None."""
+    base = os.path.basename(name)
+    if not (base.startswith(prefix) and base.endswith(ext)):
+        return None
+    try:
+        return datetime.strptime(base[len(prefix):-len(ext)], "%Y%m%d_%H%M%S_%f")
+    except ValueError:
+        return None
+
+
+def load_file(path, kind, fields=None):
+    """Fields (all, or the named ones) of one small dump file as a dict of arrays."""
+    if KINDS[kind][1] == ".bin":
+        return {'iq': np.fromfile(path, dtype=np.float32)}
+    with np.load(path) as d:
+        return {k: d[k] for k in d.files if fields is None or k in fields}
+
+
+def record_layout(path, kind):
+    """
+    {field: (dtype, shape)} of one small dump file, read from the file size or
+    the .npy headers inside the .npz without loading the data.
+
+    Raises:
+    -------
+    OSError, ValueError
+        If the file cannot be read
+    """
+    if KINDS[kind][1] == ".bin":
+        size = os.path.getsize(path)
+        if size % 4:
+            raise ValueError(f"{size} bytes is not a whole number of float32 values")
+        return {'iq': (np.dtype(np.float32).str, (size // 4,))}
+    layout = {}
+    with np.load(path) as d:
+        for k in d.files:
+            with d.zip.open(k + '.npy') as f:
+                version = npy_format.read_magic(f)
+                read_header = npy_format.read_array_header_1_0 if version == (1, 0) else \
+                    npy_format.read_array_header_2_0
+                shape, _, dtype = read_header(f)
+            layout[k] = (dtype.str, tuple(shape))
+    return layout
+
+
+def shard_name(kind, day):
+    return f"{SHARD_PREFIX}{kind}_{day:%Y%m%d}{SHARD_EXT}"
+
+
+class DumpShard:
+    """
+    Read access to one shard; columns are memory-mapped.
+
+    Parameters:
+    -----------
+    path : str
+        Shard file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            if f.read(len(SHARD_MAGIC)) != SHARD_MAGIC:
+                raise ValueError(f"{path} is not a dump shard")
+            (n,) = struct.unpack('<Q', f.read(8))
+            self.header = json.loads(f.read(n).decode('utf-8'))
+        self.kind = self.header['kind']
+        self.n_records = self.header['n_records']
+        self.names = self.header['names']
+        self.columns = list(self.header['columns'])
+        self.static = list(self.header['static'])
+
+    def _map(self, entry, shape):
+        if not entry['nbytes']:
+            return np.zeros(shape, dtype=entry['dtype'])
+        return np.memmap(self.path, dtype=entry['dtype'], mode='r', offset=entry['offset'], shape=shape)
+
+    def column(self, name):
+        """Per-record values of a field, shape (n_records,) + field shape."""
+        e = self.header['columns'][name]
+        return self._map(e, (self.n_records,) + tuple(e['shape']))
+
+    def static_value(self, name):
+        e = self.header['static'][name]
+        return np.array(self._map(e, tuple(e['shape'])))
+
+    @property
+    def time_us(self):
+        return self.column('time_us')
+
+    def record(self, i, fields=None):
+        """Fields (all, or the named ones) of record i, as load_file returned them for the original file."""
+        rec = {name: np.asarray(self.column(name)[i]) for name in self.columns
+               if name != 'time_us' and (fields is None or name in fields)}
+        for name in self.static:
+            if fields is None or name in fields:
+                rec[name] = self.static_value(name)
+        return rec
+
+
+def _same(a, b):
+    return (a.dtype == b.dtype and a.shape == b.shape
+            and np.array_equal(a, b, equal_nan=a.dtype.kind in 'fc'))
+
+
+def write_shard(path, kind, day, entries, static_names):
+    """
+    Write records as a shard, streaming them into the column arrays.
+
+    Parameters:
+    -----------
+    entries : list of (int, str, callable)
+        (time in microseconds, record name, function returning the record's
+        field dict, optionally restricted to a list of fields), in time order
+    static_names : tuple
+        Fields stored once when equal in every record
+
+    Returns:
+    --------
+    str
+        Temporary path of the written shard (renamed by the caller)
+    """
+    first = entries[0][2]()
+    static = {}
+    for name in static_names:
+        value = first.get(name)
+        if value is None:
+            continue
+        value = np.asarray(value)
+        # only this field is read from every file here
+        if all(_same(np.asarray(load([name]).get(name, np.empty(0))), value) for _, _, load in entries[1:]):
+            static[name] = value
+    fields = {'time_us': (np.dtype(np.int64), ())}
+    fields.update((k, (np.asarray(v).dtype, np.asarray(v).shape)) for k, v in first.items() if k not in static)
+
+    header = {'version': SHARD_VERSION, 'kind': kind, 'day': f"{day:%Y-%m-%d}", 'n_records': len(entries),
+              'names': [e[1] for e in entries], 'columns': {}, 'static': {}}
+    layout = [('columns', k, dt, (len(entries),) + shape) for k, (dt, shape) in fields.items()] + \
+             [('static', k, v.dtype, v.shape) for k, v in static.items()]
+    # two passes: offsets depend on the header length, which depends on the offsets
+    for _ in range(2):
+        offset = len(SHARD_MAGIC) + 8 + len(json.dumps(header).encode('utf-8')) + 64
+        for group, name, dt, shape in layout:
+            offset = -(-offset // ALIGN) * ALIGN
+            nbytes = int(np.prod(shape, dtype=np.int64)) * dt.itemsize
+            header[group][name] = {'dtype': dt.str, 'shape': list(shape[1:] if group == 'columns' else shape),
+                                   'offset': offset, 'nbytes': nbytes}
+            offset += nbytes
+    text = json.dumps(header).encode('utf-8')
+    if layout and header[layout[0][0]][layout[0][1]]['offset'] < len(SHARD_MAGIC) + 8 + len(text):
+        raise RuntimeError("Shard header overlaps the column data")
+
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(SHARD_MAGIC)
+        f.write(struct.pack('<Q', len(text)))
+        f.write(text)
+        f.truncate(offset)
+    try:
+        cols = {name: np.memmap(tmp, dtype=dt, mode='r+', offset=header['columns'][name]['offset'], shape=shape)
+                for group, name, dt, shape in layout if group == 'columns' and header['columns'][name]['nbytes']}
+        for name, value in static.items():
+            if value.nbytes:
+                np.memmap(tmp, dtype=value.dtype, mode='r+', offset=header['static'][name]['offset'],
+                          shape=value.shape)[...] = value
+        for i, (t, name, load) in enumerate(entries):
+            rec = first if i == 0 else load()
+            if set(rec) != set(first):
+                raise ValueError(f"{name} has different fields than {entries[0][1]}")
+            for k, col in cols.items():
+                if k == 'time_us':
+                    col[i] = t
+                    continue
+                v = np.asarray(rec[k])
+                if v.shape != col.shape[1:] or v.dtype != col.dtype:
+                    raise ValueError(f"Field '{k}' changes shape or type in {name}")
+                col[i] = v
+        for col in cols.values():
+            col.flush()
+        del cols
+    except Exception:
+        os.remove(tmp)
+        raise
+    with open(tmp, 'rb+') as f:
+        os.fsync(f.fileno())
+    return tmp
+
+
+def _verify(shard_path, expected):
+    """Compare a shard with expected {name: fields} records; returns a problem or None."""
+    shard = DumpShard(shard_path)
+    index = {n: i for i, n in enumerate(shard.names)}
+    if len(index) != len(shard.names):
+        return "duplicate record names"
+    for name, orig in expected():
+        if name not in index:
+            return f"{name}: missing"
+        rec = shard.record(index[name])
+        if set(orig) != set(rec):
+            return f"{name}: fields differ"
+        for k, v in orig.items():
+            if not _same(np.asarray(v), rec[k]):
+                return f"{name}: field '{k}' differs"
+    return None
+
+
+def _split_malformed(directory, kind, names, reference=None):
+    """
+    Split names into (files to compact, [(name, reason)] to leave alone).
+
+    Files that cannot be read, or whose fields differ in type or shape from the
+    reference layout (default: the most common layout), are left uncompacted.
+    """
+    layouts = {}
+    bad = []
+    for name in names:
+        try:
+            layouts[name] = record_layout(os.path.join(directory, name), kind)
+        except (OSError, ValueError, KeyError) as e:
+            bad.append((name, f"unreadable ({e})"))
+    if reference is None and layouts:
+        counts = Counter(tuple(sorted(layout.items())) for layout in layouts.values())
+        reference = dict(counts.most_common(1)[0][0])
+    good = []
+    for name, layout in layouts.items():
+        if layout == reference:
+            good.append(name)
+            continue
+        diff = sorted(k for k in set(layout) | set(reference) if layout.get(k) != reference.get(k))
+        bad.append((name, "fields " + ", ".join(f"{k} {layout.get(k)} (expected {reference.get(k)})"
+                                                for k in diff)))
+    return good, bad
+
+
+def compact_day(directory, kind, day, names, keep=False):
+    """
+    Compact the named files of one day (merging an existing shard of that day).
+
+    Files that are unreadable or do not match the day's record layout (e.g. a
+    truncated IQ_*.bin) are skipped and left in place.
+
+    Returns:
+    --------
+    (str, int, list)
+        Path of the shard, number of files merged and [(name, reason)] of the
+        skipped files
+    """
+    prefix, ext, static_names = KINDS[kind]
+    path = os.path.join(directory, shard_name(kind, day))
+    entries = []
+    old = None
+    reference = None
+    if os.path.exists(path):
+        old = DumpShard(path)
+        known = set(old.names)
+        kept = [n for n in names if n in known]  # originals left by an earlier --keep run
+        if kept:
+            problem = _verify(path, lambda: ((n, load_file(os.path.join(directory, n), kind)) for n in kept))
+            if problem:
+                raise RuntimeError(f"{shard_name(kind, day)} does not match its original: {problem}")
+            if not keep:
+                for name in kept:
+                    os.remove(os.path.join(directory, name))
+        names = [n for n in names if n not in known]
+        if not names:
+            return path, 0, []
+        reference = {k: (np.dtype(e['dtype']).str, tuple(e['shape'])) for k, e in old.header['columns'].items()
+                     if k != 'time_us'}
+        reference.update((k, (np.dtype(e['dtype']).str, tuple(e['shape'])))
+                         for k, e in old.header['static'].items())
+        entries += [(int(t), n, lambda fields=None, i=i: old.record(i, fields))
+                    for i, (t, n) in enumerate(zip(old.time_us, old.names))]
+    names, skipped = _split_malformed(directory, kind, names, reference)
+    if not names:
+        return (path if old is not None else None), 0, skipped
+    for name in names:
+        t = file_time(name, prefix, ext)
+        entries.append((int(round(t.timestamp() * 1e6)), name,
+                        lambda fields=None, name=name: load_file(os.path.join(directory, name), kind, fields)))
+    entries.sort(key=lambda e: (e[0], e[1]))
+    tmp = write_shard(path, kind, day, entries, static_names)
+    del entries
+
+    def expected():
+        # originals are re-read from disk, earlier records from the previous shard
+        for name in names:
+            yield name, load_file(os.path.join(directory, name), kind)
+        if old is not None:
+            for i, name in enumerate(old.names):
+                yield name, old.record(i)
+
+    problem = _verify(tmp, expected)
+    if problem:
+        os.remove(tmp)
+        raise RuntimeError(f"Round-trip check failed for {shard_name(kind, day)}: {problem}")
+    os.replace(tmp, path)
+    if not keep:
+        for name in names:
+            os.remove(os.path.join(directory, name))
+    return path, len(names), skipped
+
+
+def compact_directory(directory, kinds=None, include_today=False, keep=False, dry_run=False):
+    """
+    Compact every complete day of small dump files in a directory.
+
+    Parameters:
+    -----------
+    directory : str
+        Dump directory
+    kinds : list, optional
+        File kinds to compact (default: all of KINDS)
+    include_today : bool
+        Also compact today's files (normally still being written)
+    keep : bool
+        Keep the original files after a verified compaction
+    dry_run : bool
+        Only report what would be done
+
+    Returns:
+    --------
+    list of (str, int, list)
+        Shard path (None if nothing could be merged), number of files merged
+        into it and [(name, reason)] of the files left uncompacted
+    """
+    today = date.today()
+    names = sorted(os.listdir(directory))
+    done = []
+    for kind in kinds or KINDS:
+        prefix, ext, _ = KINDS[kind]
+        by_day = {}
+        for name in names:
+            t = file_time(name, prefix, ext)
+            if t is not None and (include_today or t.date() < today):
+                by_day.setdefault(t.date(), []).append(name)
+        for day, day_names in sorted(by_day.items()):
+            if dry_run:
+                good, skipped = _split_malformed(directory, kind, day_names)
+                done.append((os.path.join(directory, shard_name(kind, day)), len(good), skipped))
+                continue
+            done.append(compact_day(directory, kind, day, day_names, keep))
+    return done
+
+
+def list_shards(directory, kind=None):
+    """Shard files of a directory (optionally of one kind), in time order."""
+    if not os.path.isdir(directory):
+        return []
+    prefix = SHARD_PREFIX + (f"{kind}_" if kind else "")
+    return [os.path.join(directory, n) for n in sorted(os.listdir(directory))
+            if n.startswith(prefix) and n.endswith(SHARD_EXT)]
+
+
+def iter_records(directory, kind):
+    """
+    Yield (name, fields) for every record of a kind in time order, from shards
+    and loose files alike.
+    """
+    prefix, ext, _ = KINDS[kind]
+    items = []
+    for name in os.listdir(directory):
+        t = file_time(name, prefix, ext)
+        if t is not None:
+            items.append((int(round(t.timestamp() * 1e6)), name, None, 0))
+    for path in list_shards(directory, kind):
+        shard = DumpShard(path)
+        items += [(int(t), name, shard, i) for i, (t, name) in enumerate(zip(shard.time_us, shard.names))]
+    items.sort(key=lambda e: (e[0], e[1]))
+    for _, name, shard, i in items:
+        if shard is None:
+            yield name, load_file(os.path.join(directory, name), kind)
+        else:
+            yield name, shard.record(i)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compact small per-frame dump files into daily shards')
+    parser.add_argument('directories', nargs='*', default=['LIVE_DISPLAY_DUMP', 'IQ_data_dump', 'spectra_dump'],
+                        help='Dump directories to compact')
+    parser.add_argument('--kind', choices=sorted(KINDS), action='append', help='Only compact these file kinds')
+    parser.add_argument('--include-today', action='store_true', help="Also compact today's files")
+    parser.add_argument('--keep', action='store_true', help='Keep the originals after verification')
+    parser.add_argument('--dry-run', action='store_true', help='Only show what would be compacted')
+    args = parser.parse_args()
+
+    status = 0
+    for directory in args.directories:
+        if not os.path.isdir(directory):
+            print(f"Skipping {directory}: not a directory")
+            continue
+        try:
+            done = compact_directory(directory, args.kind, args.include_today, args.keep, args.dry_run)
+        except (RuntimeError, ValueError, OSError) as e:
+            print(f"Error in {directory}: {e}")
+            status = 1
+            continue
+        for path, n, skipped in done:
+            for name, reason in skipped:
+                print(f"Warning: leaving {os.path.join(directory, name)} uncompacted: {reason}")
+            if path is None:
+                continue
+            verb = "Would merge" if args.dry_run else "Merged"
+            size = os.path.getsize(path) / 1e6 if os.path.exists(path) else 0
+            print(f"{verb} {n} files into {path} ({size:.1f} MB)")
+        if not done:
+            print(f"Nothing to compact in {directory}")
+    sys.exit(status)
+
+
+if __name__ == '__main__':
+    main()
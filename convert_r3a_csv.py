@@ -2,12 +2,36 @@
 # r3a_to_csv.py - Convert .r3a files to CSV format
 # Based on the Streaming IF Sample Data File Format documentation
 
-import struct
-import csv
 import os
 import sys
+import glob
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 
-def read_r3a_to_csv(r3a_filename, output_filename=None, single_row=False):
+CHUNK_SAMPLES = 1 << 20  # samples formatted per write
+OUTPUT_FORMATS = ('csv', 'npy')
+
+_row_format = (0, '')  # (n, format) of the full-chunk length only; tails are not cached
+
+
+def _indexed_rows(start, samples, cache=True):
+    """'index,value' CSV lines for a chunk, formatted in one C-level operation."""
+    global _row_format
+    n = len(samples)
+    if _row_format[0] == n:
+        fmt = _row_format[1]
+    else:
+        fmt = '%d,%d\r\n' * n
+        if cache:
+            _row_format = (n, fmt)
+    pairs = np.empty(2 * n, dtype=np.int64)
+    pairs[0::2] = np.arange(start, start + n)
+    pairs[1::2] = samples
+    return fmt % tuple(pairs.tolist())
+
+
+def read_r3a_to_csv(r3a_filename, output_filename=None, single_row=False, output_format='csv',
+                    chunk_samples=CHUNK_SAMPLES, verbose=True):
     """
     Read a .r3a file and convert it to CSV format.
     
@@ -16,9 +40,17 @@ def read_r3a_to_csv(r3a_filename, output_filename=None, single_row=False):
     r3a_filename : str
         Path to the .r3a file to convert
     output_filename : str, optional
-        Path to the output CSV file. If None, uses the same name as input with .csv extension
+        Path to the output file. If None, uses the same name as input with
+        a .csv (or .npy) extension
     single_row : bool, default=False
         If True, writes all samples in a single row. If False, writes each sample with its index
+    output_format : str, default='csv'
+        'csv' for text output or 'npy' for an int16 NumPy array file, which
+        is a straight copy of the samples and orders of magnitude faster
+    chunk_samples : int
+        Number of samples converted per write
+    verbose : bool
+        Print progress messages
         
     Returns:
     --------
@@ -31,79 +63,145 @@ def read_r3a_to_csv(r3a_filename, output_filename=None, single_row=False):
     - .r3a files contain only IF samples (raw data)
     - Samples are 16-bit signed integers in 2 bytes
     - Samples are contiguous with no transport frame information
+
+    The input is memory-mapped and converted chunk by chunk, so memory use
+    does not depend on the file size.
     """
     
     # Check if file exists
     if not os.path.exists(r3a_filename):
         print(f"Error: File {r3a_filename} not found.")
         return False
+    if output_format not in OUTPUT_FORMATS:
+        print(f"Error: unknown output format '{output_format}'")
+        return False
     
-    # Generate output CSV filename if not provided
+    # Generate output filename if not provided
     if output_filename is None:
         base_name = os.path.splitext(r3a_filename)[0]
-        output_filename = base_name + '.csv'
+        output_filename = base_name + '.' + output_format
     
     try:
-        # Read the binary .r3a file
-        with open(r3a_filename, 'rb') as r3a_file:
-            # Read all data from the file
-            binary_data = r3a_file.read()
-            
-            # Calculate number of 16-bit samples
-            # Each sample is 2 bytes (16-bit signed integer)
-            num_samples = len(binary_data) // 2
-            
-            print(f"File size: {len(binary_data)} bytes")
+        file_size = os.path.getsize(r3a_filename)
+        # Each sample is 2 bytes (16-bit little-endian signed integer)
+        num_samples = file_size // 2
+        if verbose:
+            print(f"File size: {file_size} bytes")
             print(f"Number of 16-bit samples: {num_samples}")
-            
-            # Unpack binary data as 16-bit signed integers
-            # '<h' means little-endian signed short (16-bit)
-            samples = struct.unpack(f'<{num_samples}h', binary_data)
-            
-            # Write samples to CSV file
+        if num_samples:
+            samples = np.memmap(r3a_filename, dtype='<i2', mode='r', shape=(num_samples,))
+        else:
+            samples = np.zeros(0, dtype='<i2')
+
+        if output_format == 'npy':
+            out = np.lib.format.open_memmap(output_filename, mode='w+', dtype='<i2',
+                                            shape=(num_samples,))
+            for i in range(0, num_samples, chunk_samples):
+                out[i:i + chunk_samples] = samples[i:i + chunk_samples]
+            out.flush()
+            del out
+            if verbose:
+                print(f"NPY file contains {num_samples} samples")
+        else:
             with open(output_filename, 'w', newline='') as csv_file:
-                writer = csv.writer(csv_file)
-                
                 if single_row:
                     # Write all samples as a single row
-                    writer.writerow(samples)
-                    print(f"CSV file contains {len(samples)} samples in a single row")
+                    for i in range(0, num_samples, chunk_samples):
+                        if i:
+                            csv_file.write(',')
+                        csv_file.write(','.join(map(str, samples[i:i + chunk_samples].tolist())))
+                    csv_file.write('\r\n')
+                    if verbose:
+                        print(f"CSV file contains {num_samples} samples in a single row")
                 else:
-                    # Write header
-                    writer.writerow(['Sample_Index', 'IF_Value'])
-                    
-                    # Write each sample with its index
-                    for i, sample in enumerate(samples):
-                        writer.writerow([i, sample])
-                    print(f"CSV file contains {len(samples)} samples with indices")
-            
+                    # Write header, then each sample with its index
+                    csv_file.write('Sample_Index,IF_Value\r\n')
+                    for i in range(0, num_samples, chunk_samples):
+                        csv_file.write(_indexed_rows(i, samples[i:i + chunk_samples],
+                                                     cache=i + chunk_samples <= num_samples))
+                    if verbose:
+                        print(f"CSV file contains {num_samples} samples with indices")
+        del samples
+        
+        if verbose:
             print(f"Successfully converted {r3a_filename} to {output_filename}")
-            return True
+        return True
             
-    except struct.error as e:
-        print(f"Error unpacking binary data: {str(e)}")
-        print("This may indicate the file is not in the expected format.")
-        return False
     except Exception as e:
-        print(f"Error processing file: {str(e)}")
+        print(f"Error processing file {r3a_filename}: {str(e)}")
         return False
 
+
+def _convert_job(job):
+    return job[0], read_r3a_to_csv(*job, verbose=False)
+
+
+def convert_directory(input_dir, output_dir=None, single_row=False, output_format='csv', jobs=None):
+    """
+    Convert every .r3a file in a directory, one file per worker process.
+
+    Parameters:
+    -----------
+    input_dir : str
+        Directory containing .r3a files
+    output_dir : str, optional
+        Directory for the converted files (default: next to the inputs)
+    single_row, output_format :
+        As for read_r3a_to_csv
+    jobs : int, optional
+        Number of worker processes (default: number of CPUs)
+
+    Returns:
+    --------
+    (int, int)
+        Number of files converted and number of failures
+    """
+    files = sorted(glob.glob(os.path.join(input_dir, '*.r3a')))
+    if not files:
+        print(f"No .r3a files found in {input_dir}")
+        return 0, 0
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    job_list = []
+    for fp in files:
+        out = None
+        if output_dir:
+            out = os.path.join(output_dir, os.path.splitext(os.path.basename(fp))[0] + '.' + output_format)
+        job_list.append((fp, out, single_row, output_format))
+
+    done = failed = 0
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        for fp, ok in pool.map(_convert_job, job_list):
+            if ok:
+                done += 1
+            else:
+                failed += 1
+            print(f"[{done + failed}/{len(files)}] {'converted' if ok else 'FAILED'} {fp}")
+    return done, failed
+
 def print_usage():
     """Print usage information for the script"""
-    print("Usage: python r3a_to_csv.py <input_file.r3a> [output_file.csv] [-s/--single-row]")
+    print("Usage: python r3a_to_csv.py <input_file.r3a | input_dir> [output_file.csv | output_dir]")
+    print("                           [-s/--single-row] [--npy] [-j/--jobs N]")
     print("")
     print("Arguments:")
     print("  input_file.r3a       Path to the .r3a file to convert")
+    print("  input_dir            Directory: convert every .r3a file in it in parallel")
     print("  output_file.csv      Optional: Path to the output CSV file")
     print("                       (default: same name with .csv extension)")
+    print("  output_dir           Optional: Output directory in directory mode")
     print("  -s, --single-row     Optional: Write all samples in a single row")
     print("                       (default: write each sample with its index)")
+    print("  --npy                Optional: Write an int16 .npy file instead of CSV")
+    print("  -j, --jobs N         Optional: Worker processes in directory mode")
+    print("                       (default: number of CPUs)")
     print("")
     print("Examples:")
     print("  python r3a_to_csv.py input.r3a")
     print("  python r3a_to_csv.py input.r3a output.csv")
     print("  python r3a_to_csv.py input.r3a -s")
     print("  python r3a_to_csv.py input.r3a output.csv --single-row")
+    print("  python r3a_to_csv.py IF_data_dump converted --npy -j 8")
 
 def main():
     """Command line interface for the r3a to CSV converter"""
@@ -121,26 +219,38 @@ def main():
         print_usage()
         return
     
-    # Check if file has .r3a extension
-    if not input_file.lower().endswith('.r3a'):
-        print("Warning: Input file does not have .r3a extension")
-        response = input("Continue anyway? (y/n): ")
-        if response.lower() != 'y':
-            print("Conversion cancelled.")
-            return
-    
     # Parse remaining arguments
     output_file = None
     single_row = False
+    output_format = 'csv'
+    jobs = None
     
-    for arg in sys.argv[2:]:
+    args = iter(sys.argv[2:])
+    for arg in args:
         if arg in ['-s', '--single-row']:
             single_row = True
+        elif arg == '--npy':
+            output_format = 'npy'
+        elif arg in ['-j', '--jobs']:
+            jobs = int(next(args, '0')) or None
         elif not arg.startswith('-'):
             output_file = arg
     
+    if os.path.isdir(input_file):
+        done, failed = convert_directory(input_file, output_file, single_row, output_format, jobs)
+        print(f"Converted {done} files, {failed} failed.")
+        return
+    
+    # Check if file has .r3a extension
+    if not input_file.lower().endswith('.r3a'):
+        print("Warning: Input file does not have .r3a extension")
+        response = input("Continue anyway? (y/n): ")
+        if response.lower() != 'y':
+            print("Conversion cancelled.")
+            return
+    
     # Convert file
-    success = read_r3a_to_csv(input_file, output_file, single_row)
+    success = read_r3a_to_csv(input_file, output_file, single_row, output_format)
     
     if success:
         print("Conversion completed successfully.")
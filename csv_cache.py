@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# csv_cache.py - Shared loader for IF sample CSVs with a memory-mappable .npy cache
+# The first access parses the CSV (last numeric column of each row) in large blocks and
+# saves it as .npy in a .if_cache directory next to the file, keyed by the CSV's path,
+# size and modification time. Later runs memory-map the cache and slice the requested
+# sample range directly. .r3a/.r3f captures are read in place without any conversion.
+
+import os
+import sys
+import glob
+import hashlib
+import argparse
+import numpy as np
+
+from r3f_reader import R3FReader
+
+CACHE_DIR_NAME = ".if_cache"
+READ_BLOCK_BYTES = 16 << 20
+CAPTURE_EXTS = ('.r3a', '.r3f')
+
+
+def _cache_path(csv_path):
+    """Cache file for the current contents of csv_path."""
+    path = os.path.abspath(csv_path)
+    st = os.stat(path)
+    key = hashlib.sha1(f"{path}|{st.st_size}|{st.st_mtime_ns}".encode()).hexdigest()[:16]
+    base = os.path.basename(path)
+    return os.path.join(os.path.dirname(path), CACHE_DIR_NAME, f"{base}-{key}.npy")
+
+
+def _parse_block(lines):
+    """Last-column values of a block of CSV lines; rows that are not numeric are skipped."""
+    fields = [line.rpartition(b',')[2].strip() for line in lines]
+    try:
+        return np.array(fields, dtype=np.float64)
+    except ValueError:
+        values = []
+        for f in fields:
+            try:
+                values.append(float(f))
+            except ValueError:
+                continue
+        return np.array(values, dtype=np.float64)
+
+
+def _parse_csv(csv_path, tmp_path):
+    """Stream the CSV into a raw float64 file; return the number of values."""
+    n = 0
+    tail = b''
+    with open(csv_path, 'rb') as f, open(tmp_path, 'wb') as out:
+        while True:
+            block = f.read(READ_BLOCK_BYTES)
+            if not block:
+                break
+            lines = (tail + block).split(b'\n')
+            tail = lines.pop()
+            values = _parse_block([l for l in lines if l.strip()])
+            out.write(values.tobytes())
+            n += len(values)
+        if tail.strip():
+            values = _parse_block([tail])
+            out.write(values.tobytes())
+            n += len(values)
+    return n
+
+
+def build_cache(csv_path):
+    """
+    Convert a CSV to its .npy cache (if not already current) and return the cache path.
+
+    Values that are all integers within the int16 range (IF samples written by
+    convert_r3a_csv.py) are stored as int16, everything else as float64.
+    """
+    cache = _cache_path(csv_path)
+    if os.path.exists(cache):
+        return cache
+    cache_dir = os.path.dirname(cache)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = cache + '.tmp'
+    n = _parse_csv(csv_path, tmp)
+    raw = np.memmap(tmp, dtype=np.float64, mode='r', shape=(n,)) if n else np.zeros(0)
+    dtype = np.float64
+    if n and np.all(raw == np.round(raw)) and raw.min() >= -32768 and raw.max() <= 32767:
+        dtype = np.int16
+    out = np.lib.format.open_memmap(cache + '.part', mode='w+', dtype=dtype, shape=(n,))
+    step = READ_BLOCK_BYTES // 8
+    for i in range(0, n, step):
+        out[i:i + step] = raw[i:i + step]
+    out.flush()
+    del out, raw
+    os.remove(tmp)
+    os.replace(cache + '.part', cache)
+
+    # drop caches of earlier versions of the same file
+    prefix = os.path.basename(os.path.abspath(csv_path)) + '-'
+    for old in glob.glob(os.path.join(cache_dir, glob.escape(prefix) + '*.npy')):
+        if old != cache and len(os.path.basename(old)) == len(os.path.basename(cache)):
+            os.remove(old)
+    return cache
+
+
+def load_if_samples(path, start=0, count=None):
+    """
+    Return IF samples from a CSV, .npy, .r3a or .r3f file.
+
+    Parameters:
+    -----------
+    path : str
+        Input file. For a CSV the last numeric column of every row is used
+        and cached on first access.
+    start : int
+        Index of the first sample
+    count : int, optional
+        Number of samples (default: to the end of the file)
+
+    Returns:
+    --------
+    numpy.ndarray
+        The sample range; a memory-mapped view where the source allows it
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext in CAPTURE_EXTS:
+        r = R3FReader(path)
+        if count is None:
+            count = max(r.n_samples - start, 0)
+        return r.read(start, count)
+    if ext == '.npy':
+        data = np.load(path, mmap_mode='r')
+    else:
+        data = np.load(build_cache(path), mmap_mode='r')
+    stop = len(data) if count is None else start + int(count)
+    return data[start:stop]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build or clear the .npy cache of IF sample CSVs')
+    parser.add_argument('csv_files', nargs='+', help='CSV files to cache')
+    parser.add_argument('--clear', action='store_true', help='Remove the cache of the given files')
+    args = parser.parse_args()
+
+    for path in args.csv_files:
+        if not os.path.exists(path):
+            print(f"Error: File {path} not found.")
+            sys.exit(1)
+        if args.clear:
+            cache_dir = os.path.join(os.path.dirname(os.path.abspath(path)), CACHE_DIR_NAME)
+            prefix = os.path.basename(os.path.abspath(path)) + '-'
+            for old in glob.glob(os.path.join(cache_dir, glob.escape(prefix) + '*.npy')):
+                os.remove(old)
+            print(f"Cleared cache of {path}")
+            continue
+        cache = build_cache(path)
+        data = np.load(cache, mmap_mode='r')
+        print(f"{path}: {len(data)} samples ({data.dtype}) -> {cache}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+# drift_scan_calibration.py - Gain and beam width from calibrator drift scans
+# Fits a Gaussian beam plus linear baseline to the total-power time series of every
+# channel around a calibrator transit, all channels at once, and converts the fitted
+# peak to a system gain using the flux from VLA_calibrator_list.txt.
+
+import os
+import re
+import argparse
+import numpy as np
+
+GAUSS_FWHM = 2.0 * np.sqrt(2.0 * np.log(2.0))
+SIDEREAL_RATE_DEG_S = 360.0 / 86164.0905  # apparent sky drift at the equator
+GRID_CHUNK_BYTES = 32 << 20  # per design/Q tensor in the grid search
+
+
+def ra_to_degrees(ra_str):
+    h = float(re.search(r'(\d+)h', ra_str).group(1))
+    m = float(re.search(r'(\d+)m', ra_str).group(1))
+    s = float(re.search(r'(\d+\.?\d*)s', ra_str).group(1))
+    return 15 * (h + m/60 + s/3600)
+
+
+def dec_to_degrees(dec_str):
+    sign = -1 if dec_str.startswith('-') else 1
+    dec_str = dec_str.lstrip('-+')
+    d = float(re.search(r'(\d+)d', dec_str).group(1))
+    m = float(re.search(r"(\d+)'", dec_str).group(1))
+    s = float(re.search(r'(\d+\.?\d*)"', dec_str).group(1))
+    return sign * (d + m/60 + s/3600)
+
+
+def parse_calibrators(filename='VLA_calibrator_list.txt', band='20cm'):
+    """
+    Read J2000 positions and the flux in one band from the VLA calibrator list.
+
+    Parameters:
+    -----------
+    filename : str
+        Path to VLA_calibrator_list.txt
+    band : str
+        Band label as it appears in the list, e.g. '20cm' or '90cm'
+
+    Returns:
+    --------
+    dict
+        Source name -> (ra_deg, dec_deg, flux_jy) for sources with a flux
+        in the requested band
+    """
+    source_re = re.compile(r'^\d{4}[+-]\d{3}.*J2000')
+    band_re = re.compile(r'^\s*' + re.escape(band) + r'\s+\S+\s+([^\d]*)([\d\.]+)')
+    sources = {}
+    current = None
+    with open(filename, 'r') as f:
+        for line in f:
+            if source_re.match(line):
+                parts = line.split()
+                current = (parts[0], ra_to_degrees(parts[3]), dec_to_degrees(parts[4]))
+                continue
+            if current is None or current[0] in sources:
+                continue
+            m = band_re.match(line)
+            if m:
+                name, ra, dec = current
+                sources[name] = (ra, dec, float(m.group(2)))
+    return sources
+
+
+def _design(t, t0, sigma, tc):
+    """Design matrices [gauss, 1, t - tc] for a stack of (t0, sigma) pairs."""
+    g = np.exp(-0.5 * ((t[None, :] - t0[:, None]) / sigma[:, None]) ** 2)
+    X = np.empty(g.shape + (3,), dtype=np.float64)
+    X[..., 0] = g
+    X[..., 1] = 1.0
+    X[..., 2] = (t - tc)[None, :]
+    return X
+
+
+def fit_drift_scans(t, power, n_t0=64, n_sigma=24, sigma_range=None, n_iter=20):
+    """
+    Fit P(t) = A exp(-(t - t0)^2 / 2 sigma^2) + b0 + b1 (t - tc) to every channel.
+
+    The model is linear in (A, b0, b1) once (t0, sigma) are fixed and all
+    channels share the time axis, so a coarse (t0, sigma) grid is searched
+    with one QR factorisation per grid point applied to all channels in a
+    single matrix product. The best grid point of each channel then seeds a
+    batched Levenberg-Marquardt refinement of all five parameters, with the
+    5x5 normal equations of every channel solved in one call.
+
+    Parameters:
+    -----------
+    t : numpy.ndarray
+        Sample times in seconds, shape (n_time,)
+    power : numpy.ndarray
+        Total power, shape (n_time,) or (n_time, n_chan)
+    n_t0, n_sigma : int
+        Grid size for the transit time and beam sigma search
+    sigma_range : (float, float), optional
+        Beam sigma search range in seconds (default: span/200 .. span/4)
+    n_iter : int
+        Levenberg-Marquardt iterations
+
+    Returns:
+    --------
+    dict
+        Per-channel arrays: 'amplitude', 't0', 'sigma', 'b0', 'b1' (plus
+        '<name>_err' 1-sigma uncertainties), 'rms' residual and 'tc'
+    """
+    t = np.asarray(t, dtype=np.float64)
+    Y = np.asarray(power, dtype=np.float64)
+    if Y.ndim == 1:
+        Y = Y[:, None]
+    n_time, n_chan = Y.shape
+    tc = 0.5 * (t[0] + t[-1])
+    span = t[-1] - t[0]
+    lo, hi = sigma_range if sigma_range else (span / 200, span / 4)
+
+    # --- coarse grid, all channels per grid point ---
+    t0_grid = np.linspace(t[0], t[-1], n_t0)
+    sigma_grid = np.geomspace(lo, hi, n_sigma)
+    T0, S = (a.ravel() for a in np.meshgrid(t0_grid, sigma_grid, indexing='ij'))
+    # grid points are processed in chunks so the (grid, n_time, 3) design and Q
+    # tensors stay at GRID_CHUNK_BYTES whatever the scan length
+    chunk = max(1, GRID_CHUNK_BYTES // (n_time * 3 * 8))
+    yy = np.sum(Y * Y, axis=0)
+    best_rss = np.full(n_chan, np.inf)
+    best = np.zeros(n_chan, dtype=np.int64)
+    coef = np.zeros((n_chan, 3))
+    for g0 in range(0, len(T0), chunk):
+        Q, R = np.linalg.qr(_design(t, T0[g0:g0 + chunk], S[g0:g0 + chunk], tc))   # (g, n_time, 3)
+        # one GEMM projects every channel onto every grid point's basis
+        proj = (Q.transpose(0, 2, 1).reshape(-1, n_time) @ Y).reshape(len(Q), 3, n_chan)
+        del Q
+        rss = yy[None, :] - np.sum(proj * proj, axis=1)
+        c = np.linalg.solve(R, proj)                                              # (g, 3, n_chan)
+        # reject grid points whose Gaussian term is negative (absorption fits)
+        rss[c[:, 0, :] <= 0] = np.inf
+        k = np.argmin(rss, axis=0)
+        rss_k = rss[k, np.arange(n_chan)]
+        upd = np.flatnonzero((rss_k < best_rss) | (g0 == 0))
+        best_rss[upd] = rss_k[upd]
+        best[upd] = g0 + k[upd]
+        coef[upd] = c[k[upd], :, upd]
+
+    # params per channel: A, t0, sigma, b0, b1
+    p = np.column_stack([coef[:, 0], T0[best], S[best], coef[:, 1], coef[:, 2]])
+    dt = (t - tc)[None, :]
+    Yt = Y.T
+    lam = np.full(n_chan, 1e-3)
+
+    def residual(p):
+        g = np.exp(-0.5 * ((t[None, :] - p[:, 1:2]) / p[:, 2:3]) ** 2)
+        model = p[:, 0:1] * g + p[:, 3:4] + p[:, 4:5] * dt
+        return Yt - model, g
+
+    r, g = residual(p)
+    cost = np.sum(r * r, axis=1)
+    for _ in range(n_iter):
+        u = (t[None, :] - p[:, 1:2]) / p[:, 2:3]
+        J = np.empty((n_chan, n_time, 5))
+        J[..., 0] = g
+        J[..., 1] = p[:, 0:1] * g * u / p[:, 2:3]
+        J[..., 2] = p[:, 0:1] * g * u * u / p[:, 2:3]
+        J[..., 3] = 1.0
+        J[..., 4] = dt
+        JT = J.transpose(0, 2, 1)
+        JTJ = JT @ J
+        JTr = (JT @ r[..., None])[..., 0]
+        diag = np.einsum('ckk->ck', JTJ)
+        A = JTJ + (lam[:, None] * diag)[:, :, None] * np.eye(5)[None]
+        step = np.linalg.solve(A, JTr[..., None])[..., 0]
+        p_new = p + step
+        p_new[:, 2] = np.abs(p_new[:, 2])
+        r_new, g_new = residual(p_new)
+        cost_new = np.sum(r_new * r_new, axis=1)
+        better = cost_new < cost
+        improvement = np.max(np.where(better, (cost - cost_new) / cost, 0.0))
+        p[better], r[better], g[better], cost[better] = \
+            p_new[better], r_new[better], g_new[better], cost_new[better]
+        lam = np.where(better, lam * 0.3, lam * 10.0)
+        if improvement < 1e-10:
+            break
+
+    # covariance from the final Jacobian
+    u = (t[None, :] - p[:, 1:2]) / p[:, 2:3]
+    J = np.stack([g, p[:, 0:1] * g * u / p[:, 2:3], p[:, 0:1] * g * u * u / p[:, 2:3],
+                  np.ones_like(g), np.broadcast_to(dt, g.shape)], axis=-1)
+    var = cost / max(n_time - 5, 1)
+    cov = np.linalg.pinv(J.transpose(0, 2, 1) @ J) * var[:, None, None]
+    err = np.sqrt(np.abs(np.einsum('ckk->ck', cov)))
+
+    names = ('amplitude', 't0', 'sigma', 'b0', 'b1')
+    result = {name: p[:, i] for i, name in enumerate(names)}
+    result.update({name + '_err': err[:, i] for i, name in enumerate(names)})
+    result['rms'] = np.sqrt(var)
+    result['tc'] = tc
+    return result
+
+
+def calibrate(fit, flux_jy, dec_deg):
+    """
+    Convert a drift-scan fit to gain, beam width and SEFD per channel.
+
+    Returns:
+    --------
+    dict
+        'gain' (power units per Jy), 'gain_err', 'fwhm_s' (transit FWHM in
+        seconds), 'fwhm_deg' (beam FWHM on the sky) and 'sefd_jy' (baseline
+        expressed in Jy, i.e. the system equivalent flux density)
+    """
+    gain = fit['amplitude'] / flux_jy
+    fwhm_s = GAUSS_FWHM * fit['sigma']
+    return {
+        'gain': gain,
+        'gain_err': fit['amplitude_err'] / flux_jy,
+        'fwhm_s': fwhm_s,
+        'fwhm_deg': fwhm_s * SIDEREAL_RATE_DEG_S * np.cos(np.radians(dec_deg)),
+        'sefd_jy': fit['b0'] / np.where(gain != 0, gain, np.nan),
+    }
+
+
+def load_drift_scan(path):
+    """
+    Load a drift scan saved as .npz with 'time' (s), 'power' (n_time[, n_chan])
+    and optionally 'freq' and 'source'.
+    """
+    with np.load(path) as d:
+        freq = d['freq'] if 'freq' in d else None
+        source = str(d['source']) if 'source' in d else None
+        return d['time'], d['power'], freq, source
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Calibrate gain and beam from calibrator drift scans')
+    parser.add_argument('scans', nargs='+', help='Drift-scan .npz files (time, power[, freq, source])')
+    parser.add_argument('--source', help='Calibrator name (default: "source" entry of each file)')
+    parser.add_argument('--band', default='20cm', help='Catalogue band for the flux (20cm or 90cm)')
+    parser.add_argument('--catalogue', default='VLA_calibrator_list.txt', help='VLA calibrator list')
+    parser.add_argument('--plot', action='store_true', help='Plot gain and beam width per channel')
+    args = parser.parse_args()
+
+    catalogue = parse_calibrators(args.catalogue, args.band)
+    for path in args.scans:
+        t, power, freq, source = load_drift_scan(path)
+        source = args.source or source
+        if source not in catalogue:
+            print(f"{path}: source {source!r} has no {args.band} flux in {args.catalogue}, skipping")
+            continue
+        ra, dec, flux = catalogue[source]
+        fit = fit_drift_scans(t, power)
+        cal = calibrate(fit, flux, dec)
+        out = os.path.splitext(path)[0] + '_cal.npz'
+        np.savez(out, freq=freq if freq is not None else np.arange(len(cal['gain'])),
+                 source=source, flux_jy=flux, **fit, **cal)
+        print(f"{path}: {source} ({flux} Jy), {len(cal['gain'])} channel(s), "
+              f"median gain {np.nanmedian(cal['gain']):.4g}/Jy, "
+              f"median FWHM {np.nanmedian(cal['fwhm_deg']):.3f} deg, "
+              f"median SEFD {np.nanmedian(cal['sefd_jy']):.4g} Jy -> {out}")
+
+        if args.plot:
+            import matplotlib.pyplot as plt
+            x = freq / 1e6 if freq is not None else np.arange(len(cal['gain']))
+            fig, (ax1, ax2) = plt.subplots(2, 1, sharex=True, figsize=(8, 6))
+            ax1.errorbar(x, cal['gain'], yerr=cal['gain_err'], fmt='.')
+            ax1.set_ylabel('Gain (units/Jy)')
+            ax1.set_title(f'Drift-scan calibration: {source}')
+            ax2.plot(x, cal['fwhm_deg'], '.')
+            ax2.set_ylabel('Beam FWHM (deg)')
+            ax2.set_xlabel('Frequency (MHz)' if freq is not None else 'Channel')
+            plt.tight_layout()
+            plt.show()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+# dump_index.py - Persistent time index over LIVE_DISPLAY_DUMP
+# One sorted int64 column of record times (microseconds, POSIX) with the total power,
+# source and record number of every dump record, covering both legacy per-frame
+# dump_*.npz files, their daily shards and dump segments. The index lives in <dump dir>/.dump_index, is
+# updated incrementally (only new files and new segment records are read) and answers
+# time-range queries with a binary search; power comes straight from one array.
+
+import io
+import os
+import sys
+import json
+import argparse
+from datetime import datetime
+import numpy as np
+from numpy.lib import format as npy_format
+
+from dump_segment_writer import SEGMENT_PREFIX, META_NAME as SEGMENT_META, DumpSegment
+from compact_dumps import SHARD_PREFIX, SHARD_EXT, DumpShard
+
+INDEX_DIR = ".dump_index"
+STATE_NAME = "state.json"
+COLUMNS = {'time_us': np.int64, 'power': np.float64, 'src': np.int32, 'rec': np.int32}
+INDEX_VERSION = 1
+
+
+def legacy_time(name):
+    """POSIX time of a dump_YYYYMMDD_HHMMSS_ffffff.npz name (local time), or None."""
+    try:
+        return datetime.strptime(os.path.basename(name)[5:-4], "%Y%m%d_%H%M%S_%f").timestamp()
+    except ValueError:
+        return None
+
+
+def _append_npy(path, rows):
+    """
+    Append rows to a 1-D .npy file in place, patching the shape in its header.
+
+    Returns False, without writing, if the file is not a plain 1-D array of
+    the same dtype or the new header would not have the same length.
+    """
+    with open(path, 'r+b') as f:
+        if npy_format.read_magic(f) != (1, 0):
+            return False
+        shape, fortran, dtype = npy_format.read_array_header_1_0(f)
+        offset = f.tell()
+        if fortran or len(shape) != 1 or dtype != rows.dtype:
+            return False
+        header = io.BytesIO()
+        npy_format.write_array_header_1_0(header, {'descr': npy_format.dtype_to_descr(dtype),
+                                                   'fortran_order': False, 'shape': (shape[0] + len(rows),)})
+        if header.tell() != offset:
+            return False
+        f.seek(offset + shape[0] * dtype.itemsize)
+        f.truncate()  # drop rows of an interrupted append
+        f.write(rows.tobytes())
+        f.flush()
+        f.seek(0)
+        f.write(header.getvalue())
+    return True
+
+
+def to_us(t):
+    """datetime or POSIX seconds -> int64 microseconds."""
+    if isinstance(t, datetime):
+        t = t.timestamp()
+    return int(round(t * 1e6))
+
+
+class DumpIndex:
+    """
+    Sorted time index of the records in a dump directory.
+
+    Parameters:
+    -----------
+    dump_dir : str
+        Live dump directory
+    index_dir : str, optional
+        Where the index is kept (default: <dump_dir>/.dump_index)
+    """
+
+    def __init__(self, dump_dir="LIVE_DISPLAY_DUMP", index_dir=None):
+        self.dump_dir = dump_dir
+        self.index_dir = index_dir or os.path.join(dump_dir, INDEX_DIR)
+        self._load()
+
+    def _empty(self):
+        self.state = {'version': INDEX_VERSION, 'n': 0, 'dir_mtime_ns': 0, 'sources': [], 'segments': {},
+                      'shards': {}}
+        self.columns = {name: np.zeros(0, dtype=dt) for name, dt in COLUMNS.items()}
+
+    def _load(self):
+        self._empty()
+        state_path = os.path.join(self.index_dir, STATE_NAME)
+        if not os.path.exists(state_path):
+            return
+        try:
+            with open(state_path, 'r') as f:
+                state = json.load(f)
+            columns = {name: np.load(os.path.join(self.index_dir, name + '.npy'), mmap_mode='r')
+                       for name in COLUMNS}
+        except (OSError, ValueError):
+            return
+        if state.get('version') != INDEX_VERSION or any(len(c) != state['n'] for c in columns.values()):
+            return  # interrupted update: rebuild from scratch
+        self.state = state
+        self.columns = columns
+
+    def _save(self):
+        os.makedirs(self.index_dir, exist_ok=True)
+        for name, col in self.columns.items():
+            tmp = os.path.join(self.index_dir, name + '.tmp.npy')
+            np.save(tmp, col)
+            os.replace(tmp, os.path.join(self.index_dir, name + '.npy'))
+        self.state['n'] = len(self.columns['time_us'])
+        tmp = os.path.join(self.index_dir, STATE_NAME + '.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(self.state, f)
+        os.replace(tmp, os.path.join(self.index_dir, STATE_NAME))
+        self._load()
+
+    def _source_id(self, name):
+        self.state['sources'].append(name)
+        return len(self.state['sources']) - 1
+
+    def update(self, rebuild=False):
+        """
+        Index new legacy files, new or rewritten shards and new segment records.
+
+        Records of a shard replace the rows of the legacy files it was made from.
+
+        Returns:
+        --------
+        int
+            Number of records added
+        """
+        if rebuild:
+            self._empty()
+        if not os.path.isdir(self.dump_dir):
+            return 0
+        new = {name: [] for name in COLUMNS}
+
+        def add(t_us, power, src, rec):
+            new['time_us'].append(np.atleast_1d(np.asarray(t_us, dtype=np.int64)))
+            new['power'].append(np.atleast_1d(np.asarray(power, dtype=np.float64)))
+            n = len(new['time_us'][-1])
+            new['src'].append(np.full(n, src, dtype=np.int32))
+            new['rec'].append(np.atleast_1d(np.asarray(rec, dtype=np.int32)))
+
+        segments = self.state['segments']
+        shards = self.state.setdefault('shards', {})
+        drop = set()
+        mtime = os.stat(self.dump_dir).st_mtime_ns
+        if mtime != self.state['dir_mtime_ns']:
+            # directory changed: look for new files, shards and segments
+            names = sorted(os.listdir(self.dump_dir))
+            for name in names:
+                if not (name.startswith(SHARD_PREFIX + "dump_") and name.endswith(SHARD_EXT)):
+                    continue
+                st = os.stat(os.path.join(self.dump_dir, name))
+                info = shards.get(name)
+                if info is not None and info['stamp'] == [st.st_size, st.st_mtime_ns]:
+                    continue
+                shard = DumpShard(os.path.join(self.dump_dir, name))
+                if info is None:
+                    info = shards[name] = {'src': self._source_id(name)}
+                else:
+                    drop.add(info['src'])
+                ids = {n: i for i, n in enumerate(self.state['sources'])}
+                drop.update(ids[n] for n in shard.names if n in ids)
+                self.state['sources'] += [n for n in shard.names if n not in ids]  # never indexed as files
+                add(shard.time_us, shard.column('power'), info['src'], np.arange(shard.n_records))
+                info['stamp'] = [st.st_size, st.st_mtime_ns]
+            known = set(self.state['sources'])
+            legacy = [n for n in names if n.startswith("dump_") and n.endswith(".npz") and n not in known]
+            complete = True
+            for name in legacy:
+                t = legacy_time(name)
+                if t is None:
+                    continue
+                try:
+                    with np.load(os.path.join(self.dump_dir, name)) as d:
+                        power = float(d["power"])
+                except (OSError, ValueError, KeyError):
+                    complete = False  # still being written; retried on the next update
+                    continue
+                add(to_us(t), power, self._source_id(name), 0)
+            for name in names:
+                if name.startswith(SEGMENT_PREFIX) and name not in segments and \
+                        os.path.exists(os.path.join(self.dump_dir, name, SEGMENT_META)):
+                    segments[name] = {'src': self._source_id(name), 'n': 0, 'closed': False}
+            if complete:
+                self.state['dir_mtime_ns'] = mtime
+        for name, info in segments.items():
+            if info['closed']:
+                continue
+            path = os.path.join(self.dump_dir, name)
+            if not os.path.isdir(path):
+                info['closed'] = True
+                continue
+            seg = DumpSegment(path)
+            if seg.n_records > info['n']:
+                sl = slice(info['n'], seg.n_records)
+                add(np.round(np.asarray(seg.time[sl]) * 1e6).astype(np.int64), seg.power[sl],
+                    info['src'], np.arange(sl.start, sl.stop))
+                info['n'] = seg.n_records
+            info['closed'] = bool(seg.meta.get('closed'))
+
+        added = sum(len(a) for a in new['time_us'])
+        if not added and not drop and not rebuild:
+            self._save_state_only()
+            return 0
+        new = {name: np.concatenate(new[name]) if new[name] else np.zeros(0, dtype=dt)
+               for name, dt in COLUMNS.items()}
+        order = np.argsort(new['time_us'], kind='stable')
+        new = {name: c[order] for name, c in new.items()}
+        old = self.columns
+        if not drop and not rebuild and self.state['n'] and new['time_us'][0] >= old['time_us'][-1] \
+                and self._append(new):
+            return added
+        if drop:
+            keep = ~np.isin(old['src'], np.fromiter(drop, dtype=np.int32))
+            old = {name: np.asarray(c)[keep] for name, c in old.items()}
+        cols = {name: np.concatenate([np.asarray(old[name]), new[name]]) for name in COLUMNS}
+        t = cols['time_us']
+        if np.any(np.diff(t) < 0):
+            order = np.argsort(t, kind='stable')
+            cols = {name: c[order] for name, c in cols.items()}
+        self.columns = cols
+        self._save()
+        return added
+
+    def _append(self, new):
+        """
+        Append rows that sort after the index to the column files in place.
+
+        On False the caller rewrites every column (a partly extended file is
+        replaced then; until the state is saved its length does not match).
+        """
+        for name in COLUMNS:
+            if not _append_npy(os.path.join(self.index_dir, name + '.npy'), new[name]):
+                return False
+        self.state['n'] += len(new['time_us'])
+        self._save_state_only()
+        self._load()
+        return True
+
+    def _save_state_only(self):
+        if not os.path.isdir(self.index_dir):
+            return
+        tmp = os.path.join(self.index_dir, STATE_NAME + '.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(self.state, f)
+        os.replace(tmp, os.path.join(self.index_dir, STATE_NAME))
+
+    def __len__(self):
+        return len(self.columns['time_us'])
+
+    @property
+    def time_us(self):
+        return self.columns['time_us']
+
+    @property
+    def power(self):
+        return self.columns['power']
+
+    @property
+    def times(self):
+        """Record times as POSIX seconds."""
+        return self.columns['time_us'] / 1e6
+
+    def range(self, t_start=None, t_stop=None):
+        """Index slice of the records with t_start <= time <= t_stop (datetime or POSIX s)."""
+        t = self.columns['time_us']
+        i0 = 0 if t_start is None else int(np.searchsorted(t, to_us(t_start), side='left'))
+        i1 = len(t) if t_stop is None else int(np.searchsorted(t, to_us(t_stop), side='right'))
+        return slice(i0, i1)
+
+    def source_path(self, src):
+        return os.path.join(self.dump_dir, self.state['sources'][src])
+
+    def iter_spectra(self, sl, with_rows=False):
+        """
+        Yield (freq, fft) for the records of an index slice, in time order.
+
+        Segment and shard records are read from memory-mapped spectrum arrays;
+        legacy files are opened one by one. Records stored without a spectrum
+        are skipped, so with_rows=True yields (row, freq, fft) with the index
+        row of each spectrum.
+        """
+        src = np.asarray(self.columns['src'][sl])
+        rec = np.asarray(self.columns['rec'][sl])
+        rows = range(len(self))[sl]
+        segments = {}
+        for row, s, r in zip(rows, src, rec):
+            lead = (row,) if with_rows else ()
+            name = self.state['sources'][s]
+            if name.startswith(SHARD_PREFIX):
+                if s not in segments:
+                    shard = DumpShard(self.source_path(s))
+                    freq = shard.static_value('freq') if 'freq' in shard.static else shard.column('freq')
+                    segments[s] = (freq, shard.column('fft'))
+                freq, fft = segments[s]
+                yield lead + ((freq if freq.ndim == 1 else freq[r]), fft[r])
+            elif name.startswith(SEGMENT_PREFIX):
+                if s not in segments:
+                    seg = DumpSegment(self.source_path(s))
+                    segments[s] = (seg.freq, seg.fft if 'fft' in seg.fields else None)
+                freq, fft = segments[s]
+                if fft is not None:
+                    yield lead + (freq, fft[r])
+            else:
+                with np.load(self.source_path(s)) as d:
+                    yield lead + (d["freq"], d["fft"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build or update the time index of a dump directory')
+    parser.add_argument('dump_dir', nargs='?', default='LIVE_DISPLAY_DUMP', help='Dump directory')
+    parser.add_argument('--rebuild', action='store_true', help='Discard the index and re-read everything')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.dump_dir):
+        print(f"Error: directory '{args.dump_dir}' not found")
+        sys.exit(1)
+    idx = DumpIndex(args.dump_dir)
+    added = idx.update(rebuild=args.rebuild)
+    print(f"Indexed {added} new records, {len(idx)} in total")
+    if len(idx):
+        t = idx.times
+        print(f"From {datetime.fromtimestamp(t[0]):%Y-%m-%d %H:%M:%S.%f} "
+              f"to {datetime.fromtimestamp(t[-1]):%Y-%m-%d %H:%M:%S.%f}")
+
+
+if __name__ == '__main__':
+    main()
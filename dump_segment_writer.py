@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+# dump_segment_writer.py - Rolling segment format for the live radiometer dumps
+# Replaces one npz per frame with one directory per segment: meta.json holds the static
+# metadata (center frequency, bandwidth, reference level), freq.npy the frequency axis
+# written once, and preallocated .npy memmaps hold one row per record for time, power
+# and optionally the spectrum and raw IQ. A segment is closed and a new one started after
+# max_records records or max_seconds, and closed segments are shrunk to their records.
+
+import os
+import sys
+import json
+import argparse
+from datetime import datetime
+import numpy as np
+from numpy.lib import format as npy_format
+
+SEGMENT_PREFIX = "seg_"
+META_NAME = "meta.json"
+FREQ_NAME = "freq.npy"
+FORMAT_VERSION = 1
+
+
+def _write_meta(path, meta):
+    tmp = os.path.join(path, META_NAME + '.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp, os.path.join(path, META_NAME))
+
+
+def _shrink_npy(path, n_rows):
+    """Rewrite the .npy header for n_rows rows and truncate the file (in place)."""
+    with open(path, 'r+b') as f:
+        version = npy_format.read_magic(f)
+        if version != (1, 0):
+            return False
+        shape, fortran, dtype = npy_format.read_array_header_1_0(f)
+        offset = f.tell()
+        header = {'descr': npy_format.dtype_to_descr(dtype), 'fortran_order': fortran,
+                  'shape': (n_rows,) + tuple(shape[1:])}
+        f.seek(0)
+        npy_format.write_array_header_1_0(f, header)
+        if f.tell() != offset:
+            # header length changed; keep the preallocated file (readers use n_records)
+            f.seek(0)
+            header['shape'] = tuple(shape)
+            npy_format.write_array_header_1_0(f, header)
+            return False
+        f.truncate(offset + n_rows * int(np.prod(shape[1:], dtype=np.int64)) * dtype.itemsize)
+    return True
+
+
+class DumpSegmentWriter:
+    """
+    Appends live-display records to rolling segment directories.
+
+    Parameters:
+    -----------
+    directory : str
+        Dump directory (e.g. LIVE_DISPLAY_DUMP); segments are created inside it
+    freqs : numpy.ndarray
+        Frequency axis of the spectra, stored once per segment
+    rec_len : int, optional
+        IQ samples per record; required when store_iq is set
+    store_fft : bool
+        Store one spectrum per record
+    store_iq : bool
+        Store the raw IQ record (complex64)
+    max_records : int
+        Records per segment (the arrays are preallocated to this length)
+    max_seconds : float
+        Start a new segment once a segment spans this long
+    metadata : dict, optional
+        Static JSON-serialisable values (center_freq, bandwidth, ref_level, ...)
+    flush_every : int
+        Records between updates of n_records in meta.json
+    """
+
+    def __init__(self, directory, freqs, rec_len=None, store_fft=True, store_iq=False,
+                 max_records=36000, max_seconds=3600.0, metadata=None, flush_every=100):
+        if store_iq and not rec_len:
+            raise ValueError("rec_len is required to store IQ records")
+        self.directory = directory
+        self.freqs = np.asarray(freqs, dtype=np.float64)
+        self.rec_len = rec_len
+        self.store_fft = store_fft
+        self.store_iq = store_iq
+        self.max_records = int(max_records)
+        self.max_seconds = max_seconds
+        self.metadata = metadata or {}
+        self.flush_every = flush_every
+        os.makedirs(directory, exist_ok=True)
+        self.path = None
+        self.meta = None
+        self.arrays = {}
+        self.n = 0
+        self.segments = []
+
+    def _fields(self):
+        fields = {'time': ((), np.float64), 'power': ((), np.float64)}
+        if self.store_fft:
+            fields['fft'] = ((len(self.freqs),), np.float32)
+        if self.store_iq:
+            fields['iq'] = ((self.rec_len,), np.complex64)
+        return fields
+
+    def _open_segment(self, t):
+        stamp = datetime.fromtimestamp(t).strftime("%Y%m%d_%H%M%S_%f")
+        self.path = os.path.join(self.directory, f"{SEGMENT_PREFIX}{stamp}")
+        os.makedirs(self.path, exist_ok=True)
+        np.save(os.path.join(self.path, FREQ_NAME), self.freqs)
+        self.arrays = {}
+        for name, (shape, dtype) in self._fields().items():
+            arr = npy_format.open_memmap(os.path.join(self.path, name + '.npy'), mode='w+',
+                                         dtype=dtype, shape=(self.max_records,) + shape)
+            if name == 'time':
+                arr[:] = np.nan  # unwritten rows, lets readers recover after a crash
+            self.arrays[name] = arr
+        self.n = 0
+        self.meta = {'version': FORMAT_VERSION, 'fields': list(self.arrays), 'capacity': self.max_records,
+                     'n_records': 0, 'closed': False, 't_first': t, 't_last': t,
+                     'metadata': self.metadata}
+        _write_meta(self.path, self.meta)
+        self.segments.append(self.path)
+
+    def append(self, t, power, fft=None, iq=None):
+        """
+        Add one record.
+
+        Parameters:
+        -----------
+        t : float
+            POSIX time of the record
+        power : float
+            Total power
+        fft : numpy.ndarray, optional
+            Spectrum (required if store_fft)
+        iq : numpy.ndarray, optional
+            Raw IQ record (required if store_iq); shorter records are zero-padded
+        """
+        if self.path is None or self.n >= self.max_records or t - self.meta['t_first'] >= self.max_seconds:
+            self.close()
+            self._open_segment(t)
+        i = self.n
+        if self.store_fft:
+            self.arrays['fft'][i] = fft
+        if self.store_iq:
+            m = min(len(iq), self.rec_len)
+            self.arrays['iq'][i, :m] = iq[:m]
+        self.arrays['power'][i] = power
+        self.arrays['time'][i] = t  # written last: a finite time marks a complete record
+        self.n += 1
+        self.meta['t_last'] = t
+        if self.n % self.flush_every == 0:
+            self.flush()
+
+    def flush(self):
+        if self.path is None:
+            return
+        for arr in self.arrays.values():
+            arr.flush()
+        self.meta['n_records'] = self.n
+        _write_meta(self.path, self.meta)
+
+    def close(self):
+        """Finish the current segment and shrink its arrays to the records written."""
+        if self.path is None:
+            return
+        self.flush()
+        names = list(self.arrays)
+        self.arrays = {}  # release the memmaps before resizing the files
+        for name in names:
+            _shrink_npy(os.path.join(self.path, name + '.npy'), self.n)
+        self.meta['closed'] = True
+        _write_meta(self.path, self.meta)
+        self.path = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class DumpSegment:
+    """
+    Read access to one segment; arrays are memory-mapped and cut to the stored records.
+
+    Parameters:
+    -----------
+    path : str
+        Segment directory
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, META_NAME), 'r') as f:
+            self.meta = json.load(f)
+        self.metadata = self.meta.get('metadata', {})
+        self.fields = self.meta['fields']
+        self.n_records = self.meta['n_records']
+        if not self.meta.get('closed'):
+            # still being written or the writer died: count the complete records
+            t = self._load('time', self.meta['capacity'])
+            self.n_records = max(self.n_records, int(np.argmin(np.isfinite(np.append(t, np.nan)))))
+        self._cache = {}
+
+    def _load(self, name, n):
+        arr = np.load(os.path.join(self.path, name + '.npy'), mmap_mode='r')
+        return arr[:n]
+
+    def __getattr__(self, name):
+        if name in ('time', 'power', 'fft', 'iq'):
+            if name not in self.fields:
+                raise AttributeError(f"Segment {self.path} has no '{name}' records")
+            if name not in self._cache:
+                self._cache[name] = self._load(name, self.n_records)
+            return self._cache[name]
+        raise AttributeError(name)
+
+    @property
+    def freq(self):
+        return np.load(os.path.join(self.path, FREQ_NAME))
+
+    @property
+    def t_first(self):
+        return self.meta['t_first']
+
+    @property
+    def t_last(self):
+        return float(self.time[-1]) if self.n_records else self.meta['t_first']
+
+    def index_range(self, t_start=None, t_stop=None):
+        """Record slice with t_start <= time <= t_stop (times are increasing)."""
+        t = self.time
+        i0 = 0 if t_start is None else int(np.searchsorted(t, t_start, side='left'))
+        i1 = len(t) if t_stop is None else int(np.searchsorted(t, t_stop, side='right'))
+        return slice(i0, i1)
+
+
+def list_segments(directory):
+    """Segment directories of a dump directory, in time order."""
+    if not os.path.isdir(directory):
+        return []
+    names = sorted(n for n in os.listdir(directory)
+                   if n.startswith(SEGMENT_PREFIX) and os.path.exists(os.path.join(directory, n, META_NAME)))
+    return [os.path.join(directory, n) for n in names]
+
+
+def read_range(directory, t_start=None, t_stop=None, fields=('time', 'power')):
+    """
+    Records of all segments between two POSIX times.
+
+    Returns:
+    --------
+    dict
+        field name -> concatenated array (fields a segment lacks are skipped)
+    """
+    parts = {name: [] for name in fields}
+    for path in list_segments(directory):
+        seg = DumpSegment(path)
+        if not seg.n_records:
+            continue
+        if (t_stop is not None and seg.t_first > t_stop) or (t_start is not None and seg.t_last < t_start):
+            continue
+        sl = seg.index_range(t_start, t_stop)
+        for name in fields:
+            if name in seg.fields:
+                parts[name].append(np.asarray(getattr(seg, name)[sl]))
+    return {name: np.concatenate(p) for name, p in parts.items() if p}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Summarise the dump segments of a directory')
+    parser.add_argument('directory', nargs='?', default='LIVE_DISPLAY_DUMP', help='Dump directory')
+    args = parser.parse_args()
+
+    segments = list_segments(args.directory)
+    if not segments:
+        print(f"No dump segments in {args.directory}")
+        sys.exit(1)
+    total = 0
+    for path in segments:
+        seg = DumpSegment(path)
+        total += seg.n_records
+        state = 'closed' if seg.meta.get('closed') else 'open'
+        print(f"{os.path.basename(path)}: {seg.n_records} records, "
+              f"{datetime.fromtimestamp(seg.t_first):%Y-%m-%d %H:%M:%S} to "
+              f"{datetime.fromtimestamp(seg.t_last):%H:%M:%S}, fields {', '.join(seg.fields)} ({state})")
+    print(f"{len(segments)} segments, {total} records")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,10 @@
 import numpy as np
-import pandas as pd
 import matplotlib.pyplot as plt
+from csv_cache import load_if_samples
 
 def process_if_csv(csv_path, window_size=1024, Fs=112e6):
-    # Read IF values from CSV
-    df = pd.read_csv(csv_path)
-    data = df['IF_Value'].to_numpy(dtype=np.float32)
+    # Read IF values from CSV (IF_Value is the last column; cached as .npy after the first run)
+    data = np.asarray(load_if_samples(csv_path), dtype=np.float32)
     
     num_windows = len(data) // window_size
     data = data[:num_windows * window_size]  # Truncate to full windows
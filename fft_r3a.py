@@ -3,11 +3,13 @@
 # Based on the Streaming IF Sample Data File Format documentation
 
 import os
-import glob
-import struct
 import numpy as np
 import matplotlib.pyplot as plt
-import csv
+import argparse
+from r3f_reader import list_r3a_files, iter_r3a_chunks
+from spectrogram_store import SpectrogramStore
+from if_correction import load_correction
+from waterfall_tiles import WaterfallTiles, WaterfallViewer
 
 def read_r3a_files(input_dir):
     """
@@ -22,69 +24,98 @@ def read_r3a_files(input_dir):
     --------
     numpy.ndarray
         Array of concatenated samples from all .r3a files
+
+    Notes:
+    ------
+    The whole capture is held in memory (4 bytes per sample). For long
+    captures iterate with iter_r3a_chunks() instead.
     """
-    file_paths = sorted(glob.glob(os.path.join(input_dir, '*.r3a')))
-    all_samples = []
-    for fp in file_paths:
-        with open(fp, 'rb') as f:
-            data = f.read()
-            num = len(data) // 2
-            samples = struct.unpack(f'<{num}h', data)
-            all_samples.extend(samples)
-    return np.array(all_samples, dtype=np.float32)
+    file_paths = list_r3a_files(input_dir)
+    total = sum(os.path.getsize(fp) // 2 for fp in file_paths)
+    all_samples = np.empty(total, dtype=np.float32)
+    pos = 0
+    for chunk in iter_r3a_chunks(file_paths, 1 << 22):
+        all_samples[pos:pos + len(chunk)] = chunk
+        pos += len(chunk)
+    return all_samples
 
 def main():
     """Main processing function for .r3a files"""
+    parser = argparse.ArgumentParser(description='FFT a directory of .r3a files into a spectrogram store')
+    parser.add_argument('--csv', help='Also export a small time/frequency window (dB) to this CSV file')
+    parser.add_argument('--t-start', type=float, help='CSV export start time (s from capture start)')
+    parser.add_argument('--t-stop', type=float, help='CSV export stop time (s from capture start)')
+    parser.add_argument('--f-start', type=float, help='CSV export start frequency (MHz)')
+    parser.add_argument('--f-stop', type=float, help='CSV export stop frequency (MHz)')
+    parser.add_argument('--float16', action='store_true', help='Store spectra in dB as float16 to halve the size')
+    parser.add_argument('--no-correction', action='store_true',
+                        help='Do not apply the IF correction tables from the .r3h header')
+    args = parser.parse_args()
+
     IF_DATA_DIR = "IF_data_dump"
     OUTPUT_DIR = "IF_spectra_dump"
     window_size = 1024
     Fs = 112e6
     tuning_freq_MHz = 102  # shift by tuning frequency
 
-    # Create output directory if it doesn't exist
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
-    
-    # Read and process all .r3a files
-    data = read_r3a_files(IF_DATA_DIR)
-    num_windows = len(data) // window_size
-    data = data[:num_windows * window_size]
+    freqs = np.fft.fftfreq(window_size, d=1/Fs)[:window_size//2] / 1e6 + tuning_freq_MHz - Fs / 4e6
 
-    waterfall = []
+    # Stream the .r3a files in chunks of whole windows. Only the chunk buffer and
+    # one chunk of spectra are in memory; the spectra go straight to the store, so
+    # memory does not grow with the capture length
+    windows_per_chunk = 256
+    chunk_buf = np.empty(window_size * windows_per_chunk, dtype=np.float32)
+    num_windows = 0
 
-    freqs = np.fft.fftfreq(window_size, d=1/Fs)[:window_size//2] / 1e6 + tuning_freq_MHz - Fs / 4e6
+    # IF amplitude correction from the capture header, as a per-bin power gain
+    correction = None if args.no_correction else load_correction(IF_DATA_DIR)
+    if correction is not None and correction.valid:
+        print(f"Applying IF correction from the header ({len(correction.freq)} table entries)")
+    else:
+        correction = None
 
-    for i in range(num_windows):
-        segment = data[i*window_size:(i+1)*window_size]
-        spec = np.fft.fft(segment)
-        power = np.abs(spec[:window_size//2])**2
-        waterfall.append(power)
+    # linear power of int16 FFTs (~1e7) overflows float16 (max 65504), so float16 stores dB
+    store = SpectrogramStore(OUTPUT_DIR, mode='w', freqs=freqs,
+                             dtype='float16' if args.float16 else 'float32',
+                             metadata={'source': os.path.abspath(IF_DATA_DIR), 'window_size': window_size,
+                                       'sample_rate': Fs, 'time_unit': 's', 'freq_unit': 'MHz',
+                                       'quantity': 'power_db' if args.float16 else 'power',
+                                       'if_corrected': correction is not None})
+    power_sum = np.zeros(len(freqs), dtype=np.float64)
+    for chunk in iter_r3a_chunks(IF_DATA_DIR, len(chunk_buf), out=chunk_buf):
+        n = len(chunk) // window_size
+        if n == 0:
+            break
+        segments = chunk[:n * window_size].reshape(n, window_size)
+        spec = np.fft.rfft(segments, axis=1)[:, :window_size//2]
+        power = spec.real**2 + spec.imag**2
+        if correction is not None:
+            correction.apply(power, window_size, Fs, power=True)
+        times = (num_windows + np.arange(n)) * (window_size / Fs)
+        power_sum += power.sum(axis=0)
+        store.append(times, 10 * np.log10(power + 1e-12) if args.float16 else power)
+        num_windows += n
 
-        # Dump this window’s spectrum to CSV
-        csv_path = os.path.join(OUTPUT_DIR, f'window_{i:05d}.csv')
-        with open(csv_path, 'w', newline='') as cf:
-            writer = csv.writer(cf)
-            writer.writerow(['Frequency_MHz', 'Power_dB'])
-            for fr, p in zip(freqs, 10*np.log10(power + 1e-12)):
-                writer.writerow([fr, p])
+    if num_windows == 0:
+        store.close()
+        print(f"No complete {window_size}-sample window in {IF_DATA_DIR}")
+        return
+    print(f"Wrote {num_windows} spectra to {OUTPUT_DIR}")
+    if args.csv:
+        try:
+            n = store.export_csv(args.csv, args.t_start, args.t_stop, args.f_start, args.f_stop)
+            print(f"Exported {n} spectra to {args.csv}")
+        except ValueError as e:
+            print(f"CSV export skipped: {e}")
 
-    waterfall = np.array(waterfall)
-    avg_spectrum = np.mean(waterfall, axis=0)
+    avg_spectrum = power_sum / num_windows
+    store.close()
 
-    # Waterfall plot
-    plt.figure(figsize=(10,6))
-    plt.imshow(
-        10*np.log10(waterfall + 1e-12),
-        aspect='auto',
-        extent=[freqs[0], freqs[-1], 0, num_windows],
-        origin='lower',
-        cmap='viridis'
-    )
-    plt.colorbar(label='Power (dB)')
-    plt.xlabel('Frequency (MHz)')
-    plt.ylabel('Time Window Index')
-    plt.title('Waterfall Plot (IF Data)')
-    plt.tight_layout()
-    plt.show()
+    # Tiled waterfall: only the tiles visible at the current zoom are loaded
+    tiles = WaterfallTiles(OUTPUT_DIR)
+    if not tiles.up_to_date():
+        tiles.build()
+    WaterfallViewer(tiles).show('Waterfall Plot (IF Data)')
 
     # Average spectrum plot
     plt.figure(figsize=(8,4))
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# if_correction.py - IF channel equaliser from the R3F/R3H correction tables
+# The header of every streamed capture carries the analyzer's IF amplitude (dB) and phase
+# (degrees) correction at up to 501 frequencies. This module interpolates those tables
+# onto the bins of a real FFT once per (FFT length, sample rate) and caches the result,
+# so the correction costs one multiply per bin inside an existing FFT loop.
+
+import os
+import glob
+import argparse
+import numpy as np
+
+from r3f_reader import read_r3f_header
+
+
+class IFCorrection:
+    """
+    Frequency-domain equaliser built from one header's correction tables.
+
+    Parameters:
+    -----------
+    header : dict
+        Parsed header (see r3f_reader.parse_r3f_header)
+
+    Notes:
+    ------
+    The tables are taken as the correction to apply, i.e. corrected =
+    measured * 10**(amp/20) * exp(j*phase). Table frequencies are IF
+    frequencies; tables given at RF (around center_freq) are shifted to IF
+    using the header's center and IF center frequencies. Bins outside the
+    table range use the nearest table entry.
+    """
+
+    def __init__(self, header):
+        self.freq = np.asarray(header['correction_freq'], dtype=np.float64)
+        self.amp_db = np.asarray(header['correction_amp'], dtype=np.float64)
+        self.phase_deg = np.asarray(header['correction_phase'], dtype=np.float64)
+        self.sample_rate = header.get('sample_rate') or 112e6
+        center = header.get('center_freq') or 0.0
+        if_center = header.get('if_center_freq') or 0.0
+        if len(self.freq) and center and self.freq.min() > self.sample_rate:
+            self.freq = self.freq - center + if_center
+        order = np.argsort(self.freq, kind='stable')
+        self.freq = self.freq[order]
+        self.amp_db = self.amp_db[order]
+        self.phase_deg = self.phase_deg[order]
+        self._cache = {}
+
+    @property
+    def valid(self):
+        """True when the header holds a non-empty correction table."""
+        return len(self.freq) > 0
+
+    def equaliser(self, nfft, fs=None, power=False):
+        """
+        Correction for the bins of np.fft.rfft(x, nfft) sampled at fs.
+
+        Parameters:
+        -----------
+        nfft : int
+            FFT length
+        fs : float, optional
+            Sample rate in Hz (default: the header's sample rate)
+        power : bool
+            Return the real power correction |H|**2 instead of the complex
+            voltage correction H
+
+        Returns:
+        --------
+        numpy.ndarray
+            nfft // 2 + 1 values (float32 for power, complex64 otherwise).
+            Cached; treat as read-only.
+        """
+        fs = float(fs or self.sample_rate)
+        key = (int(nfft), fs, bool(power))
+        eq = self._cache.get(key)
+        if eq is not None:
+            return eq
+        bins = np.fft.rfftfreq(int(nfft), d=1.0 / fs)
+        if not self.valid:
+            eq = np.ones(len(bins), dtype=np.float32 if power else np.complex64)
+        else:
+            amp = np.interp(bins, self.freq, self.amp_db)
+            if power:
+                eq = (10.0 ** (amp / 10.0)).astype(np.float32)
+            else:
+                phase = np.interp(bins, self.freq, np.unwrap(np.radians(self.phase_deg)))
+                eq = (10.0 ** (amp / 20.0) * np.exp(1j * phase)).astype(np.complex64)
+        eq.setflags(write=False)
+        self._cache[key] = eq
+        return eq
+
+    def apply(self, spectra, nfft, fs=None, power=False):
+        """
+        Equalise rfft output (or power spectra) in place along the last axis.
+
+        Spectra may hold only the first n bins (e.g. rfft(...)[..., :nfft//2]).
+        """
+        eq = self.equaliser(nfft, fs, power)
+        spectra *= eq[:spectra.shape[-1]]
+        return spectra
+
+
+_corrections = {}
+
+
+def find_header(path):
+    """First .r3h (else .r3f) header in a capture directory, or path itself if it is a file."""
+    if os.path.isfile(path):
+        return path
+    for pattern in ('*.r3h', '*.r3f'):
+        found = sorted(glob.glob(os.path.join(path, pattern)))
+        if found:
+            return found[0]
+    return None
+
+
+def load_correction(path):
+    """
+    IFCorrection for a capture file or directory, or None if no header exists.
+
+    All files of one capture share the analyzer setup, so the first header
+    of a directory stands for the whole file set. Results are cached per
+    header file and modification time.
+    """
+    header_path = find_header(path)
+    if header_path is None:
+        return None
+    key = (os.path.abspath(header_path), os.stat(header_path).st_mtime_ns)
+    corr = _corrections.get(key)
+    if corr is None:
+        try:
+            corr = IFCorrection(read_r3f_header(header_path))
+        except ValueError:
+            return None
+        _corrections[key] = corr
+    return corr
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Show the IF correction of a capture')
+    parser.add_argument('path', help='.r3h/.r3f file or capture directory')
+    parser.add_argument('--nfft', type=int, default=1024, help='FFT length for the equaliser')
+    parser.add_argument('--plot', action='store_true', help='Plot the tables and the equaliser')
+    args = parser.parse_args()
+
+    corr = load_correction(args.path)
+    if corr is None:
+        print(f"No R3F/R3H header found at {args.path}")
+        return
+    if not corr.valid:
+        print("Header has an empty correction table")
+        return
+    print(f"{len(corr.freq)} table entries, {corr.freq[0] / 1e6:.3f} .. {corr.freq[-1] / 1e6:.3f} MHz")
+    print(f"Amplitude correction {corr.amp_db.min():.2f} .. {corr.amp_db.max():.2f} dB, "
+          f"phase {corr.phase_deg.min():.1f} .. {corr.phase_deg.max():.1f} deg")
+    if args.plot:
+        import matplotlib.pyplot as plt
+        eq = corr.equaliser(args.nfft)
+        bins = np.fft.rfftfreq(args.nfft, d=1.0 / corr.sample_rate) / 1e6
+        fig, (ax1, ax2) = plt.subplots(2, 1, sharex=True, figsize=(8, 6))
+        ax1.plot(corr.freq / 1e6, corr.amp_db, '.', label='Table')
+        ax1.plot(bins, 20 * np.log10(np.abs(eq)), label=f'Equaliser ({args.nfft} bins)')
+        ax1.set_ylabel('Amplitude (dB)')
+        ax1.legend()
+        ax2.plot(corr.freq / 1e6, corr.phase_deg, '.')
+        ax2.plot(bins, np.degrees(np.angle(eq)))
+        ax2.set_ylabel('Phase (deg)')
+        ax2.set_xlabel('IF frequency (MHz)')
+        plt.tight_layout()
+        plt.show()
+
+
+if __name__ == '__main__':
+    main()
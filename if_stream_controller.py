@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+# if_stream_controller.py - asyncio run controller for IF streaming to disk
+# Status polling, draining closed files from the (RAM disk) output directory, quicklook
+# processing, telemetry and operator commands run as concurrent tasks during the run,
+# instead of one after the other once IFSTREAM_GetActiveStatus reports the end.
+# All RSA API calls go through one dedicated worker thread so the event loop never
+# blocks on the device and the API is never entered from two threads at once.
+
+import os
+import sys
+import time
+import shutil
+import asyncio
+import argparse
+import threading
+from ctypes import CDLL, RTLD_GLOBAL, byref, c_bool, c_char, c_char_p, c_double, c_int, c_long
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from capture_index import CAPTURE_EXTS
+
+DEVSRCH_MAX_NUM_DEVICES = 20
+DEVSRCH_SERIAL_MAX_STRLEN = 100
+DEVSRCH_TYPE_MAX_STRLEN = 20
+DEVINFO_MAX_STRLEN = 100
+
+
+class RSAIFStream:
+    """Blocking IFSTREAM-to-disk control through libRSA_API.so (same calls as stream_IF.py)."""
+
+    def __init__(self, lib_dir="."):
+        RTLD_LAZY = 0x0001
+        LAZYLOAD = RTLD_LAZY | RTLD_GLOBAL
+        self.rsa = CDLL(os.path.join(lib_dir, "libRSA_API.so"), LAZYLOAD)
+        self.usbapi = CDLL(os.path.join(lib_dir, "libcyusb_shared.so"), LAZYLOAD)
+
+    def _check(self, error):
+        if error != 0:
+            self.rsa.DEVICE_GetErrorString.restype = c_char_p
+            raise RuntimeError(self.rsa.DEVICE_GetErrorString(error).decode())
+
+    def connect(self):
+        numDevices = c_int()
+        deviceIDs = (c_int * DEVSRCH_MAX_NUM_DEVICES)()
+        deviceSNs = ((c_char * DEVSRCH_MAX_NUM_DEVICES) * DEVSRCH_SERIAL_MAX_STRLEN)()
+        deviceTypes = ((c_char * DEVSRCH_MAX_NUM_DEVICES) * DEVSRCH_TYPE_MAX_STRLEN)()
+        self._check(self.rsa.DEVICE_Search(byref(numDevices), deviceIDs, deviceSNs, deviceTypes))
+        if numDevices.value == 0:
+            raise RuntimeError("No devices found")
+        self._check(self.rsa.DEVICE_Connect(deviceIDs[0]))
+        sn = (c_char * DEVINFO_MAX_STRLEN)()
+        self._check(self.rsa.DEVICE_GetSerialNumber(sn))
+        self.rsa.CONFIG_Preset()
+        return sn.value.decode()
+
+    def configure(self, output_dir, center_freq, ref_level, file_length_ms, file_count,
+                  base_name="if_capture", file_mode=0):
+        self._check(self.rsa.CONFIG_SetCenterFreq(c_double(center_freq)))
+        self._check(self.rsa.CONFIG_SetReferenceLevel(c_double(ref_level)))
+        self._check(self.rsa.IFSTREAM_SetDiskFilePath(c_char_p(output_dir.encode('utf-8'))))
+        self._check(self.rsa.IFSTREAM_SetDiskFilenameBase(c_char_p(base_name.encode('utf-8'))))
+        self._check(self.rsa.IFSTREAM_SetDiskFilenameSuffix(c_int(1)))  # IFSSDFN_SUFFIX_TIMESTAMP
+        self._check(self.rsa.IFSTREAM_SetDiskFileLength(c_long(file_length_ms)))
+        self._check(self.rsa.IFSTREAM_SetDiskFileMode(c_int(file_mode)))
+        self._check(self.rsa.IFSTREAM_SetDiskFileCount(c_int(file_count)))
+
+    def start(self):
+        self._check(self.rsa.DEVICE_Run())
+        self._check(self.rsa.IFSTREAM_SetEnable(c_bool(True)))
+
+    def is_active(self):
+        writing = c_bool(False)
+        self._check(self.rsa.IFSTREAM_GetActiveStatus(byref(writing)))
+        return writing.value
+
+    def stop(self):
+        self.rsa.IFSTREAM_SetEnable(c_bool(False))
+        self.rsa.DEVICE_Stop()
+
+    def disconnect(self):
+        self.rsa.DEVICE_Disconnect()
+
+
+class SimulatedIFStream:
+    """
+    Stand-in for RSAIFStream that writes noise .r3a files in real time from a thread,
+    for exercising the controller without an instrument.
+    """
+
+    def __init__(self, sample_rate=112e6):
+        self.sample_rate = sample_rate
+        self._thread = None
+        self._stop = threading.Event()
+
+    def connect(self):
+        return "SIMULATED"
+
+    def configure(self, output_dir, center_freq, ref_level, file_length_ms, file_count,
+                  base_name="if_capture", file_mode=0):
+        self.output_dir = output_dir
+        self.file_length_ms = file_length_ms
+        self.file_count = file_count
+        self.base_name = base_name
+
+    def _run(self):
+        n = int(self.sample_rate * self.file_length_ms / 1000)
+        block = (np.random.randn(n) * 300).astype('<i2')
+        for _ in range(self.file_count):
+            t = time.time()
+            stamp = time.strftime('%Y.%m.%d.%H.%M.%S', time.gmtime(t)) + f".{int(t % 1 * 1000):03d}"
+            path = os.path.join(self.output_dir, f"{self.base_name}-{stamp}.r3a")
+            block.tofile(path)
+            if self._stop.wait(max(0.0, self.file_length_ms / 1000 - (time.time() - t))):
+                return
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def is_active(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def disconnect(self):
+        pass
+
+
+class StreamController:
+    """
+    Runs one IF streaming acquisition with concurrent housekeeping tasks.
+
+    Parameters:
+    -----------
+    device : RSAIFStream, NativeIFStream or SimulatedIFStream
+        Configured device backend
+    output_dir : str
+        Directory the device writes into (e.g. a RAM disk)
+    final_dir : str, optional
+        Closed files are moved here during the run (None leaves them in place)
+    poll_interval : float
+        Seconds between IFSTREAM_GetActiveStatus calls
+    settle_s : float
+        A file counts as closed once it has not changed for this long (or a
+        newer file exists)
+    quicklook : bool
+        Run the sparse quicklook analysis on the drained files
+    telemetry_interval : float
+        Seconds between status lines
+    """
+
+    def __init__(self, device, output_dir, final_dir=None, poll_interval=0.01, settle_s=0.2,
+                 quicklook=True, telemetry_interval=1.0):
+        self.device = device
+        self.output_dir = output_dir
+        self.final_dir = final_dir
+        self.poll_interval = poll_interval
+        self.settle_s = settle_s
+        self.telemetry_interval = telemetry_interval
+        self._rsa_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='rsa')
+        self._io_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='io')
+        self.watcher = None
+        if quicklook:
+            from quicklook_watcher import QuicklookWatcher
+            self.watcher = QuicklookWatcher(final_dir or output_dir, settle_s=settle_s)
+        self.files_moved = 0
+        self.bytes_moved = 0
+        self.active = False
+        self.last_power_db = None
+        self.t_start = None
+        self._stop_requested = None
+        self._finished = None
+        self._drained = None
+
+    async def _rsa(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._rsa_pool, func, *args)
+
+    async def _io(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._io_pool, func, *args)
+
+    # --- tasks ---
+
+    async def _poll_status(self):
+        while not self._stop_requested.is_set():
+            self.active = await self._rsa(self.device.is_active)
+            if not self.active:
+                break
+            await asyncio.sleep(self.poll_interval)
+        if self.active:
+            await self._rsa(self.device.stop)
+            self.active = False
+        self._finished.set()
+
+    def _closed_files(self, final):
+        names = sorted(f for f in os.listdir(self.output_dir)
+                       if f.lower().endswith(CAPTURE_EXTS + ('.r3h',)))
+        now = time.time()
+        closed = []
+        for i, name in enumerate(names):
+            path = os.path.join(self.output_dir, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if final or i < len(names) - 2 or now - st.st_mtime > self.settle_s:
+                closed.append((path, st.st_size))
+        return closed
+
+    def _move(self, files):
+        for path, size in files:
+            shutil.move(path, os.path.join(self.final_dir, os.path.basename(path)))
+            self.files_moved += 1
+            self.bytes_moved += size
+
+    async def _drain(self):
+        try:
+            await self._drain_files()
+        finally:
+            self._drained.set()
+
+    async def _drain_files(self):
+        if self.final_dir is None:
+            return
+        os.makedirs(self.final_dir, exist_ok=True)
+        while True:
+            final = self._finished.is_set()
+            files = await self._io(self._closed_files, final)
+            if files:
+                await self._io(self._move, files)
+            if final:
+                break
+            await asyncio.sleep(self.poll_interval * 10)
+
+    async def _quicklook(self):
+        if self.watcher is None:
+            return
+        while True:
+            # the last pass runs after the final files have been moved
+            final = self._drained.is_set()
+            results = await self._io(self.watcher.poll)
+            if results:
+                self.last_power_db = results[-1][2]
+            if final:
+                break
+            await asyncio.sleep(0.5)
+
+    async def _telemetry(self):
+        while not self._finished.is_set():
+            print(self.status_line(), flush=True)
+            try:
+                await asyncio.wait_for(self._finished.wait(), self.telemetry_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def status_line(self):
+        elapsed = time.time() - self.t_start
+        rate = self.bytes_moved / max(elapsed, 1e-9) / 1e6
+        power = f", quicklook {self.last_power_db:.2f} dB" if self.last_power_db is not None else ""
+        return (f"t={elapsed:7.2f} s active={self.active} moved {self.files_moved} files "
+                f"({self.bytes_moved / 1e6:.0f} MB, {rate:.1f} MB/s){power}")
+
+    async def _commands(self):
+        """Operator commands from stdin: 'stop', 'status'."""
+        loop = asyncio.get_running_loop()
+        lines = asyncio.Queue()
+
+        def reader():
+            for line in sys.stdin:
+                loop.call_soon_threadsafe(lines.put_nowait, line.strip().lower())
+
+        threading.Thread(target=reader, daemon=True).start()
+        finished = asyncio.ensure_future(self._finished.wait())
+        while not self._finished.is_set():
+            get = asyncio.ensure_future(lines.get())
+            done, _ = await asyncio.wait([get, finished], return_when=asyncio.FIRST_COMPLETED)
+            if get not in done:
+                get.cancel()
+                break
+            cmd = get.result()
+            if cmd in ('stop', 'quit', 'q'):
+                print("Stop requested.")
+                self._stop_requested.set()
+            elif cmd == 'status':
+                print(self.status_line())
+            elif cmd:
+                print(f"Unknown command '{cmd}' (stop, status)")
+
+    # --- run ---
+
+    async def run(self, commands=True):
+        """Start streaming and run all tasks until the acquisition ends and files are drained."""
+        self._stop_requested = asyncio.Event()
+        self._finished = asyncio.Event()
+        self._drained = asyncio.Event()
+        self.t_start = time.time()
+        await self._rsa(self.device.start)
+        self.active = True
+        tasks = [self._poll_status(), self._drain(), self._quicklook(), self._telemetry()]
+        if commands:
+            tasks.append(self._commands())
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            if self.active:
+                await self._rsa(self.device.stop)
+            self._rsa_pool.shutdown()
+            self._io_pool.shutdown()
+        print(self.status_line())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run an IF streaming acquisition with concurrent post-processing')
+    parser.add_argument('--output-dir', default='/mnt/ramdisk/IF_data_temp', help='Device output directory')
+    parser.add_argument('--final-dir', default='IF_data_dump', help='Closed files are moved here during the run')
+    parser.add_argument('--center-freq', type=float, default=1420e6, help='Center frequency in Hz')
+    parser.add_argument('--ref-level', type=float, default=0.0, help='Reference level in dBm')
+    parser.add_argument('--duration', type=float, default=1.0, help='Record duration in seconds')
+    parser.add_argument('--file-length', type=float, default=0.05, help='Length of one file in seconds')
+    parser.add_argument('--framed', action='store_true', help='Write framed .r3f files')
+    parser.add_argument('--no-quicklook', action='store_true', help='Do not run the quicklook analysis')
+    parser.add_argument('--simulate', action='store_true', help='Write noise files instead of using a device')
+    parser.add_argument('--native', action='store_true',
+                        help='Poll the device from the native loop in libifstream_simple.so')
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    if args.simulate:
+        device = SimulatedIFStream()
+    elif args.native:
+        from if_stream_native import NativeIFStream
+        device = NativeIFStream()
+    else:
+        device = RSAIFStream()
+    print(f"Connected: {device.connect()}")
+    file_count = max(1, round(args.duration / args.file_length))
+    device.configure(args.output_dir, args.center_freq, args.ref_level,
+                     int(args.file_length * 1000), file_count, file_mode=int(args.framed))
+    controller = StreamController(device, args.output_dir, args.final_dir,
+                                  poll_interval=args.file_length / 10,
+                                  quicklook=not args.no_quicklook)
+    print("Streaming; type 'stop' or 'status' and Enter.")
+    try:
+        asyncio.run(controller.run(commands=sys.stdin.isatty()))
+    finally:
+        device.disconnect()
+        print("Device disconnected.")
+
+
+if __name__ == '__main__':
+    main()
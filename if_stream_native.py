@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# if_stream_native.py - ctypes bindings to the native IF streaming loop (if_stream_simple.cpp)
+# Build the library once with
+#   g++ -std=c++17 -O2 -shared -fPIC -DIFSTREAM_SIMPLE_NO_MAIN -o libifstream_simple.so if_stream_simple.cpp -ldl -lpthread
+# The status polling (and optionally moving closed files off the RAM disk) then runs in
+# a native thread; Python only configures, starts, reads counters and stops.
+
+import os
+import sys
+import argparse
+from ctypes import CDLL, Structure, POINTER, byref, c_char_p, c_double, c_int, c_int32, c_int64
+
+LIB_NAME = "libifstream_simple.so"
+
+
+class IFSStats(Structure):
+    """Mirror of the ifs_stats struct."""
+    _fields_ = [
+        ('elapsed_s', c_double),
+        ('polls', c_int64),
+        ('active', c_int32),
+        ('running', c_int32),
+        ('files_moved', c_int64),
+        ('bytes_moved', c_int64),
+        ('last_status', c_int32),
+    ]
+
+
+class NativeIFStream:
+    """
+    IF streaming through libifstream_simple.so.
+
+    Same connect/configure/start/is_active/stop/disconnect interface as
+    if_stream_controller.RSAIFStream, so it can be used as the controller's
+    device backend. The library loads ./libRSA_API.so itself, so run from the
+    directory holding the RSA libraries.
+
+    Parameters:
+    -----------
+    lib_path : str
+        Path to libifstream_simple.so
+    poll_ms : int
+        Native status polling interval in milliseconds
+    move_dest : str, optional
+        Let the native thread move closed files here during the run
+    drain_every : int
+        Polls between native file-moving passes
+    """
+
+    def __init__(self, lib_path=LIB_NAME, poll_ms=1, move_dest=None, drain_every=50):
+        if not os.path.exists(lib_path):
+            raise FileNotFoundError(f"{lib_path} not found; build it from if_stream_simple.cpp "
+                                    "with -shared -fPIC -DIFSTREAM_SIMPLE_NO_MAIN")
+        lib = CDLL(os.path.abspath(lib_path))
+        lib.ifs_last_error.restype = c_char_p
+        lib.ifs_load.restype = c_int
+        lib.ifs_connect.restype = c_int
+        lib.ifs_configure.argtypes = [c_double, c_double, c_char_p, c_char_p, c_int, c_int, c_int]
+        lib.ifs_configure.restype = c_int
+        lib.ifs_start.argtypes = [c_int, c_char_p, c_int]
+        lib.ifs_start.restype = c_int
+        lib.ifs_poll.restype = c_int
+        lib.ifs_wait.argtypes = [c_int]
+        lib.ifs_wait.restype = c_int
+        lib.ifs_stop.restype = c_int
+        lib.ifs_move_files.argtypes = [c_char_p, c_char_p, c_int]
+        lib.ifs_move_files.restype = c_int64
+        lib.ifs_get_stats.argtypes = [POINTER(IFSStats)]
+        lib.ifs_get_stats.restype = None
+        lib.ifs_disconnect.restype = c_int
+        self.lib = lib
+        self.poll_ms = poll_ms
+        self.move_dest = move_dest
+        self.drain_every = drain_every
+
+    def _check(self, rc, what):
+        if rc < 0:
+            raise RuntimeError(f"{what} failed: {self.lib.ifs_last_error().decode(errors='replace')}")
+        return rc
+
+    def connect(self):
+        return self._check(self.lib.ifs_connect(), "ifs_connect")
+
+    def configure(self, output_dir, center_freq, ref_level, file_length_ms, file_count,
+                  base_name="if_capture", file_mode=0):
+        self._check(self.lib.ifs_configure(center_freq, ref_level, output_dir.encode('utf-8'),
+                                           base_name.encode('utf-8'), int(file_length_ms),
+                                           int(file_count), int(file_mode)), "ifs_configure")
+
+    def start(self):
+        dest = self.move_dest.encode('utf-8') if self.move_dest else None
+        self._check(self.lib.ifs_start(self.poll_ms, dest, self.drain_every), "ifs_start")
+
+    def is_active(self):
+        return self._check(self.lib.ifs_poll(), "IF streaming") == 1
+
+    def wait(self, timeout=None):
+        """Block outside the GIL until streaming ends (or timeout seconds pass)."""
+        ms = -1 if timeout is None else int(timeout * 1000)
+        return self._check(self.lib.ifs_wait(ms), "IF streaming") == 1
+
+    def stop(self):
+        self._check(self.lib.ifs_stop(), "ifs_stop")
+
+    def move_files(self, src, dst, all_files=True):
+        """Move (closed) files from src to dst natively; returns the number moved."""
+        return self._check(self.lib.ifs_move_files(src.encode('utf-8'), dst.encode('utf-8'),
+                                                   int(all_files)), "ifs_move_files")
+
+    def stats(self):
+        s = IFSStats()
+        self.lib.ifs_get_stats(byref(s))
+        return {name: getattr(s, name) for name, _ in IFSStats._fields_}
+
+    def disconnect(self):
+        self.lib.ifs_disconnect()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='IF streaming with the native polling loop')
+    parser.add_argument('--lib', default=LIB_NAME, help='Path to libifstream_simple.so')
+    parser.add_argument('--output-dir', default='/mnt/ramdisk/IF_data_temp', help='Device output directory')
+    parser.add_argument('--final-dir', default='IF_data_dump', help='Closed files are moved here natively')
+    parser.add_argument('--center-freq', type=float, default=1420e6, help='Center frequency in Hz')
+    parser.add_argument('--ref-level', type=float, default=0.0, help='Reference level in dBm')
+    parser.add_argument('--duration', type=float, default=1.0, help='Record duration in seconds')
+    parser.add_argument('--file-length', type=float, default=0.05, help='Length of one file in seconds')
+    parser.add_argument('--framed', action='store_true', help='Write framed .r3f files')
+    args = parser.parse_args()
+
+    try:
+        dev = NativeIFStream(args.lib, move_dest=args.final_dir)
+        dev.connect()
+        dev.configure(args.output_dir, args.center_freq, args.ref_level, int(args.file_length * 1000),
+                      max(1, round(args.duration / args.file_length)), file_mode=int(args.framed))
+        dev.start()
+    except (OSError, RuntimeError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    try:
+        while dev.wait(timeout=0.5):
+            s = dev.stats()
+            sys.stdout.write(f"\rIF streaming active, {s['elapsed_s']:.2f} s, {s['polls']} polls, "
+                             f"{s['files_moved']} files moved")
+            sys.stdout.flush()
+    except KeyboardInterrupt:
+        print("\nInterrupted.")
+    finally:
+        dev.stop()
+        s = dev.stats()
+        print(f"\nStreaming finished after {s['elapsed_s']:.2f} s: {s['files_moved']} files "
+              f"({s['bytes_moved'] / 1e6:.1f} MB) moved to {args.final_dir}")
+        dev.disconnect()
+
+
+if __name__ == '__main__':
+    main()
@@ -7,6 +7,10 @@
 #include <cstdlib>
 #include <dlfcn.h>
 #include <vector>
+#include <atomic>
+#include <mutex>
+#include <algorithm>
+#include <cstdint>
 
 using namespace std;
 using namespace std::chrono;
@@ -276,6 +280,256 @@ void moveFiles(const string& sourceDir, const string& destDir) {
     cout << "Moved " << fileCount << " files successfully." << endl;
 }
 
+// ---------------------------------------------------------------------------
+// C ABI for Python (ctypes, see if_stream_native.py). Build as a shared library:
+//   g++ -std=c++17 -O2 -shared -fPIC -DIFSTREAM_SIMPLE_NO_MAIN -o libifstream_simple.so if_stream_simple.cpp -ldl -lpthread
+// ifs_start() runs the status-polling loop (and optionally the file draining) in
+// a native thread, so the Python side only has to look at ifs_get_stats().
+// All functions return 0 on success and -1 on failure (see ifs_last_error()).
+// ---------------------------------------------------------------------------
+
+extern "C" {
+
+typedef struct {
+    double elapsed_s;       // time since ifs_start()
+    int64_t polls;          // IFSTREAM_GetActiveStatus calls
+    int32_t active;         // 1 while the device is still writing
+    int32_t running;        // 1 while the native polling thread runs
+    int64_t files_moved;    // files moved by the polling thread or ifs_move_files()
+    int64_t bytes_moved;
+    int32_t last_status;    // last non-zero ReturnStatus, 0 if none
+} ifs_stats;
+
+}
+
+namespace {
+
+thread poll_thread;
+atomic<bool> stop_requested(false);
+atomic<bool> is_active(false);
+atomic<bool> is_running(false);
+atomic<int64_t> n_polls(0);
+atomic<int64_t> n_files_moved(0);
+atomic<int64_t> n_bytes_moved(0);
+atomic<int32_t> last_status(0);
+steady_clock::time_point run_start;
+mutex error_mutex;
+string last_error;
+string drain_src, drain_dst;
+
+void setError(const string& msg, int status = 0) {
+    lock_guard<mutex> lock(error_mutex);
+    last_error = msg;
+    if (status) last_status = status;
+}
+
+bool abiCheck(ReturnStatus rs, const char* operation) {
+    if (rs == 0) return true;
+    string msg = string(operation) + ": code " + to_string(static_cast<int>(rs));
+    if (DEVICE_GetErrorString_func) {
+        const char* details = DEVICE_GetErrorString_func(rs);
+        if (details) msg += string(" (") + details + ")";
+    }
+    setError(msg, static_cast<int>(rs));
+    return false;
+}
+
+// Move the files of src to dst. Unless `all`, the newest `keep_newest` files and
+// anything modified within `settle` are left alone, since the device may still be
+// writing them. Returns the number of files moved.
+int64_t moveClosedFiles(const string& src, const string& dst, bool all,
+                        size_t keep_newest = 2, milliseconds settle = milliseconds(200)) {
+    error_code ec;
+    if (!exists(dst, ec)) create_directories(dst, ec);
+    vector<path> files;
+    for (const auto& entry : directory_iterator(src, ec)) {
+        if (entry.is_regular_file(ec)) files.push_back(entry.path());
+    }
+    sort(files.begin(), files.end());
+    size_t limit = all ? files.size() : (files.size() > keep_newest ? files.size() - keep_newest : 0);
+    auto now = file_time_type::clock::now();
+    int64_t moved = 0;
+    for (size_t i = 0; i < files.size(); i++) {
+        const path& f = files[i];
+        if (!all && i >= limit) {
+            auto mtime = last_write_time(f, ec);
+            if (ec || now - mtime < settle) continue;
+        }
+        uintmax_t size = file_size(f, ec);
+        if (ec) continue;
+        path target = path(dst) / f.filename();
+        rename(f, target, ec);           // cheap when on the same filesystem
+        if (ec) {
+            ec.clear();
+            copy_file(f, target, copy_options::overwrite_existing, ec);
+            if (ec) {
+                setError("Error moving " + f.string() + ": " + ec.message());
+                continue;
+            }
+            remove(f, ec);
+        }
+        moved++;
+        n_files_moved += 1;
+        n_bytes_moved += static_cast<int64_t>(size);
+    }
+    return moved;
+}
+
+void pollLoop(int poll_ms, int drain_every) {
+    is_running = true;
+    int64_t k = 0;
+    while (!stop_requested) {
+        this_thread::sleep_for(milliseconds(poll_ms));
+        bool writing = false;
+        if (!abiCheck(IFSTREAM_GetActiveStatus_func(&writing), "IFSTREAM_GetActiveStatus")) break;
+        n_polls += 1;
+        is_active = writing;
+        if (!writing) break;
+        if (!drain_dst.empty() && ++k % drain_every == 0) {
+            moveClosedFiles(drain_src, drain_dst, false);
+        }
+    }
+    if (!drain_dst.empty() && !is_active) {
+        moveClosedFiles(drain_src, drain_dst, true);
+    }
+    is_running = false;
+}
+
+}  // namespace
+
+extern "C" {
+
+const char* ifs_last_error() {
+    lock_guard<mutex> lock(error_mutex);
+    static string copy;
+    copy = last_error;
+    return copy.c_str();
+}
+
+int ifs_load() {
+    if (rsa_lib) return 0;
+    if (!loadLibraries()) {
+        setError("Failed to load libRSA_API.so / libcyusb_shared.so");
+        return -1;
+    }
+    return 0;
+}
+
+int ifs_connect() {
+    if (ifs_load() != 0) return -1;
+    int deviceID = searchAndConnect();
+    if (deviceID < 0) {
+        setError("Failed to connect to an RSA device");
+        return -1;
+    }
+    if (!abiCheck(CONFIG_Preset_func(), "CONFIG_Preset")) return -1;
+    return deviceID;
+}
+
+int ifs_configure(double center_freq, double ref_level, const char* output_dir,
+                  const char* filename_base, int file_length_ms, int file_count, int file_mode) {
+    if (!rsa_lib) {
+        setError("ifs_connect() has not been called");
+        return -1;
+    }
+    if (!abiCheck(CONFIG_SetCenterFreq_func(center_freq), "CONFIG_SetCenterFreq")) return -1;
+    if (!abiCheck(CONFIG_SetReferenceLevel_func(ref_level), "CONFIG_SetReferenceLevel")) return -1;
+    if (!configureIFStreaming(output_dir, filename_base, file_length_ms, file_count)) {
+        setError("Failed to configure IF streaming");
+        return -1;
+    }
+    if (file_mode != 0 && IFSTREAM_SetDiskFileMode_func) {
+        if (!abiCheck(IFSTREAM_SetDiskFileMode_func(file_mode), "IFSTREAM_SetDiskFileMode")) return -1;
+    }
+    drain_src = output_dir;
+    return 0;
+}
+
+// Start streaming and the native polling thread. If move_dest is non-empty, closed
+// files are moved there every drain_every polls and all remaining files at the end.
+int ifs_start(int poll_ms, const char* move_dest, int drain_every) {
+    if (is_running) {
+        setError("Streaming is already running");
+        return -1;
+    }
+    if (poll_thread.joinable()) poll_thread.join();
+    if (!rsa_lib || !IFSTREAM_GetActiveStatus_func) {
+        setError("Library not loaded or IFSTREAM_GetActiveStatus missing");
+        return -1;
+    }
+    drain_dst = move_dest ? move_dest : "";
+    stop_requested = false;
+    n_polls = 0;
+    last_status = 0;
+    if (!abiCheck(DEVICE_Run_func(), "DEVICE_Run")) return -1;
+    if (!abiCheck(IFSTREAM_SetEnable_func(true), "IFSTREAM_SetEnable")) return -1;
+    run_start = steady_clock::now();
+    is_active = true;
+    is_running = true;
+    poll_thread = thread(pollLoop, max(poll_ms, 1), max(drain_every, 1));
+    return 0;
+}
+
+// 1 while the device is writing, 0 when finished, -1 on error.
+int ifs_poll() {
+    if (last_status != 0 && !is_running) return -1;
+    return is_active ? 1 : 0;
+}
+
+// Block (without the GIL, ctypes releases it) until the polling thread ends or
+// timeout_ms passes (< 0: wait forever). Returns ifs_poll().
+int ifs_wait(int timeout_ms) {
+    auto deadline = steady_clock::now() + milliseconds(timeout_ms);
+    while (is_running) {
+        if (timeout_ms >= 0 && steady_clock::now() >= deadline) break;
+        this_thread::sleep_for(milliseconds(1));
+    }
+    return ifs_poll();
+}
+
+int ifs_stop() {
+    stop_requested = true;
+    if (poll_thread.joinable()) poll_thread.join();
+    if (!rsa_lib) return 0;
+    bool ok = abiCheck(IFSTREAM_SetEnable_func(false), "IFSTREAM_SetEnable");
+    ok = abiCheck(DEVICE_Stop_func(), "DEVICE_Stop") && ok;
+    is_active = false;
+    return ok ? 0 : -1;
+}
+
+// Move closed files (all files if all != 0) from src to dst; returns the count or -1.
+int64_t ifs_move_files(const char* src, const char* dst, int all) {
+    try {
+        return moveClosedFiles(src, dst, all != 0);
+    } catch (const exception& e) {
+        setError(string("ifs_move_files: ") + e.what());
+        return -1;
+    }
+}
+
+void ifs_get_stats(ifs_stats* out) {
+    if (!out) return;
+    out->elapsed_s = duration_cast<duration<double>>(steady_clock::now() - run_start).count();
+    out->polls = n_polls;
+    out->active = is_active ? 1 : 0;
+    out->running = is_running ? 1 : 0;
+    out->files_moved = n_files_moved;
+    out->bytes_moved = n_bytes_moved;
+    out->last_status = last_status;
+}
+
+int ifs_disconnect() {
+    ifs_stop();
+    int rc = 0;
+    if (DEVICE_Disconnect_func && rsa_lib) {
+        rc = abiCheck(DEVICE_Disconnect_func(), "DEVICE_Disconnect") ? 0 : -1;
+    }
+    cleanup();
+    return rc;
+}
+
+}  // extern "C"
+
 #ifndef IFSTREAM_SIMPLE_NO_MAIN
 int main() {
     cout << "RSA API IF Streaming Application" << endl;
@@ -1,10 +1,13 @@
 import numpy as np
 import matplotlib.pyplot as plt
 from ctypes import *
-from datetime import datetime
 import os
 import time
 import scienceplots
+from power_history import PowerHistory
+from trace_accumulator import TraceAccumulator
+from allan_variance import StreamingAllan, optimal_tau
+from dump_segment_writer import DumpSegmentWriter
 
 plt.style.use('science')
 plt.rcParams['text.usetex'] = False  # Disable LaTeX rendering
@@ -71,25 +74,33 @@ if __name__=="__main__":
     ax_fft.legend(["FFT (Instantaneous)", "FFT (Moving Avg)"], loc='upper right')
     line_pow, = ax_pow.plot([],[], 'o-')
     ax_pow.set_title("Power vs time")
-    pow_hist = []
-    pow_db_hist = []  # Store power in dB
-    time_hist = []
-    fft_hist = []
+    history = PowerHistory(display_points=2000, ref_window_s=10.0)
+    fft_avg = TraceAccumulator(rec_len, mode='average', window=20)
+    # Stability of total power and of each channel, O(log N) memory
+    allan_total = StreamingAllan()
+    allan_chan = StreamingAllan(shape=(rec_len,))
     start_time = time.time()
     dump_dir = "LIVE_DISPLAY_DUMP"
     os.makedirs(dump_dir, exist_ok=True)
+    # Frequency axis is fixed for the run; it is stored once per dump segment
+    freqs = np.linspace(center_freq - 56e6/2, center_freq + 56e6/2, rec_len)
+    # One segment per hour (36000 records at 0.1 s) instead of one npz per frame
+    writer = DumpSegmentWriter(dump_dir, freqs, rec_len=rec_len, store_fft=True, store_iq=True,
+                               max_records=36000, max_seconds=3600.0,
+                               metadata={'center_freq': center_freq, 'bandwidth': bandwidth,
+                                         'ref_level': ref_level, 'run_start': start_time})
 
     def format_time_axis(times):
         """Return (scaled_times, label) based on max time."""
-        if not times:
+        if len(times) == 0:
             return times, r"$t\,(s)$"
         max_time = times[-1]
         if max_time < 120:
             return times, r"$t\,(s)$"
         elif max_time < 7200:
-            return [t/60 for t in times], r"$t\,(min)$"
+            return times / 60, r"$t\,(min)$"
         else:
-            return [t/3600 for t in times], r"$t\,(hr)$"
+            return times / 3600, r"$t\,(hr)$"
 
     def on_close(event):
         try:
@@ -106,43 +117,28 @@ if __name__=="__main__":
             if z.size==0: continue
             # fft
             spec = np.fft.fftshift(np.abs(np.fft.fft(z)))
-            freqs = np.linspace(center_freq - 56e6/2, center_freq + 56e6/2, rec_len)
-            # Store FFT for moving average
-            fft_hist.append(spec)
-            if len(fft_hist) > 20:
-                fft_hist.pop(0)
-            # Compute moving average if enough data
-            if len(fft_hist) > 1:
-                spec_avg = np.mean(fft_hist, axis=0)
-            else:
-                spec_avg = spec
+            # Moving average over the last 20 spectra (running sum, O(bins))
+            spec_avg = fft_avg.update(spec)
             # power metric
             p = np.mean(np.abs(z)**2)
-            pow_hist.append(p)
-            current_time = time.time() - start_time
-            time_hist.append(current_time)
-            # --- Power dB scaling ---
-            # Find indices for points within first 10 seconds
-            ten_sec_indices = [i for i, t in enumerate(time_hist) if t <= 10.0]
-            if ten_sec_indices:
-                idx_last = ten_sec_indices[-1] + 1  # up to and including last <=10s
-            else:
-                idx_last = 1  # fallback, should not happen
-            p0db = np.mean(pow_hist[:idx_last])
-            # Convert all power values to dB relative to p0db
-            pow_db_hist = [10 * np.log10(p/p0db) if p0db > 0 else 0 for p in pow_hist]
+            now = time.time()
+            current_time = now - start_time
+            # O(1) update; reference level is the mean over the first 10 s
+            history.append(current_time, p)
+            allan_total.update(p, current_time)
+            allan_chan.update(spec**2, current_time)
             # save
-            ts = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
-            fn = os.path.join(dump_dir, f"dump_{ts}.npz")
-            np.savez(fn, iq=z, fft=spec, freq=freqs, power=p, time=current_time)
+            writer.append(now, p, spec, z)
             # update plots
             line_fft.set_data(freqs, spec)
             line_fft_avg.set_data(freqs, spec_avg)
             ax_fft.relim(); ax_fft.autoscale_view()
             ax_fft.set_xlabel(r"$f\,(Hz)$")
             ax_fft.set_ylabel(r"$P\,\mathrm{(Arbitrary\ Units)}$")
-            # Update time axis scaling and label
-            scaled_time, time_label = format_time_axis(time_hist)
+            # Update time axis scaling and label (display is decimated to a
+            # bounded number of points, so frame cost stays constant)
+            disp_time, pow_db_hist = history.display(db=True)
+            scaled_time, time_label = format_time_axis(disp_time)
             line_pow.set_data(scaled_time, pow_db_hist)
             ax_pow.set_xlabel(time_label)
             ax_pow.set_ylabel(r"$P\,\mathrm{(dB)}$")
@@ -151,8 +147,14 @@ if __name__=="__main__":
     except KeyboardInterrupt:
         rsa.DEVICE_Stop()
         rsa.DEVICE_Disconnect()
-        pass
-
-
-
-
+        if allan_total.count > 4:
+            taus, avar, _ = allan_total.result()
+            print("Allan deviation of total power:")
+            for tau, a in zip(taus, avar):
+                print(f"  tau = {tau:10.2f} s  ADEV = {np.sqrt(a) / history.reference_level:.3e}")
+            print(f"Optimal integration time (total power): {optimal_tau(taus, avar):.2f} s")
+            taus, avar, _ = allan_chan.result()
+            print(f"Optimal integration time per channel: median {np.median(optimal_tau(taus, avar)):.2f} s")
+    finally:
+        # shrink the open segment to the records written
+        writer.close()
@@ -1,7 +1,7 @@
 import argparse
-import csv
 import matplotlib.pyplot as plt
 import numpy as np  # added for FFT
+from csv_cache import load_if_samples
 from matplotlib.ticker import FuncFormatter
 
 NUM_SAMPLES = 112e1  # number of samples to process
@@ -38,27 +38,13 @@ def main():
     parser.add_argument("csv_file", help="Path to input CSV file")
     args = parser.parse_args()
 
-    # values = []
     even_values = np.zeros(int(NUM_SAMPLES))
     odd_values = np.zeros(int(NUM_SAMPLES))
-    with open(args.csv_file, newline="") as f:
-        reader = csv.reader(f)
-        i = 0
-        for row in reader:
-            if not row:
-                continue
-            try:
-                # values.append(float(row[-1]))
-                if i % 2 == 0:
-                    even_values[i // 2] = float(row[-1])
-                else:
-                    odd_values[i // 2] = float(row[-1])                    
-            except ValueError:
-                # skip rows where last column isn't numeric
-                continue
-            i += 1
-            if i >= NUM_SAMPLES * 2:
-                break
+    values = load_if_samples(args.csv_file, count=int(NUM_SAMPLES) * 2)
+    even = values[0::2]
+    odd = values[1::2]
+    even_values[:len(even)] = even
+    odd_values[:len(odd)] = odd
     tuning_freq = 1420e6
     signal_generator_freq = 1400e6  # Hz
     Fs = 56e6  # sample rate in Hz
@@ -1,7 +1,7 @@
 import argparse
-import csv
 import matplotlib.pyplot as plt
 import numpy as np  # added for FFT
+from csv_cache import load_if_samples
 
 NUM_SAMPLES = 112e3  # number of samples to process
 
@@ -12,19 +12,8 @@ def main():
     parser.add_argument("csv_file", help="Path to input CSV file")
     args = parser.parse_args()
 
-    values = []
-    with open(args.csv_file, newline="") as f:
-        reader = csv.reader(f)
-        for row in reader:
-            if not row:
-                continue
-            try:
-                values.append(float(row[-1]))
-            except ValueError:
-                # skip rows where last column isn't numeric
-                continue
-            if len(values) >= NUM_SAMPLES:
-                break
+    # last numeric column, parsed once and cached as .npy
+    values = np.asarray(load_if_samples(args.csv_file, count=int(NUM_SAMPLES)), dtype=np.float64)
 
     tuning_freq = 1420e6
     signal_generator_freq = 1400e6  # Hz
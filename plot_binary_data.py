@@ -1,21 +1,21 @@
 import os
-import glob
 import numpy as np
 import matplotlib.pyplot as plt
+from compact_dumps import iter_records
 
 recLen = 1000  # Must match the record length used in IQ_dump.py
 iq_dir = "IQ_data_dump"
 
-# Get only the first IQ binary file
-iq_files = sorted(glob.glob(os.path.join(iq_dir, "IQ_*.bin")))[:1]
-if not iq_files:
+# Get only the first IQ record (loose IQ_*.bin file or compacted daily shard)
+first = next(iter_records(iq_dir, 'IQ'), None) if os.path.isdir(iq_dir) else None
+if first is None:
     print("No IQ binary files found.")
     exit(1)
 
 samples = []
 
-for filepath in iq_files:
-    data = np.fromfile(filepath, dtype=np.float32)
+for name, rec in [first]:
+    data = rec['iq']
     if data.size != recLen * 2:
         continue  # skip files with unexpected size
     i = data[::2]
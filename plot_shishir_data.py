@@ -1,6 +1,7 @@
 import argparse
-import csv
+import numpy as np
 import matplotlib.pyplot as plt
+from csv_cache import load_if_samples
 
 def main():
     parser = argparse.ArgumentParser(
@@ -9,19 +10,7 @@ def main():
     parser.add_argument("csv_file", help="Path to input CSV file")
     args = parser.parse_args()
 
-    values = []
-    with open(args.csv_file, newline="") as f:
-        reader = csv.reader(f)
-        for row in reader:
-            if not row:
-                continue
-            try:
-                values.append(float(row[-1]))
-            except ValueError:
-                # skip rows where last column isn't numeric
-                continue
-            if len(values) >= 3*4096:
-                break
+    values = np.asarray(load_if_samples(args.csv_file, count=3*4096), dtype=np.float64)
 
     plt.plot(range(len(values)), values)
     plt.xlabel("Index")
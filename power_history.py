@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# power_history.py - Constant-cost power history for the live radiometer display
+# Keeps a bounded decimated copy of the whole run for plotting and the 0 dB reference
+# level as a running sum.
+
+import numpy as np
+
+
+class PowerHistory:
+    """
+    Power-vs-time history with O(1) amortised updates and bounded memory.
+
+    Parameters:
+    -----------
+    display_points : int
+        Upper bound on the number of points returned by display(); older data
+        is averaged into progressively wider time bins to stay under it
+    ref_window_s : float
+        Points with time <= ref_window_s define the 0 dB reference level
+    """
+
+    def __init__(self, display_points=2000, ref_window_s=10.0):
+        self.display_points = display_points
+        self.ref_window_s = ref_window_s
+        self.count = 0
+
+        # decimated whole-run history; when full, neighbouring bins are merged
+        # pairwise and the bin width doubles
+        self._dec_t = np.zeros(display_points, dtype=np.float64)
+        self._dec_p = np.zeros(display_points, dtype=np.float64)
+        self._dec_n = 0
+        self._bin = 1
+        self._acc_t = 0.0
+        self._acc_p = 0.0
+        self._acc_n = 0
+
+        # running reference level
+        self._ref_sum = 0.0
+        self._ref_n = 0
+        self._first_p = None
+
+    def append(self, t, p):
+        """Add one (time in s, linear power) point."""
+        self.count += 1
+
+        if self._first_p is None:
+            self._first_p = p
+        if t <= self.ref_window_s:
+            self._ref_sum += p
+            self._ref_n += 1
+
+        self._acc_t += t
+        self._acc_p += p
+        self._acc_n += 1
+        if self._acc_n == self._bin:
+            self._dec_t[self._dec_n] = self._acc_t / self._acc_n
+            self._dec_p[self._dec_n] = self._acc_p / self._acc_n
+            self._dec_n += 1
+            self._acc_t = self._acc_p = 0.0
+            self._acc_n = 0
+            if self._dec_n == len(self._dec_t):
+                self._merge_bins()
+
+    def _merge_bins(self):
+        # called with an empty accumulator, so every stored bin has the old width
+        half = self._dec_n // 2
+        if self._dec_n % 2:
+            # the unpaired last bin becomes the partial accumulator of a new wide bin
+            self._acc_t = self._dec_t[2 * half] * self._bin
+            self._acc_p = self._dec_p[2 * half] * self._bin
+            self._acc_n = self._bin
+        self._dec_t[:half] = self._dec_t[:2 * half].reshape(-1, 2).mean(axis=1)
+        self._dec_p[:half] = self._dec_p[:2 * half].reshape(-1, 2).mean(axis=1)
+        self._dec_n = half
+        self._bin *= 2
+
+    @property
+    def reference_level(self):
+        """Mean linear power over the reference window (first point if none)."""
+        if self._ref_n:
+            return self._ref_sum / self._ref_n
+        return self._first_p
+
+    def display(self, db=True):
+        """
+        Return the whole run decimated to at most display_points + 1 points.
+
+        Parameters:
+        -----------
+        db : bool
+            If True, powers are returned in dB relative to reference_level
+
+        Returns:
+        --------
+        (numpy.ndarray, numpy.ndarray)
+            Bin-centre times and (mean) powers
+        """
+        n = self._dec_n
+        t = self._dec_t[:n].copy()
+        p = self._dec_p[:n].copy()
+        if self._acc_n:
+            t = np.append(t, self._acc_t / self._acc_n)
+            p = np.append(p, self._acc_p / self._acc_n)
+        if db:
+            p0 = self.reference_level
+            p = 10 * np.log10(p / p0) if p0 and p0 > 0 else np.zeros_like(p)
+        return t, p
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# power_pyramid.py - Multi-resolution total-power pyramid for zooming over long runs
+# Level k holds one (mean, min, max, count) bin per base_s * factor**(k-1) seconds of the
+# dump index's power column; level 0 is the index itself. Levels are raw binary files of
+# fixed-size bin records in <dump dir>/.dump_index/pyramid. An update only re-aggregates
+# the last bin of every level and appends, and a query picks the finest level with at
+# most max_points bins in the requested range, so any zoom reads a few thousand values.
+
+import os
+import sys
+import json
+import argparse
+from datetime import datetime
+import numpy as np
+
+from dump_index import DumpIndex
+
+PYRAMID_DIR = "pyramid"
+STATE_NAME = "state.json"
+BIN_DTYPE = np.dtype([('bin', '<i8'), ('sum', '<f8'), ('min', '<f8'), ('max', '<f8'), ('count', '<i8')])
+PYRAMID_VERSION = 1
+
+
+def _aggregate(bins, sums, mins, maxs, counts):
+    """Merge consecutive records with equal bin numbers (bins non-decreasing)."""
+    out = np.zeros(0, dtype=BIN_DTYPE)
+    if not len(bins):
+        return out
+    starts = np.flatnonzero(np.r_[True, bins[1:] != bins[:-1]])
+    out = np.empty(len(starts), dtype=BIN_DTYPE)
+    out['bin'] = bins[starts]
+    out['sum'] = np.add.reduceat(sums, starts)
+    out['min'] = np.minimum.reduceat(mins, starts)
+    out['max'] = np.maximum.reduceat(maxs, starts)
+    out['count'] = np.add.reduceat(counts, starts)
+    return out
+
+
+class PowerPyramid:
+    """
+    Incrementally built (mean, min, max, count) pyramid over a DumpIndex.
+
+    Parameters:
+    -----------
+    index : DumpIndex
+        Time index of the dump directory
+    base_s : float
+        Bin width of level 1 in seconds (used when the pyramid is created)
+    factor : int
+        Bin width ratio between consecutive levels
+    n_levels : int
+        Number of aggregated levels (level 1 .. n_levels)
+    """
+
+    def __init__(self, index, base_s=1.0, factor=8, n_levels=9):
+        self.index = index
+        self.path = os.path.join(index.index_dir, PYRAMID_DIR)
+        self.state = {'version': PYRAMID_VERSION, 'base_us': int(round(base_s * 1e6)), 'factor': int(factor),
+                      'counts': [0] * n_levels, 'finished_rows': 0}
+        state_path = os.path.join(self.path, STATE_NAME)
+        if os.path.exists(state_path):
+            with open(state_path, 'r') as f:
+                state = json.load(f)
+            if state.get('version') == PYRAMID_VERSION:
+                self.state = state
+        self.n_levels = len(self.state['counts'])
+        self.widths_us = [self.state['base_us'] * self.state['factor'] ** k for k in range(self.n_levels)]
+        self._check_files()
+
+    def _level_path(self, k):
+        return os.path.join(self.path, f"level_{k + 1}.bin")
+
+    def _check_files(self):
+        """Drop bins written after the last saved state (interrupted update)."""
+        for k, n in enumerate(self.state['counts']):
+            p = self._level_path(k)
+            size = os.path.getsize(p) if os.path.exists(p) else 0
+            if size < n * BIN_DTYPE.itemsize:
+                self.state['counts'] = [0] * self.n_levels  # files lost: rebuild
+                return
+            if size > n * BIN_DTYPE.itemsize:
+                os.truncate(p, n * BIN_DTYPE.itemsize)
+
+    def level(self, k):
+        """Bins of aggregated level k (1-based) as a read-only record array."""
+        n = self.state['counts'][k - 1]
+        if not n:
+            return np.zeros(0, dtype=BIN_DTYPE)
+        return np.memmap(self._level_path(k - 1), dtype=BIN_DTYPE, mode='r', shape=(n,))
+
+    def _replace_tail(self, k, keep, new):
+        """Keep the first `keep` bins of level k (0-based) and append new ones."""
+        p = self._level_path(k)
+        with open(p, 'r+b' if os.path.exists(p) else 'wb') as f:
+            f.truncate(keep * BIN_DTYPE.itemsize)
+            f.seek(keep * BIN_DTYPE.itemsize)
+            f.write(new.tobytes())
+        self.state['counts'][k] = keep + len(new)
+
+    def _save_state(self):
+        tmp = os.path.join(self.path, STATE_NAME + '.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(self.state, f)
+        os.replace(tmp, os.path.join(self.path, STATE_NAME))
+
+    def update(self, rebuild=False):
+        """
+        Bring the pyramid up to date with the index.
+
+        Only index rows from the start of the last level-1 bin on are read;
+        rows inserted earlier than that (late files) trigger a full rebuild.
+
+        Returns:
+        --------
+        int
+            Number of index rows aggregated
+        """
+        os.makedirs(self.path, exist_ok=True)
+        t = self.index.time_us
+        p = self.index.power
+        w1 = self.widths_us[0]
+        if rebuild:
+            self.state['counts'] = [0] * self.n_levels
+            self.state['finished_rows'] = 0
+        lv = self.level(1)
+        keep = max(len(lv) - 1, 0)
+        finished = self.state.get('finished_rows') if keep else 0
+        if finished is None:  # state written before finished_rows was kept
+            finished = int(np.sum(lv['count'][:keep]))
+        i0 = 0
+        if keep:
+            i0 = int(np.searchsorted(t, int(lv['bin'][keep]) * w1, side='left'))
+            if i0 != finished:
+                # rows appeared (or vanished) before the last bin: start over
+                return self.update(rebuild=True)
+        if i0 == len(t) and self.state['counts'][0]:
+            return 0
+        tt = np.asarray(t[i0:])
+        pp = np.asarray(p[i0:], dtype=np.float64)
+        tail = _aggregate(tt // w1, pp, pp, pp, np.ones(len(pp), dtype=np.int64))
+        self._replace_tail(0, keep, tail)
+        # index rows in level-1 bins before the last one, checked by the next update
+        self.state['finished_rows'] = finished + int(np.sum(tail['count'][:-1]))
+
+        for k in range(1, self.n_levels):
+            f = self.state['factor']
+            prev = self.level(k)
+            cur = self.level(k + 1)
+            keep = max(len(cur) - 1, 0)
+            j0 = int(np.searchsorted(prev['bin'], int(cur['bin'][keep]) * f, side='left')) if keep else 0
+            src = np.array(prev[j0:])
+            self._replace_tail(k, keep, _aggregate(src['bin'] // f, src['sum'], src['min'], src['max'],
+                                                   src['count']))
+        self._save_state()
+        return len(tt)
+
+    def query(self, t_start, t_stop, max_points=2000):
+        """
+        Power between two POSIX times at the finest resolution with at most max_points points.
+
+        Returns:
+        --------
+        dict
+            'time' (s, bin centres or record times), 'mean', 'min', 'max',
+            'count' arrays and 'width' (bin width in s, 0 for raw records)
+        """
+        t0, t1 = int(round(t_start * 1e6)), int(round(t_stop * 1e6))
+        sl = self.index.range(t_start, t_stop)
+        if sl.stop - sl.start <= max_points or not self.state['counts'][0]:
+            p = np.asarray(self.index.power[sl])
+            return {'time': np.asarray(self.index.time_us[sl]) / 1e6, 'mean': p, 'min': p, 'max': p,
+                    'count': np.ones(len(p), dtype=np.int64), 'width': 0.0}
+        for k in range(1, self.n_levels + 1):
+            w = self.widths_us[k - 1]
+            lv = self.level(k)
+            i0 = int(np.searchsorted(lv['bin'], t0 // w, side='left'))
+            i1 = int(np.searchsorted(lv['bin'], t1 // w, side='right'))
+            if i1 - i0 <= max_points or k == self.n_levels:
+                b = np.array(lv[i0:i1])
+                return {'time': (b['bin'] * w + w / 2) / 1e6, 'mean': b['sum'] / np.maximum(b['count'], 1),
+                        'min': b['min'], 'max': b['max'], 'count': b['count'], 'width': w / 1e6}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build or update the power pyramid of a dump directory')
+    parser.add_argument('dump_dir', nargs='?', default='LIVE_DISPLAY_DUMP', help='Dump directory')
+    parser.add_argument('--rebuild', action='store_true', help='Recompute every level')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.dump_dir):
+        print(f"Error: directory '{args.dump_dir}' not found")
+        sys.exit(1)
+    index = DumpIndex(args.dump_dir)
+    index.update()
+    pyramid = PowerPyramid(index)
+    n = pyramid.update(rebuild=args.rebuild)
+    print(f"Aggregated {n} records ({len(index)} indexed)")
+    for k in range(1, pyramid.n_levels + 1):
+        lv = pyramid.level(k)
+        span = ""
+        if len(lv):
+            w = pyramid.widths_us[k - 1]
+            span = f", {datetime.fromtimestamp(lv['bin'][0] * w / 1e6):%Y-%m-%d %H:%M:%S} onwards"
+        print(f"Level {k}: {pyramid.widths_us[k - 1] / 1e6:g} s bins, {len(lv)} bins{span}")
+
+
+if __name__ == '__main__':
+    main()
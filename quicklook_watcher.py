@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# quicklook_watcher.py - Quicklook of IF captures while stream_IF.py is still writing them
+# Polls the IFSTREAM output directory, memory-maps new and growing .r3f/.r3a files and
+# looks at a sparse subset of the data only: one short block of samples every `stride_s`
+# seconds of recording. Each block gives an averaged spectrum and the total power, which
+# feed a rolling display and a log. The work per poll is a few FFTs, so the watcher stays
+# far below the CPU and disk bandwidth of the 224 MB/s write path.
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+from r3f_reader import R3FReader
+from capture_index import suffix_time, CAPTURE_EXTS
+from power_history import PowerHistory
+from trace_accumulator import TraceAccumulator
+
+
+class QuicklookWatcher:
+    """
+    Incremental sparse analysis of a directory of IF capture files.
+
+    Parameters:
+    -----------
+    directory : str
+        IFSTREAM output directory
+    nfft : int
+        FFT length of the quicklook spectra
+    n_avg : int
+        FFTs averaged per sampled block (block length nfft * n_avg samples)
+    stride_s : float
+        Recording time between sampled blocks
+    settle_s : float
+        A file is only read up to data older than this, so blocks are never
+        taken from pages the writer has not finished
+    """
+
+    def __init__(self, directory, nfft=1024, n_avg=16, stride_s=0.1, settle_s=0.5):
+        self.directory = directory
+        self.nfft = nfft
+        self.n_avg = n_avg
+        self.block = nfft * n_avg
+        self.stride_s = stride_s
+        self.settle_s = settle_s
+        self.history = PowerHistory()
+        self.trace = TraceAccumulator(nfft // 2, mode='exponential', window=20)
+        self.last_spectrum = np.zeros(nfft // 2)
+        self.sample_rate = None
+        self.t_origin = None
+        self._window = np.hanning(nfft).astype(np.float32)
+        self._state = {}  # file name -> [size seen, next sample to look at]
+        self.files_seen = 0
+
+    def _file_start(self, path, reader):
+        t0 = reader.start_time
+        if t0 is None:
+            t0 = suffix_time(path)
+        if t0 is None:
+            t0 = os.path.getmtime(path) - reader.duration
+        return t0
+
+    def poll(self):
+        """
+        Look at everything written since the last poll.
+
+        Returns:
+        --------
+        list of (str, float, float)
+            File name, POSIX time and total power (dB) of every new block
+        """
+        names = sorted(f for f in os.listdir(self.directory) if f.lower().endswith(CAPTURE_EXTS))
+        now = time.time()
+        results = []
+        for name in names:
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue  # moved away by the writer
+            state = self._state.get(name)
+            if state is None:
+                state = self._state[name] = [-1, 0]
+                self.files_seen += 1
+            if st.st_size == state[0]:
+                continue
+            growing = now - st.st_mtime < self.settle_s
+            try:
+                reader = R3FReader(path)
+            except (ValueError, OSError):
+                continue  # header not complete yet
+            fs = reader.sample_rate
+            self.sample_rate = fs
+            # leave the tail of a file that is still being written for the next poll
+            limit = reader.n_samples - (int(self.settle_s * fs) if growing else 0)
+            stride = max(int(self.stride_s * fs), self.block)
+            t0 = self._file_start(path, reader)
+            pos = state[1]
+            while pos + self.block <= limit:
+                t, p_db = self._analyse(reader, pos, t0 + pos / fs)
+                results.append((name, t, p_db))
+                pos += stride
+            state[1] = pos
+            # a growing file is looked at again on every poll
+            state[0] = -1 if growing else st.st_size
+        return results
+
+    def _analyse(self, reader, start, t):
+        x = np.asarray(reader.read(start, self.block), dtype=np.float32) * np.float32(reader.adc_scale)
+        seg = x.reshape(self.n_avg, self.nfft)
+        power = float(np.mean(x * x))
+        spec = np.fft.rfft(seg * self._window, axis=1)[:, :self.nfft // 2]
+        np.mean(spec.real ** 2 + spec.imag ** 2, axis=0, out=self.last_spectrum)
+        self.trace.update(self.last_spectrum)
+        if self.t_origin is None:
+            self.t_origin = t
+        self.history.append(t - self.t_origin, power)
+        return t, 10 * np.log10(power + 1e-30)
+
+    def freqs_mhz(self, center_mhz=0.0):
+        """Frequency axis of the quicklook spectra, shifted like fft_r3a.py."""
+        fs = self.sample_rate or 112e6
+        return np.fft.rfftfreq(self.nfft, d=1 / fs)[:self.nfft // 2] / 1e6 + center_mhz - fs / 4e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Quicklook of IF capture files as they are written')
+    parser.add_argument('directory', nargs='?', default='IF_data_dump', help='IFSTREAM output directory')
+    parser.add_argument('--interval', type=float, default=1.0, help='Polling interval in seconds')
+    parser.add_argument('--stride', type=float, default=0.1, help='Recording seconds between sampled blocks')
+    parser.add_argument('--nfft', type=int, default=1024, help='FFT length')
+    parser.add_argument('--avg', type=int, default=16, help='FFTs averaged per block')
+    parser.add_argument('--center-mhz', type=float, default=0.0, help='Tuning frequency for the frequency axis')
+    parser.add_argument('--log', help='Append one line per sampled block to this file')
+    parser.add_argument('--plot', action='store_true', help='Show a rolling power/spectrum display')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.directory):
+        print(f"Error: directory '{args.directory}' not found")
+        sys.exit(1)
+    try:
+        os.nice(10)  # yield to the capture process
+    except (AttributeError, OSError):
+        pass
+
+    watcher = QuicklookWatcher(args.directory, args.nfft, args.avg, args.stride)
+    log = open(args.log, 'a') if args.log else None
+
+    if args.plot:
+        import matplotlib.pyplot as plt
+        plt.ion()
+        fig, (ax_spec, ax_pow) = plt.subplots(2, 1, figsize=(10, 8))
+        line_spec, = ax_spec.plot([], [], alpha=0.6, label='Latest block')
+        line_trace, = ax_spec.plot([], [], color='red', label='Exponential average')
+        ax_spec.set_xlabel('Frequency (MHz)')
+        ax_spec.set_ylabel('Power (dB)')
+        ax_spec.set_title('Quicklook spectrum')
+        ax_spec.legend(loc='upper right')
+        line_pow, = ax_pow.plot([], [], '.-')
+        ax_pow.set_xlabel('Time (s)')
+        ax_pow.set_ylabel('Power (dB, relative)')
+        ax_pow.set_title('Total power')
+
+    print(f"Watching {args.directory} (Ctrl+C to stop)")
+    try:
+        while True:
+            results = watcher.poll()
+            for name, t, p_db in results:
+                line = f"{time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(t))}.{int(t % 1 * 1000):03d} {name} {p_db:8.2f} dB"
+                if log:
+                    log.write(line + '\n')
+            if log and results:
+                log.flush()
+            if results:
+                peak = watcher.freqs_mhz(args.center_mhz)[np.argmax(watcher.trace.trace)]
+                print(f"{len(results)} new blocks, last {results[-1][2]:.2f} dB from {results[-1][0]}, "
+                      f"{watcher.files_seen} files, spectral peak {peak:.3f} MHz")
+                if args.plot:
+                    freqs = watcher.freqs_mhz(args.center_mhz)
+                    line_spec.set_data(freqs, 10 * np.log10(watcher.last_spectrum + 1e-30))
+                    line_trace.set_data(freqs, 10 * np.log10(watcher.trace.trace + 1e-30))
+                    t, p_db = watcher.history.display(db=True)
+                    line_pow.set_data(t, p_db)
+                    for ax in (ax_spec, ax_pow):
+                        ax.relim()
+                        ax.autoscale_view()
+            if args.plot:
+                plt.pause(args.interval)
+            else:
+                time.sleep(args.interval)
+    except KeyboardInterrupt:
+        print("Stopped.")
+    finally:
+        if log:
+            log.close()
+
+
+if __name__ == '__main__':
+    main()
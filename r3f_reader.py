@@ -0,0 +1,485 @@
+#!/usr/bin/env python3
+# r3f_reader.py - Read IF stream captures (.r3f, .r3h + .r3a) without the RSA API
+# Based on the Streaming IF Sample Data File Format documentation
+#
+# The 16 KiB header is parsed once with a numpy structured dtype and the sample region
+# is memory-mapped as int16, so chunks are views into the page cache rather than copies.
+
+import os
+import sys
+import glob
+import argparse
+import calendar
+import numpy as np
+
+HEADER_SIZE = 16384
+ENDIAN_CHECK = 0x12345678
+MAX_CORRECTION_ENTRIES = 501
+
+# RSA306 frame layout, used when the data format section leaves it unset
+DEFAULT_FRAME_SIZE = 16384
+DEFAULT_FRAME_SAMPLES = 8178
+DEFAULT_FRAME_FOOTER_BYTES = 28
+
+# Frame footer of framed (.r3f) captures, one per frame
+FOOTER_DTYPE = np.dtype([
+    ('reserved', '<u2', (4,)),
+    ('frame_id', '<u4'),
+    ('trigger2_index', '<u2'),
+    ('trigger1_index', '<u2'),
+    ('time_sync_index', '<u2'),
+    ('frame_status', '<u2'),
+    ('timestamp', '<u8'),
+])
+
+# frame_status bits
+FRAME_STATUS_ADC_OVERRANGE = 0x0001
+FRAME_STATUS_TRIGGER1 = 0x0002
+FRAME_STATUS_TRIGGER2 = 0x0004
+FRAME_STATUS_TIME_SYNC = 0x0008
+
+# (name, format, byte offset) of the header fields used by the analysis tools
+_HEADER_FIELDS = [
+    # File ID section
+    ('file_id', 'S27', 0),
+    ('endian_check', '<u4', 512),
+    ('file_format_version', 'u1', 516, (4,)),
+    ('api_version', 'u1', 520, (4,)),
+    ('fx3_version', 'u1', 524, (4,)),
+    ('fpga_version', 'u1', 528, (4,)),
+    ('serial_number', 'S64', 532),
+    ('nomenclature', 'S32', 596),
+    # Instrument state section
+    ('reference_level', '<f8', 1024),
+    ('center_freq', '<f8', 1032),
+    ('temperature', '<f8', 1040),
+    ('alignment', '<i4', 1048),
+    ('freq_reference', '<i4', 1052),
+    ('trigger_mode', '<i4', 1056),
+    ('trigger_source', '<i4', 1060),
+    ('trigger_transition', '<i4', 1064),
+    ('trigger_level', '<f8', 1068),
+    # Data format section
+    ('data_type', '<i4', 2048),
+    ('frame_offset', '<i4', 2052),
+    ('frame_size', '<i4', 2056),
+    ('sample_offset', '<i4', 2060),
+    ('frame_samples', '<i4', 2064),
+    ('nonsample_offset', '<i4', 2068),
+    ('nonsample_size', '<i4', 2072),
+    ('if_center_freq', '<f8', 2076),
+    ('sample_rate', '<f8', 2084),
+    ('bandwidth', '<f8', 2092),
+    ('corrected', '<i4', 2100),
+    ('time_type', '<i4', 2104),
+    ('ref_time', '<i4', 2108, (7,)),
+    ('clock_samples', '<u8', 2136),
+    ('time_sample_rate', '<u8', 2144),
+    ('utc_time', '<i4', 2152, (7,)),
+    # Signal path section
+    ('adc_scale', '<f8', 3072),
+    ('path_delay', '<f8', 3080),
+    # Channel correction section
+    ('correction_type', '<i4', 4096),
+    ('table_entries', '<u4', 4352),
+    ('correction_freq', '<f4', 4356, (MAX_CORRECTION_ENTRIES,)),
+    ('correction_amp', '<f4', 6360, (MAX_CORRECTION_ENTRIES,)),
+    ('correction_phase', '<f4', 8364, (MAX_CORRECTION_ENTRIES,)),
+]
+
+HEADER_DTYPE = np.dtype({
+    'names': [f[0] for f in _HEADER_FIELDS],
+    'formats': [(f[1], f[3]) if len(f) > 3 else f[1] for f in _HEADER_FIELDS],
+    'offsets': [f[2] for f in _HEADER_FIELDS],
+    'itemsize': HEADER_SIZE,
+})
+
+
+def _to_posix(t7):
+    """(year, month, day, hour, minute, second, nanosecond) -> POSIX seconds."""
+    year, month, day, hour, minute, second, nsec = (int(v) for v in t7)
+    if year <= 0:
+        return None
+    return calendar.timegm((year, month, day, hour, minute, second)) + nsec * 1e-9
+
+
+def parse_r3f_header(buf):
+    """
+    Parse the 16 KiB R3F/R3H header.
+
+    Parameters:
+    -----------
+    buf : bytes or numpy.ndarray
+        At least HEADER_SIZE bytes starting at the beginning of the file
+
+    Returns:
+    --------
+    dict
+        Header fields with plain Python scalars (tables stay numpy arrays)
+    """
+    if len(buf) < HEADER_SIZE:
+        raise ValueError(f"Header is {len(buf)} bytes, expected {HEADER_SIZE}")
+    rec = np.frombuffer(buf, dtype=HEADER_DTYPE, count=1)[0]
+    if int(rec['endian_check']) != ENDIAN_CHECK:
+        raise ValueError(f"Bad endian check 0x{int(rec['endian_check']):08x}, not an R3F header")
+    header = {}
+    for name in HEADER_DTYPE.names:
+        value = rec[name]
+        if isinstance(value, bytes):
+            value = value.split(b'\0', 1)[0].decode('ascii', 'replace')
+        elif np.ndim(value) == 0:
+            value = value.item()
+        else:
+            value = np.array(value)
+        header[name] = value
+    n = min(header['table_entries'], MAX_CORRECTION_ENTRIES)
+    for name in ('correction_freq', 'correction_amp', 'correction_phase'):
+        header[name] = header[name][:n]
+    return header
+
+
+def read_r3f_header(path):
+    """Read and parse the header of an .r3f or .r3h file."""
+    with open(path, 'rb') as f:
+        return parse_r3f_header(f.read(HEADER_SIZE))
+
+
+def frame_layout(header):
+    """
+    Return (frame_offset, frame_size, sample_offset, sample_bytes, footer_offset,
+    footer_bytes) in bytes from the data format section, falling back to the
+    RSA306 layout when the header leaves it at 0.
+    """
+    frame_offset = header['frame_offset'] if header['frame_offset'] > 0 else HEADER_SIZE
+    frame_size = header['frame_size']
+    s_off, s_bytes = header['sample_offset'], header['frame_samples'] * 2
+    f_off, f_size = header['nonsample_offset'], header['nonsample_size']
+    if frame_size <= 0 or s_bytes <= 0:
+        frame_size = DEFAULT_FRAME_SIZE
+        s_off, s_bytes = 0, DEFAULT_FRAME_SAMPLES * 2
+        f_off, f_size = DEFAULT_FRAME_SAMPLES * 2, DEFAULT_FRAME_FOOTER_BYTES
+    if max(s_off + s_bytes, f_off + f_size) > frame_size:
+        raise ValueError(f"Frame layout exceeds the {frame_size}-byte frame: samples at {s_off}+{s_bytes}, "
+                         f"footer at {f_off}+{f_size}")
+    return frame_offset, frame_size, s_off, s_bytes, f_off, f_size
+
+
+class R3FReader:
+    """
+    Memory-mapped reader for one IF capture.
+
+    Accepts either a formatted capture (.r3a samples with a .r3h header of
+    the same base name, contiguous int16) or a framed .r3f file (header
+    followed by fixed-size frames of samples plus footer).
+
+    Parameters:
+    -----------
+    path : str
+        Path to the .r3f or .r3a file
+    header_path : str, optional
+        Header file for .r3a data (default: same base name with .r3h)
+    """
+
+    def __init__(self, path, header_path=None):
+        self.path = path
+        ext = os.path.splitext(path)[1].lower()
+        self.framed = ext == '.r3f'
+        if self.framed:
+            self.header = read_r3f_header(path)
+        else:
+            header_path = header_path or os.path.splitext(path)[0] + '.r3h'
+            self.header = read_r3f_header(header_path) if os.path.exists(header_path) else None
+            data_offset = 0
+
+        if self.framed:
+            (data_offset, self.frame_size, s_off, s_size,
+             self.footer_offset, self.footer_size) = frame_layout(self.header)
+            self.sample_offset = s_off
+        self.data_offset = data_offset
+        size = os.path.getsize(path) - data_offset
+        if self.framed:
+            self.n_frames = size // self.frame_size
+            if self.n_frames:
+                raw = np.memmap(path, dtype=np.uint8, mode='r', offset=data_offset,
+                                shape=(self.n_frames, self.frame_size))
+            else:
+                raw = np.zeros((0, self.frame_size), dtype=np.uint8)
+            self._frames = raw
+            # (n_frames, samples_per_frame) int16 view, strided over the footers
+            self.samples = raw[:, s_off:s_off + s_size].view('<i2')
+            self.samples_per_frame = self.samples.shape[1]
+            self.n_samples = self.n_frames * self.samples_per_frame
+        else:
+            self.n_samples = size // 2
+            if self.n_samples:
+                self.samples = np.memmap(path, dtype='<i2', mode='r', offset=data_offset,
+                                         shape=(self.n_samples,))
+            else:
+                self.samples = np.zeros(0, dtype='<i2')
+            self.samples_per_frame = None
+
+    # --- header-derived properties ---
+
+    def _get(self, key, default=None):
+        return self.header[key] if self.header is not None else default
+
+    @property
+    def center_freq(self):
+        return self._get('center_freq')
+
+    @property
+    def if_center_freq(self):
+        return self._get('if_center_freq')
+
+    @property
+    def sample_rate(self):
+        rate = self._get('sample_rate')
+        return rate if rate else 112e6
+
+    @property
+    def reference_level(self):
+        return self._get('reference_level')
+
+    @property
+    def adc_scale(self):
+        scale = self._get('adc_scale')
+        return scale if scale else 1.0
+
+    @property
+    def start_time(self):
+        """POSIX time of the first sample, or None if the header has no time."""
+        if self.header is None:
+            return None
+        if self.framed and self.n_frames and self.header['time_sample_rate']:
+            return float(self.frame_times()[0])
+        return self._ref_posix()
+
+    def _ref_posix(self):
+        t = _to_posix(self.header['utc_time'])
+        return t if t is not None else _to_posix(self.header['ref_time'])
+
+    @property
+    def duration(self):
+        return self.n_samples / self.sample_rate
+
+    # --- sample access ---
+
+    def read(self, start, count):
+        """
+        Return `count` samples starting at sample index `start`.
+
+        For formatted captures, and for framed captures when the range stays
+        inside one frame, this is a zero-copy view; ranges that cross frame
+        footers are gathered into a new array.
+        """
+        start = max(0, int(start))
+        stop = min(self.n_samples, start + int(count))
+        if not self.framed:
+            return self.samples[start:stop]
+        spf = self.samples_per_frame
+        f0, f1 = start // spf, (stop - 1) // spf
+        if f0 == f1:
+            return self.samples[f0, start - f0 * spf:stop - f0 * spf]
+        block = self.samples[f0:f1 + 1].reshape(-1)
+        return block[start - f0 * spf:stop - f0 * spf]
+
+    def iter_chunks(self, chunk_samples, start=0, stop=None):
+        """
+        Yield consecutive chunks of `chunk_samples` samples (the last may be shorter).
+
+        For framed files, pick chunk_samples as a multiple of samples_per_frame
+        and use iter_frames() if the footer-separated 2-D layout is acceptable;
+        that path never copies.
+        """
+        stop = self.n_samples if stop is None else min(stop, self.n_samples)
+        for s in range(start, stop, chunk_samples):
+            yield self.read(s, min(chunk_samples, stop - s))
+
+    def iter_frames(self, frames_per_chunk):
+        """Yield zero-copy (frames, samples_per_frame) blocks of a framed file."""
+        if not self.framed:
+            raise ValueError("iter_frames() needs a framed .r3f file")
+        for f in range(0, self.n_frames, frames_per_chunk):
+            yield self.samples[f:f + frames_per_chunk]
+
+    # --- framed-mode footers ---
+
+    @property
+    def footers(self):
+        """
+        Structured (n_frames,) view of all frame footers (FOOTER_DTYPE).
+
+        Built as a strided view over the memory map, so decoding every footer
+        of a file is a single vectorised pass with no Python loop or copy.
+        """
+        if not self.framed:
+            raise ValueError("Footers are only present in framed .r3f files")
+        raw = self._frames[:, self.footer_offset:self.footer_offset + FOOTER_DTYPE.itemsize]
+        return raw.view(FOOTER_DTYPE)[:, 0]
+
+    @property
+    def payload(self):
+        """
+        Sample payload as a (n_frames, samples_per_frame) int16 view.
+
+        Rows are contiguous; flattening across frames (reshape(-1)) copies
+        because the footers sit between them.
+        """
+        return self.samples
+
+    def frame_times(self):
+        """POSIX time of the first sample of each frame, from the footer timestamps."""
+        ts = self.footers['timestamp'].astype(np.int64)
+        rate = float(self.header['time_sample_rate'])
+        ref = self._ref_posix() or 0.0
+        return ref + (ts - np.int64(self.header['clock_samples'])) / rate
+
+    def check_frames(self):
+        """
+        Check sequence continuity, timing and ADC overrange over all frames.
+
+        Returns:
+        --------
+        dict
+            'n_frames', 'gaps' (frame indices after which frame_id jumps),
+            'dropped_frames' (total frames missing from the sequence),
+            'overrange_frames' (indices with the ADC overrange flag set),
+            'timestamp_errors' (indices where the timestamp step differs
+            from samples_per_frame at the timestamp clock rate)
+        """
+        foot = self.footers
+        ids = foot['frame_id'].astype(np.int64)
+        step = (ids[1:] - ids[:-1]) % (1 << 32)  # frame_id is a wrapping u32
+        gaps = np.flatnonzero(step != 1)
+
+        status = foot['frame_status']
+        overrange = np.flatnonzero(status & FRAME_STATUS_ADC_OVERRANGE)
+
+        ts = foot['timestamp'].astype(np.int64)
+        ts_errors = np.empty(0, dtype=np.int64)
+        rate = self.header['time_sample_rate'] if self.header else 0
+        if rate and len(ts) > 1:
+            expected = self.samples_per_frame * rate / self.sample_rate
+            dts = np.diff(ts)
+            # a frame gap legitimately spans (step) frames worth of time
+            ts_errors = np.flatnonzero(np.abs(dts - step * expected) > max(1.0, 1e-3 * expected))
+
+        return {
+            'n_frames': self.n_frames,
+            'gaps': gaps,
+            'dropped_frames': int(np.sum(step[gaps] - 1)) if gaps.size else 0,
+            'overrange_frames': overrange,
+            'timestamp_errors': ts_errors,
+        }
+
+    def sample_at(self, t):
+        """Sample index for POSIX time t (or seconds from start if no header time)."""
+        t0 = self.start_time or 0.0
+        return int(round((t - t0) * self.sample_rate))
+
+    def read_time(self, t, duration):
+        """Samples covering [t, t + duration); see sample_at() for the time base."""
+        return self.read(self.sample_at(t), int(round(duration * self.sample_rate)))
+
+    def scaled(self, samples):
+        """Convert int16 ADC samples to volts at the ADC using the header scale."""
+        return np.multiply(samples, self.adc_scale, dtype=np.float32)
+
+
+def list_r3a_files(input_dir):
+    """Sorted .r3a files of a capture directory (timestamp suffixes sort in time order)."""
+    return sorted(glob.glob(os.path.join(input_dir, '*.r3a')))
+
+
+def iter_r3a_chunks(paths, chunk_samples, out=None):
+    """
+    Yield fixed-size chunks of int16 samples across a sequence of .r3a files.
+
+    Each file is memory-mapped in turn and chunks continue seamlessly over
+    file boundaries, so memory use depends on chunk_samples only. The last
+    chunk may be shorter.
+
+    Parameters:
+    -----------
+    paths : str or list of str
+        Capture directory, or .r3a file paths in time order
+    chunk_samples : int
+        Samples per chunk
+    out : numpy.ndarray, optional
+        Caller-provided buffer of at least chunk_samples elements (e.g.
+        float32); chunks are converted into it and yielded as out[:n]
+
+    Yields:
+    -------
+    numpy.ndarray
+        Without `out`: a zero-copy view when the chunk lies inside one file,
+        otherwise an internal int16 buffer. With `out`: a slice of `out`.
+        Buffers are reused, so consume or copy each chunk before the next.
+    """
+    if isinstance(paths, str):
+        paths = list_r3a_files(paths)
+    carry = np.empty(chunk_samples, dtype='<i2') if out is None else out
+    filled = 0  # samples already placed in `carry` from earlier files
+
+    for path in paths:
+        n = os.path.getsize(path) // 2
+        if n == 0:
+            continue
+        data = np.memmap(path, dtype='<i2', mode='r', shape=(n,))
+        pos = 0
+        if filled:
+            take = min(chunk_samples - filled, n)
+            np.copyto(carry[filled:filled + take], data[:take], casting='unsafe')
+            filled += take
+            pos = take
+            if filled < chunk_samples:
+                continue
+            yield carry[:chunk_samples]
+            filled = 0
+        while n - pos >= chunk_samples:
+            view = data[pos:pos + chunk_samples]
+            if out is None:
+                yield view
+            else:
+                np.copyto(out[:chunk_samples], view, casting='unsafe')
+                yield out[:chunk_samples]
+            pos += chunk_samples
+        if pos < n:
+            filled = n - pos
+            np.copyto(carry[:filled], data[pos:], casting='unsafe')
+        del data
+    if filled:
+        yield carry[:filled]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Show the header (and frame integrity) of an IF capture')
+    parser.add_argument('path', help='Path to the .r3f or .r3a file')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.path):
+        print(f"Error: file '{args.path}' not found")
+        sys.exit(1)
+    r = R3FReader(args.path)
+    if r.header is not None:
+        h = r.header
+        print(f"Device: {h['nomenclature']} (S/N {h['serial_number']})")
+        print(f"Center frequency: {h['center_freq']/1e6:.3f} MHz, IF center {h['if_center_freq']/1e6:.3f} MHz")
+        print(f"Sample rate: {h['sample_rate']/1e6:.3f} MS/s, bandwidth {h['bandwidth']/1e6:.3f} MHz")
+        print(f"Reference level: {h['reference_level']:.1f} dBm, ADC scale {h['adc_scale']:.6g}")
+        print(f"Correction table entries: {h['table_entries']}")
+    else:
+        print("No header found, assuming 112 MS/s")
+    if r.framed:
+        print(f"Framed: {r.n_frames} frames x {r.samples_per_frame} samples (frame {r.frame_size} bytes)")
+        check = r.check_frames()
+        print(f"Sequence gaps: {len(check['gaps'])} ({check['dropped_frames']} frames dropped)")
+        print(f"ADC overrange frames: {len(check['overrange_frames'])}")
+        print(f"Timestamp discontinuities: {len(check['timestamp_errors'])}")
+    print(f"Samples: {r.n_samples} ({r.duration*1e3:.3f} ms)")
+    if r.start_time is not None:
+        print(f"Start time (POSIX): {r.start_time:.9f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+# shm_ring.py - Lock-free single-producer / multi-consumer ring buffer in shared memory
+# The acquisition process publishes fixed-capacity IQ/IF blocks into a
+# multiprocessing.shared_memory segment; DSP, writer and display processes attach by name
+# and read them as numpy views, without pickling or copying through pipes.
+#
+# Synchronisation uses sequence numbers only. Every slot records the sequence number of
+# the block it holds, written after the data (a seqlock), and every consumer owns a read
+# cursor in the shared header. In 'block' mode the producer waits for the slowest active
+# consumer; in 'overwrite' mode it never waits and lagging consumers detect the overrun
+# from the slot sequence number and skip ahead, counting the dropped blocks.
+# Aligned 8-byte stores are assumed to be atomic (true on x86-64 and AArch64).
+
+import time
+import argparse
+from multiprocessing import shared_memory
+import numpy as np
+
+MAGIC = 0x52494E4731000000  # 'RING1'
+_HDR_WORDS = 8              # magic, n_slots, slot_elems, max_consumers, write_seq, overwrite, dtype x2
+_SLOT_META = np.dtype([('seq', '<i8'), ('n', '<i8'), ('timestamp', '<f8'), ('tag', '<i8')])
+_POLL_S = 100e-6
+
+
+def _open_shm(name):
+    """Attach to an existing segment without registering it for cleanup by this process."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # Python < 3.13 has no track argument
+        from multiprocessing import resource_tracker
+        register = resource_tracker.register
+        resource_tracker.register = lambda *args, **kwargs: None
+        try:
+            return shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+
+
+class ShmRing:
+    """
+    Shared-memory ring of n_slots blocks of up to slot_elems elements each.
+
+    Create it once in the producer with ShmRing.create() and attach to it in
+    other processes with ShmRing.attach(name).
+    """
+
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.owner = owner
+        buf = shm.buf
+        hdr = np.ndarray(_HDR_WORDS, dtype='<i8', buffer=buf)
+        if hdr[0] != MAGIC:
+            raise ValueError(f"Shared memory '{shm.name}' is not a ring buffer")
+        self._hdr = hdr
+        self.n_slots = int(hdr[1])
+        self.slot_elems = int(hdr[2])
+        self.max_consumers = int(hdr[3])
+        self.overwrite = bool(hdr[5])
+        self.dtype = np.dtype(hdr[6:8].tobytes().rstrip(b'\0').decode())
+        off = _HDR_WORDS * 8
+        # per consumer: cursor (next sequence to read), active flag, dropped count
+        self._cons = np.ndarray((self.max_consumers, 3), dtype='<i8', buffer=buf, offset=off)
+        off += self._cons.nbytes
+        self._meta = np.ndarray(self.n_slots, dtype=_SLOT_META, buffer=buf, offset=off)
+        off += self._meta.nbytes
+        off = (off + 63) // 64 * 64
+        self._data = np.ndarray((self.n_slots, self.slot_elems), dtype=self.dtype, buffer=buf, offset=off)
+
+    @staticmethod
+    def _size(n_slots, slot_elems, dtype, max_consumers):
+        off = _HDR_WORDS * 8 + max_consumers * 3 * 8 + n_slots * _SLOT_META.itemsize
+        off = (off + 63) // 64 * 64
+        return off + n_slots * slot_elems * np.dtype(dtype).itemsize
+
+    @classmethod
+    def create(cls, name=None, n_slots=64, slot_elems=1 << 16, dtype=np.int16, max_consumers=8,
+               overwrite=True):
+        """
+        Create a ring in a new shared-memory segment.
+
+        Parameters:
+        -----------
+        name : str, optional
+            Segment name (default: chosen by the system, see .name)
+        n_slots : int
+            Number of blocks held
+        slot_elems : int
+            Capacity of one block in elements
+        dtype : numpy dtype
+            Element type, e.g. int16 for IF samples or complex64 for IQ
+        max_consumers : int
+            Number of consumer cursors
+        overwrite : bool
+            True: the producer never waits and slow consumers lose blocks.
+            False: the producer waits for the slowest active consumer.
+        """
+        dtype = np.dtype(dtype)
+        code = dtype.str.encode()
+        if len(code) > 16:
+            raise ValueError(f"Unsupported dtype {dtype}")
+        shm = shared_memory.SharedMemory(name=name, create=True,
+                                         size=cls._size(n_slots, slot_elems, dtype, max_consumers))
+        hdr = np.ndarray(_HDR_WORDS, dtype='<i8', buffer=shm.buf)
+        hdr[:] = 0
+        hdr[1:6] = (n_slots, slot_elems, max_consumers, 0, int(overwrite))
+        hdr[6:8] = np.frombuffer(code.ljust(16, b'\0'), dtype='<i8')
+        hdr[0] = MAGIC
+        ring = cls(shm, owner=True)
+        ring._cons[:] = 0
+        ring._meta['seq'] = -1
+        return ring
+
+    @classmethod
+    def attach(cls, name):
+        """Attach to an existing ring by segment name."""
+        return cls(_open_shm(name), owner=False)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def write_seq(self):
+        """Number of blocks published so far (the next sequence number)."""
+        return int(self._hdr[4])
+
+    # --- producer side ---
+
+    def _min_cursor(self):
+        active = self._cons[:, 1] != 0
+        return int(self._cons[active, 0].min()) if active.any() else None
+
+    def publish(self, block, timestamp=0.0, tag=0, timeout=None):
+        """
+        Copy one block into the next slot and make it visible to consumers.
+
+        Parameters:
+        -----------
+        block : numpy.ndarray
+            Up to slot_elems elements (flattened)
+        timestamp : float
+            Stored with the block, e.g. acquisition time
+        tag : int
+            Free integer stored with the block (frame counter, status, ...)
+        timeout : float, optional
+            In blocking mode, give up after this many seconds
+
+        Returns:
+        --------
+        int
+            Sequence number of the block, or -1 if the ring stayed full
+        """
+        block = np.asarray(block).reshape(-1)
+        n = len(block)
+        if n > self.slot_elems:
+            raise ValueError(f"Block of {n} elements exceeds slot capacity {self.slot_elems}")
+        seq = int(self._hdr[4])
+        if not self.overwrite:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while True:
+                lo = self._min_cursor()
+                if lo is None or seq - lo < self.n_slots:
+                    break
+                if deadline is not None and time.monotonic() > deadline:
+                    return -1
+                time.sleep(_POLL_S)
+        i = seq % self.n_slots
+        meta = self._meta[i:i + 1]
+        meta['seq'] = -1           # invalidate while writing
+        self._data[i, :n] = block
+        meta['n'] = n
+        meta['timestamp'] = timestamp
+        meta['tag'] = tag
+        meta['seq'] = seq          # commit
+        self._hdr[4] = seq + 1     # publish
+        return seq
+
+    # --- consumer management ---
+
+    def consumer(self, index=None, from_start=False):
+        """
+        Register a consumer and return its RingConsumer.
+
+        Parameters:
+        -----------
+        index : int, optional
+            Cursor slot to use (default: the first inactive one)
+        from_start : bool
+            Start at the oldest block still in the ring rather than the next
+            block to be published
+        """
+        if index is None:
+            free = np.flatnonzero(self._cons[:, 1] == 0)
+            if not len(free):
+                raise RuntimeError("All consumer cursors are in use")
+            index = int(free[0])
+        seq = self.write_seq
+        start = max(0, seq - self.n_slots + 1) if from_start else seq
+        self._cons[index] = (start, 1, 0)
+        return RingConsumer(self, index)
+
+    def stats(self):
+        """Published count and, per active consumer, backlog and dropped blocks."""
+        seq = self.write_seq
+        out = {'published': seq, 'consumers': {}}
+        for i in np.flatnonzero(self._cons[:, 1]):
+            c = self._cons[i]
+            out['consumers'][int(i)] = {'backlog': seq - int(c[0]), 'dropped': int(c[2])}
+        return out
+
+    def close(self):
+        """Detach; the creator also removes the segment."""
+        self._hdr = self._cons = self._meta = self._data = None
+        self.shm.close()
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class RingConsumer:
+    """Read cursor of one consumer process (see ShmRing.consumer)."""
+
+    def __init__(self, ring, index):
+        self.ring = ring
+        self.index = index
+        self._cur = ring._cons[index]
+        self._held = None
+
+    @property
+    def dropped(self):
+        """Blocks overwritten before this consumer could read them."""
+        return int(self._cur[2])
+
+    def _wait(self, timeout):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._cur[0] >= self.ring._hdr[4]:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(_POLL_S)
+        return True
+
+    def _skip_overrun(self):
+        """Move a lapped cursor to the oldest block that can still be read."""
+        ring = self.ring
+        oldest = int(ring._hdr[4]) - ring.n_slots + 1
+        if self._cur[0] < oldest:
+            self._cur[2] += oldest - self._cur[0]
+            self._cur[0] = oldest
+
+    def read(self, out=None, timeout=None):
+        """
+        Copy the next block out of the ring.
+
+        Parameters:
+        -----------
+        out : numpy.ndarray, optional
+            Buffer of at least slot_elems elements to copy into
+        timeout : float, optional
+            Seconds to wait for a block (None waits indefinitely, 0 polls)
+
+        Returns:
+        --------
+        (int, float, int, numpy.ndarray) or None
+            Sequence number, timestamp, tag and the block (a slice of out);
+            None on timeout
+        """
+        ring = self.ring
+        while True:
+            if not self._wait(timeout):
+                return None
+            if ring.overwrite:
+                self._skip_overrun()
+            seq = int(self._cur[0])
+            i = seq % ring.n_slots
+            meta = ring._meta[i]
+            if int(meta['seq']) != seq:
+                if not ring.overwrite:
+                    time.sleep(_POLL_S)
+                continue           # being rewritten; re-check for an overrun
+            n = int(meta['n'])
+            ts, tag = float(meta['timestamp']), int(meta['tag'])
+            if out is None:
+                out = np.empty(ring.slot_elems, dtype=ring.dtype)
+            out[:n] = ring._data[i, :n]
+            if int(ring._meta[i]['seq']) != seq:
+                continue           # overwritten while copying: discard and retry
+            self._cur[0] = seq + 1
+            return seq, ts, tag, out[:n]
+
+    def acquire(self, timeout=None):
+        """
+        Zero-copy access to the next block; call release() when done with it.
+
+        Only safe in blocking mode, where the producer cannot reuse the slot
+        until this consumer's cursor moves past it.
+
+        Returns:
+        --------
+        (int, float, int, numpy.ndarray) or None
+            As read(), with a read-only view into shared memory
+        """
+        ring = self.ring
+        if ring.overwrite:
+            raise RuntimeError("acquire() needs a ring created with overwrite=False; use read()")
+        if not self._wait(timeout):
+            return None
+        seq = int(self._cur[0])
+        i = seq % ring.n_slots
+        while int(ring._meta[i]['seq']) != seq:
+            time.sleep(_POLL_S)
+        meta = ring._meta[i]
+        view = ring._data[i, :int(meta['n'])]
+        view.flags.writeable = False
+        self._held = seq
+        return seq, float(meta['timestamp']), int(meta['tag']), view
+
+    def release(self):
+        """Hand the block returned by acquire() back to the producer."""
+        if self._held is not None:
+            self._cur[0] = self._held + 1
+            self._held = None
+
+    def close(self):
+        """Deactivate this cursor so the producer no longer waits for it."""
+        self._cur[1] = 0
+
+
+def _demo_consumer(name, index, nfft, n_blocks):
+    """Worker for the throughput demo: FFT every block it receives."""
+    ring = ShmRing.attach(name)
+    cons = RingConsumer(ring, index)
+    buf = np.empty(ring.slot_elems, dtype=ring.dtype)
+    n = 0
+    while n < n_blocks:
+        got = cons.read(out=buf, timeout=5.0)
+        if got is None:
+            break
+        x = got[3]
+        m = len(x) // nfft
+        np.abs(np.fft.rfft(x[:m * nfft].reshape(m, nfft).astype(np.float32), axis=1))
+        n += 1
+    cons.close()
+    ring.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Throughput demo of the shared-memory ring buffer')
+    parser.add_argument('--consumers', type=int, default=2, help='Number of FFT consumer processes')
+    parser.add_argument('--blocks', type=int, default=2000, help='Blocks to publish')
+    parser.add_argument('--block-size', type=int, default=1 << 16, help='int16 samples per block')
+    parser.add_argument('--overwrite', action='store_true', help='Never block the producer')
+    args = parser.parse_args()
+
+    from multiprocessing import Process
+    ring = ShmRing.create(n_slots=64, slot_elems=args.block_size, dtype=np.int16,
+                          overwrite=args.overwrite)
+    consumers = [ring.consumer() for _ in range(args.consumers)]
+    procs = [Process(target=_demo_consumer, args=(ring.name, c.index, 1024, args.blocks))
+             for c in consumers]
+    for p in procs:
+        p.start()
+    block = (np.random.randn(args.block_size) * 1000).astype(np.int16)
+    t0 = time.perf_counter()
+    for k in range(args.blocks):
+        ring.publish(block, timestamp=time.time(), tag=k)
+    t_pub = time.perf_counter() - t0
+    for p in procs:
+        p.join()
+    t_all = time.perf_counter() - t0
+    mb = args.blocks * block.nbytes / 1e6
+    print(f"Published {args.blocks} blocks ({mb:.0f} MB) in {t_pub:.2f} s ({mb / t_pub:.0f} MB/s)")
+    print(f"All consumers done after {t_all:.2f} s")
+    print(ring.stats())
+    ring.close()
+
+
+if __name__ == '__main__':
+    main()
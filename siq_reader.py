@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# siq_reader.py - Read IQSTREAM file output (.siq, .siqh + .siqd, .tiq) without the RSA API
+# IQSTREAM_SetOutputConfiguration(IQSOD_FILE_SIQ / IQSOD_FILE_SIQ_SPLIT / IQSOD_FILE_TIQ, ...)
+# makes the device driver write IQ straight to disk. The header (ASCII key:value lines for
+# SIQ, XML for TIQ) is parsed once and the interleaved I/Q payload is memory-mapped, so
+# chunks are views into the page cache; only the conversion to scaled complex is a copy.
+
+import os
+import re
+import sys
+import argparse
+import calendar
+from datetime import datetime, timezone
+import xml.etree.ElementTree as ET
+import numpy as np
+
+SIQ_EXTS = ('.siq', '.siqh', '.siqd')
+IQ_EXTS = SIQ_EXTS + ('.tiq',)
+
+# NumberFormat (SIQ) / DataType (TIQ) -> numpy scalar type of one I or Q value
+_SIQ_FORMATS = {'IQ-INT16': 'i2', 'IQ-INT32': 'i4', 'IQ-SINGLE': 'f4'}
+_TIQ_FORMATS = {'INT16': 'i2', 'INT32': 'i4', 'SINGLE': 'f4', 'FLOAT32': 'f4'}
+
+
+def _parse_iso_time(text):
+    """POSIX seconds from an ISO 8601 time with up to nanosecond digits, or None."""
+    m = re.match(r'(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2})(\.\d+)?(Z|[+-]\d{2}:?\d{2})?', text.strip())
+    if not m:
+        return None
+    base, frac, tz = m.groups()
+    dt = datetime.strptime(base, '%Y-%m-%dT%H:%M:%S')
+    if tz and tz != 'Z':
+        sign = 1 if tz[0] == '+' else -1
+        hh, mm = int(tz[1:3]), int(tz[-2:])
+        offset = sign * (hh * 3600 + mm * 60)
+    else:
+        offset = 0
+    t = calendar.timegm(dt.replace(tzinfo=timezone.utc).timetuple()) - offset
+    return t + (float(frac) if frac else 0.0)
+
+
+def parse_siq_header(path):
+    """
+    Parse the ASCII header of a .siq or .siqh file.
+
+    The first line is 'RSASIQHT:<version>,<header bytes>'; the rest are
+    'Key:Value' lines. The samples of a .siq file start at <header bytes>.
+
+    Returns:
+    --------
+    (dict, int)
+        Header values as strings and the header size in bytes
+    """
+    with open(path, 'rb') as f:
+        first = f.readline(256).decode('ascii', 'replace').strip()
+        m = re.match(r'RSASIQHT:(\d+),(\d+)', first)
+        if not m:
+            raise ValueError(f"{path}: not an SIQ header (first line {first!r})")
+        header_size = int(m.group(2))
+        f.seek(0)
+        text = f.read(header_size).decode('ascii', 'replace')
+    header = {'RSASIQHT': first.split(':', 1)[1]}
+    for line in text.splitlines()[1:]:
+        line = line.strip('\0\r ')
+        if ':' in line:
+            key, value = line.split(':', 1)
+            header[key.strip()] = value.strip()
+    return header, header_size
+
+
+def parse_tiq_header(path, max_bytes=1 << 20):
+    """
+    Parse the XML header of a .tiq file.
+
+    Returns:
+    --------
+    (dict, int)
+        The first occurrence of every element (local names, without
+        namespaces) as strings, and the data offset from the root 'offset'
+        attribute
+    """
+    with open(path, 'rb') as f:
+        head = f.read(max_bytes)
+    end = head.find(b'</DataFile>')
+    if end < 0:
+        raise ValueError(f"{path}: no complete TIQ XML header in the first {max_bytes} bytes")
+    root = ET.fromstring(head[:end + len(b'</DataFile>')])
+    header = {}
+    for el in root.iter():
+        name = el.tag.rsplit('}', 1)[-1]
+        if name not in header and el.text and el.text.strip():
+            header[name] = el.text.strip()
+    offset = root.attrib.get('offset') or root.attrib.get('Offset')
+    if offset is None:
+        raise ValueError(f"{path}: TIQ header has no data offset")
+    return header, int(offset, 0)
+
+
+class IQFileReader:
+    """
+    Memory-mapped reader for one IQSTREAM output file.
+
+    Parameters:
+    -----------
+    path : str
+        .siq file, either half of a split .siqh/.siqd pair, or a .tiq file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        base, ext = os.path.splitext(path)
+        ext = ext.lower()
+        if ext not in IQ_EXTS:
+            raise ValueError(f"Unsupported IQ file type: {path}")
+
+        if ext == '.tiq':
+            self.format = 'tiq'
+            self.header, offset = parse_tiq_header(path)
+            self.data_path = path
+            fmt = _TIQ_FORMATS.get(self.header.get('DataType', 'Int32').upper())
+            endian = '>' if self.header.get('Endian', 'Little').lower().startswith('b') else '<'
+            self.center_freq = float(self.header.get('Frequency', 0))
+            self.sample_rate = float(self.header.get('SamplingFrequency', 0))
+            self.bandwidth = float(self.header.get('AcquisitionBandwidth', 0))
+            self.reference_level = float(self.header.get('ReferenceLevel', 0))
+            self.scale = float(self.header.get('Scaling', 1.0))
+            self.start_time = _parse_iso_time(self.header.get('DateTime', ''))
+            declared = self.header.get('NumberSamples')
+        else:
+            split = ext != '.siq'
+            self.format = 'siq-split' if split else 'siq'
+            header_path = base + '.siqh' if split else path
+            self.data_path = base + '.siqd' if split else path
+            self.header, header_size = parse_siq_header(header_path)
+            offset = 0 if split else header_size
+            fmt = _SIQ_FORMATS.get(self.header.get('NumberFormat', 'IQ-Int16').upper())
+            endian = '>' if self.header.get('DataEndian', 'Little').lower().startswith('b') else '<'
+            self.center_freq = float(self.header.get('CenterFrequency', 0))
+            self.sample_rate = float(self.header.get('SampleRate', 0))
+            self.bandwidth = float(self.header.get('AcqBandwidth', 0))
+            self.reference_level = float(self.header.get('ReferenceLevel', 0))
+            self.scale = float(self.header.get('DataScale', 1.0))
+            utc = self.header.get('RecordUtcSec')
+            self.start_time = float(utc) if utc else _parse_iso_time(self.header.get('RecordUtcTime', ''))
+            declared = self.header.get('NumberSamples')
+        if fmt is None:
+            raise ValueError(f"{path}: unsupported IQ number format")
+
+        self.dtype = np.dtype(endian + fmt)
+        size = os.path.getsize(self.data_path) - offset
+        n = max(size, 0) // (2 * self.dtype.itemsize)
+        if declared:
+            # a file still being written may hold fewer samples than declared
+            n = min(n, int(declared))
+        self.n_samples = n
+        self.data_offset = offset
+        if n:
+            self.iq = np.memmap(self.data_path, dtype=self.dtype, mode='r', offset=offset, shape=(n, 2))
+        else:
+            self.iq = np.zeros((0, 2), dtype=self.dtype)
+
+    @property
+    def duration(self):
+        return self.n_samples / self.sample_rate if self.sample_rate else 0.0
+
+    @property
+    def complex_view(self):
+        """
+        Zero-copy complex64 view of little-endian float payloads (unscaled), else None.
+
+        IQ-Single data from the driver is already in volts (scale 1.0), so this
+        is the whole recording as complex samples without touching the data.
+        """
+        if self.dtype != np.dtype('<f4'):
+            return None
+        return self.iq.view(np.complex64)[:, 0]
+
+    def raw(self, start, count):
+        """Zero-copy (count, 2) view of the stored I/Q values."""
+        start = max(0, int(start))
+        return self.iq[start:min(self.n_samples, start + int(count))]
+
+    def read(self, start, count, out=None):
+        """
+        Return `count` complex samples in volts starting at sample `start`.
+
+        Parameters:
+        -----------
+        start, count : int
+            Sample range
+        out : numpy.ndarray, optional
+            complex64 buffer of at least `count` elements to convert into
+
+        Returns:
+        --------
+        numpy.ndarray
+            complex64 samples; a zero-copy view for unscaled float payloads
+            when no `out` is given
+        """
+        iq = self.raw(start, count)
+        n = len(iq)
+        view = self.complex_view
+        if view is not None and self.scale == 1.0 and out is None:
+            return view[max(0, int(start)):max(0, int(start)) + n]
+        if out is None:
+            out = np.empty(n, dtype=np.complex64)
+        out = out[:n]
+        pair = out.view(np.float32).reshape(n, 2)
+        np.multiply(iq, np.float32(self.scale), out=pair, casting='unsafe')
+        return out
+
+    def iter_chunks(self, chunk_samples, start=0, stop=None, out=None):
+        """
+        Yield consecutive complex chunks of `chunk_samples` samples (the last may be shorter).
+
+        With `out` every chunk is converted into that buffer, so the loop
+        allocates nothing; consume each chunk before requesting the next.
+        """
+        stop = self.n_samples if stop is None else min(stop, self.n_samples)
+        for s in range(start, stop, chunk_samples):
+            yield self.read(s, min(chunk_samples, stop - s), out=out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Show the header of an IQSTREAM output file (.siq/.siqh/.tiq)')
+    parser.add_argument('path', help='Path to the .siq, .siqh/.siqd or .tiq file')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.path):
+        print(f"Error: file '{args.path}' not found")
+        sys.exit(1)
+    try:
+        r = IQFileReader(args.path)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    print(f"Format: {r.format}, data {r.data_path} at byte {r.data_offset}")
+    print(f"Center frequency: {r.center_freq/1e6:.3f} MHz, bandwidth {r.bandwidth/1e6:.3f} MHz")
+    print(f"Sample rate: {r.sample_rate/1e6:.6f} MS/s, reference level {r.reference_level:.1f} dBm")
+    print(f"Sample type: {r.dtype} I/Q pairs, scale {r.scale:.6g}")
+    print(f"Samples: {r.n_samples} ({r.duration*1e3:.3f} ms)")
+    if r.start_time is not None:
+        print(f"Start time (POSIX): {r.start_time:.9f}")
+    if r.n_samples:
+        z = r.read(0, min(r.n_samples, 1 << 20))
+        p = np.mean(z.real ** 2 + z.imag ** 2)
+        print(f"Mean power of the first {len(z)} samples: {10 * np.log10(p / 50 + 1e-30) + 30:.2f} dBm")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+# software_trigger.py - Streaming trigger with pre-trigger history for transient capture
+# Incoming IQ/IF blocks go into a preallocated RAM ring holding the last few seconds.
+# Trigger conditions (total power above the running baseline, excess power in a frequency
+# band, an external/hardware trigger flag) are evaluated block by block with vectorised
+# window statistics. On a trigger, only the window [trigger - pre, trigger + post] is
+# written to disk, together with the trigger time, so the onset is never lost while
+# continuous noise is never stored.
+
+import os
+import sys
+import time
+import argparse
+from datetime import datetime, timezone
+import numpy as np
+
+NO_HITS = (np.zeros(0, dtype=np.int64), np.zeros(0))  # evaluate() result without a trigger
+
+
+class SampleRing:
+    """
+    Fixed-capacity ring of the most recent samples, addressed by absolute sample index.
+
+    Parameters:
+    -----------
+    capacity : int
+        Number of samples kept
+    dtype : numpy dtype
+        Sample type (int16 for IF, complex64 for IQ)
+    """
+
+    def __init__(self, capacity, dtype=np.int16):
+        self.capacity = int(capacity)
+        self.buf = np.zeros(self.capacity, dtype=dtype)
+        self.total = 0  # samples written so far; the next sample gets this index
+
+    @property
+    def oldest(self):
+        """Absolute index of the oldest sample still held."""
+        return max(0, self.total - self.capacity)
+
+    def write(self, block):
+        block = np.asarray(block).reshape(-1)
+        n = len(block)
+        if n >= self.capacity:
+            self.buf[:] = block[-self.capacity:]
+            # rotate so that index arithmetic below stays valid
+            self.buf = np.roll(self.buf, (self.total + n) % self.capacity)
+        else:
+            i = self.total % self.capacity
+            first = min(n, self.capacity - i)
+            self.buf[i:i + first] = block[:first]
+            self.buf[:n - first] = block[first:]
+        self.total += n
+
+    def read(self, start, count):
+        """Copy of samples [start, start + count); start must still be held."""
+        if start < self.oldest or start + count > self.total:
+            raise IndexError(f"Samples {start}..{start + count} not in ring "
+                             f"({self.oldest}..{self.total})")
+        i = start % self.capacity
+        first = min(count, self.capacity - i)
+        out = np.empty(count, dtype=self.buf.dtype)
+        out[:first] = self.buf[i:i + first]
+        out[first:] = self.buf[:count - first]
+        return out
+
+
+class PowerTrigger:
+    """
+    Total power of `window`-sample windows exceeding the running baseline by threshold_db.
+
+    The baseline is an exponential average of window powers below the threshold,
+    so slow gain drifts are followed but transients do not raise it.
+    """
+
+    name = 'power'
+
+    def __init__(self, threshold_db=6.0, window=4096, alpha=0.01):
+        self.threshold = 10 ** (threshold_db / 10)
+        self.window = window
+        self.alpha = alpha
+        self.baseline = None
+        self._tail = None  # samples after the last whole window, completed by the next block
+
+    def window_values(self, block, fs):
+        n = len(block) // self.window
+        x = block[:n * self.window].reshape(n, self.window)
+        if np.iscomplexobj(x):
+            return np.mean(x.real ** 2 + x.imag ** 2, axis=1)
+        x = x.astype(np.float32)
+        return np.mean(x * x, axis=1)
+
+    def evaluate(self, block, fs):
+        """
+        Sample offsets of all triggering windows in block and their levels in dB.
+
+        Windows continue across blocks: an offset is negative when the triggering
+        window started in the previous block.
+        """
+        carried = 0
+        if self._tail is not None and len(self._tail):
+            carried = len(self._tail)
+            block = np.concatenate([self._tail, block])
+        n = len(block) // self.window
+        self._tail = block[n * self.window:].copy()
+        p = self.window_values(block, fs)
+        if not len(p):
+            return NO_HITS
+        if self.baseline is None:
+            self.baseline = float(np.median(p))
+        hit = p > self.baseline * self.threshold
+        quiet = p[~hit]
+        levels = 10 * np.log10(p[hit] / self.baseline)
+        if len(quiet):
+            # one EMA step per quiet window, folded into a single update
+            w = (1 - self.alpha) ** len(quiet)
+            self.baseline = w * self.baseline + (1 - w) * float(np.mean(quiet))
+        return np.flatnonzero(hit) * self.window - carried, levels
+
+
+class BandExcessTrigger(PowerTrigger):
+    """
+    Power in [f_lo, f_hi] (Hz, baseband/IF frequency of the FFT bins) exceeding its
+    running baseline by threshold_db, measured with nfft-point FFTs.
+    """
+
+    name = 'band'
+
+    def __init__(self, f_lo, f_hi, threshold_db=6.0, nfft=1024, alpha=0.01):
+        super().__init__(threshold_db, nfft, alpha)
+        self.f_lo, self.f_hi = f_lo, f_hi
+        self._bins = None
+
+    def window_values(self, block, fs):
+        nfft = self.window
+        n = len(block) // nfft
+        x = block[:n * nfft].reshape(n, nfft)
+        if np.iscomplexobj(x):
+            spec = np.fft.fft(x, axis=1)
+            freqs = np.fft.fftfreq(nfft, d=1 / fs)
+        else:
+            spec = np.fft.rfft(x.astype(np.float32), axis=1)
+            freqs = np.fft.rfftfreq(nfft, d=1 / fs)
+        if self._bins is None:
+            self._bins = (freqs >= self.f_lo) & (freqs <= self.f_hi)
+            if not self._bins.any():
+                raise ValueError(f"No FFT bins in {self.f_lo}..{self.f_hi} Hz")
+        s = spec[:, self._bins]
+        return np.sum(s.real ** 2 + s.imag ** 2, axis=1)
+
+
+class ExternalTrigger:
+    """
+    Trigger from an external flag, e.g. the R3F footer TRIGGER1 status bit or an
+    RSA hardware trigger reported by the acquisition loop. Call fire() with the
+    sample offset within the next block.
+    """
+
+    name = 'external'
+
+    def __init__(self):
+        self._pending = None
+
+    def fire(self, offset=0):
+        if self._pending is None or offset < self._pending:
+            self._pending = int(offset)
+
+    def evaluate(self, block, fs):
+        offset, self._pending = self._pending, None
+        if offset is None:
+            return NO_HITS
+        return np.array([min(offset, max(len(block) - 1, 0))]), np.array([0.0])
+
+
+class SoftwareTrigger:
+    """
+    Streaming trigger engine writing pre/post-trigger windows to disk.
+
+    Parameters:
+    -----------
+    sample_rate : float
+        Samples per second
+    conditions : list
+        Trigger conditions (PowerTrigger, BandExcessTrigger, ExternalTrigger);
+        the earliest trigger in a block wins
+    pre_s, post_s : float
+        Seconds kept before and after the trigger sample
+    output_dir : str
+        Where event files are written
+    dtype : numpy dtype
+        Sample type of the blocks
+    ring_s : float, optional
+        RAM history in seconds (default: pre_s + post_s + 1 s)
+    holdoff_s : float
+        Minimum time between the end of one event and the next trigger
+    metadata : dict, optional
+        Extra values saved with every event (center frequency, ...)
+    """
+
+    def __init__(self, sample_rate, conditions, pre_s=0.01, post_s=0.02, output_dir="trigger_events",
+                 dtype=np.int16, ring_s=None, holdoff_s=0.0, metadata=None):
+        self.fs = float(sample_rate)
+        self.conditions = list(conditions)
+        self.pre = int(round(pre_s * self.fs))
+        self.post = int(round(post_s * self.fs))
+        self.holdoff = int(round(holdoff_s * self.fs))
+        ring_s = ring_s if ring_s is not None else pre_s + post_s + 1.0
+        self.ring = SampleRing(max(int(ring_s * self.fs), self.pre + self.post + 1), dtype)
+        self.output_dir = output_dir
+        self.metadata = metadata or {}
+        os.makedirs(output_dir, exist_ok=True)
+        self.t0 = None            # time of absolute sample 0
+        self._armed_at = 0        # no trigger before this absolute sample
+        self._pending = None      # (trigger sample, condition name, level_db) awaiting post samples
+        self._deferred = []       # hits after the pending event, kept until it is written
+        self.events = []
+
+    def sample_time(self, index):
+        return self.t0 + index / self.fs
+
+    def process(self, block, t_start=None):
+        """
+        Feed the next block of samples.
+
+        Parameters:
+        -----------
+        block : numpy.ndarray
+            Consecutive samples
+        t_start : float, optional
+            POSIX time of the block's first sample (needed for the first block
+            only; later blocks are assumed contiguous)
+
+        Returns:
+        --------
+        list of str
+            Event files completed by this block
+        """
+        block = np.asarray(block).reshape(-1)
+        if self.t0 is None:
+            self.t0 = (time.time() if t_start is None else t_start) - self.ring.total / self.fs
+        base = self.ring.total
+        self.ring.write(block)
+        written = []
+
+        # every condition sees every block: baselines keep moving and external
+        # flags are consumed even while an event is being collected
+        hits = list(self._deferred)
+        for cond in self.conditions:
+            offsets, levels = cond.evaluate(block, self.fs)
+            hits += [(base + int(o), cond.name, float(l)) for o, l in zip(offsets, levels)]
+        hits.sort(key=lambda h: h[0])
+        self._deferred = []
+
+        while True:
+            if self._pending is None:
+                # the first hit outside the last event and its holdoff starts the next one
+                while hits and hits[0][0] < self._armed_at:
+                    hits.pop(0)
+                if not hits:
+                    break
+                self._pending = hits.pop(0)
+            end = self._pending[0] + self.post
+            if self.ring.total < end:
+                # hits that may still start an event after this one are kept
+                self._deferred = [h for h in hits if h[0] >= end + self.holdoff]
+                break
+            written.append(self._write_event(*self._pending))
+            self._armed_at = end + self.holdoff
+            self._pending = None
+        return written
+
+    def _write_event(self, trig, name, level):
+        start = max(trig - self.pre, self.ring.oldest)
+        samples = self.ring.read(start, trig + self.post - start)
+        t_trig = self.sample_time(trig)
+        stamp = datetime.fromtimestamp(t_trig, tz=timezone.utc).strftime('%Y%m%d_%H%M%S_%f')
+        path = os.path.join(self.output_dir, f"event_{stamp}.npz")
+        np.savez(path, samples=samples, trigger_time=t_trig, start_time=self.sample_time(start),
+                 trigger_offset=trig - start, sample_rate=self.fs, condition=name,
+                 level_db=level if level is not None else np.nan, **self.metadata)
+        self.events.append((t_trig, name, level, path))
+        return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Extract triggered events from an IF capture directory')
+    parser.add_argument('directory', nargs='?', default='IF_data_dump', help='Directory of .r3a files')
+    parser.add_argument('--power-db', type=float, default=6.0, help='Total-power trigger above baseline (dB)')
+    parser.add_argument('--band', type=float, nargs=2, metavar=('F_LO', 'F_HI'),
+                        help='Also trigger on excess power in this IF band (Hz)')
+    parser.add_argument('--band-db', type=float, default=6.0, help='Band-excess threshold (dB)')
+    parser.add_argument('--pre', type=float, default=0.01, help='Seconds kept before the trigger')
+    parser.add_argument('--post', type=float, default=0.02, help='Seconds kept after the trigger')
+    parser.add_argument('--holdoff', type=float, default=0.0, help='Dead time after each event (s)')
+    parser.add_argument('--output', default='trigger_events', help='Output directory for events')
+    args = parser.parse_args()
+
+    from r3f_reader import R3FReader, list_r3a_files, iter_r3a_chunks
+    from capture_index import suffix_time
+
+    files = list_r3a_files(args.directory)
+    if not files:
+        print(f"No .r3a files found in {args.directory}")
+        sys.exit(1)
+    first = R3FReader(files[0])
+    fs = first.sample_rate
+    t0 = first.start_time or suffix_time(files[0]) or os.path.getmtime(files[0])
+
+    conditions = [PowerTrigger(args.power_db)]
+    if args.band:
+        conditions.append(BandExcessTrigger(args.band[0], args.band[1], args.band_db))
+    trig = SoftwareTrigger(fs, conditions, args.pre, args.post, args.output,
+                           holdoff_s=args.holdoff, metadata={'source': os.path.abspath(args.directory)})
+    total = 0
+    for i, chunk in enumerate(iter_r3a_chunks(files, 1 << 20)):
+        for path in trig.process(chunk, t_start=t0 if i == 0 else None):
+            t, name, level, _ = trig.events[-1]
+            print(f"{datetime.fromtimestamp(t, tz=timezone.utc):%Y-%m-%d %H:%M:%S.%f} {name} "
+                  f"{level:+.1f} dB -> {path}")
+        total += len(chunk)
+    kept = len(trig.events) * (trig.pre + trig.post)
+    print(f"{len(trig.events)} events from {total / fs:.3f} s of data "
+          f"({100 * kept / max(total, 1):.3f}% of the samples kept)")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,17 @@
 import os
-import glob
 import numpy as np
 import matplotlib.pyplot as plt
 import logging
+from datetime import datetime
+from compact_dumps import iter_records
+from spectrogram_store import SpectrogramStore
+from waterfall_tiles import WaterfallTiles, WaterfallViewer
 
 # Configuration
 recLen = 1000  # Must match the record length used in IQ_dump.py
 iq_dir = "IQ_data_dump"
 spec_dir = "spectra_dump"
+store_name = "waterfall_store"  # SpectrogramStore inside spec_dir
 os.makedirs(spec_dir, exist_ok=True)
 
 logging.basicConfig(
@@ -15,9 +19,11 @@ logging.basicConfig(
     format="%(asctime)s %(levelname)s: %(message)s"
 )
 
-def process_iq_file(filepath):
+def process_iq_file(filepath, data=None):
+    # data: the record's samples when it comes from a daily shard
     try:
-        data = np.fromfile(filepath, dtype=np.float32)
+        if data is None:
+            data = np.fromfile(filepath, dtype=np.float32)
         if data.size != recLen * 2:
             logging.warning(f"File {filepath} has unexpected size ({data.size}), skipping.")
             return None, None, None
@@ -37,24 +43,43 @@ def process_iq_file(filepath):
         return None, None, None
 
 def main():
-    iq_files = sorted(glob.glob(os.path.join(iq_dir, "IQ_*.bin")))
-    if not iq_files:
-        logging.error("No IQ binary files found.")
-        return
-
-    spectra_files = []
-    for iq_file in iq_files:
-        f, mag, fname = process_iq_file(iq_file)
+    # loose IQ_*.bin files and records of compacted daily shards, in time order
+    iq_records = iter_records(iq_dir, 'IQ') if os.path.isdir(iq_dir) else iter(())
+    n_records = 0
+    n_spectra = 0
+    store = None
+    freqs = None
+    spec_sum = None
+    for name, rec in iq_records:
+        n_records += 1
+        f, mag, fname = process_iq_file(os.path.join(iq_dir, name), rec['iq'])
         if f is None:
             continue
         # Extract timestamp from filename
         ts = fname.split("IQ_")[-1].replace(".bin", "")
         out_path = os.path.join(spec_dir, f"spectrum_{ts}.npz")
         np.savez_compressed(out_path, freqs=f, magnitude=mag)
-        spectra_files.append((ts, out_path))
+        # also append to the spectrogram store the tiled waterfall is built from
+        if store is None:
+            store = SpectrogramStore(os.path.join(spec_dir, store_name), mode='w', freqs=f,
+                                     metadata={'freq_unit': 'MHz'})
+            freqs = f
+            spec_sum = np.zeros(len(f), dtype=np.float64)
+        try:
+            t = datetime.strptime(ts, "%Y%m%d_%H%M%S_%f").timestamp()
+        except ValueError:
+            t = float(n_spectra)
+        store.append(t, mag)
+        spec_sum += mag
+        n_spectra += 1
         logging.info(f"Processed {fname} -> {out_path}")
+    if store is not None:
+        store.close()
 
-    if not spectra_files:
+    if not n_records:
+        logging.error("No IQ binary files found.")
+        return
+    if not n_spectra:
         logging.error("No spectra were generated.")
         return
 
@@ -64,44 +89,37 @@ def main():
         logging.info("Waterfall plot not generated.")
         return
 
-    # Load spectra in time order
-    spectra_files.sort()
-    spectra = []
-    freqs = None
-    for ts, npz_path in spectra_files:
-        try:
-            d = np.load(npz_path)
-            if freqs is None:
-                freqs = d["freqs"]
-            spectra.append(d["magnitude"])
-        except Exception as e:
-            logging.warning(f"Could not load {npz_path}: {e}")
-
-    if not spectra:
-        logging.error("No spectra loaded for waterfall plot.")
-        return
+    tiles = WaterfallTiles(os.path.join(spec_dir, store_name))
+    if not tiles.up_to_date():
+        tiles.build()
 
-    waterfall = np.vstack(spectra)
-    plt.figure(figsize=(10, 6))
+    # Saved image: the finest tile level that still fits the figure's pixels
+    # (full resolution unless the run is longer than about 3000 spectra)
+    fig_w, fig_h, dpi = 10, 6, 150
+    k = tiles.choose_level(tiles.meta['n_times'], tiles.meta['n_freq'], fig_h * dpi, fig_w * dpi)
+    _, level_freqs, image = tiles.level_image(k)
+    plt.figure(figsize=(fig_w, fig_h))
     plt.imshow(
-        waterfall,
+        image,
         aspect="auto",
-        extent=[freqs[0], freqs[-1], 0, len(waterfall)],
+        extent=[level_freqs[0], level_freqs[-1], 0, tiles.meta['n_times']],
         origin="lower",
         cmap="viridis"
     )
     plt.xlabel("Frequency (MHz)")
     plt.ylabel("Time (record index)")
-    plt.title("Waterfall Plot")
+    plt.title("Waterfall Plot" if k == 0 else f"Waterfall Plot (mean of {2 ** k} x {2 ** k} cells)")
     plt.colorbar(label="Magnitude")
     out_img = os.path.join(spec_dir, "waterfall.png")
-    plt.savefig(out_img, dpi=150)
-    plt.show()
+    plt.savefig(out_img, dpi=dpi)
+    plt.close()
     logging.info(f"Waterfall plot saved to {out_img}")
 
+    # Interactive browser: zooming loads full-resolution tiles
+    WaterfallViewer(tiles).show("Waterfall Plot")
 
     # Plot average spectrum
-    avg_spectrum = np.mean(waterfall, axis=0)
+    avg_spectrum = spec_sum / n_spectra
     plt.figure(figsize=(8, 4))
     plt.plot(freqs, avg_spectrum)
     plt.xlabel("Frequency (MHz)")
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+# spectrogram_store.py - Appendable binary time x frequency store for processed spectra
+# One directory per spectrogram: meta.json, the frequency axis (freqs.npy) written once,
+# float64 time stamps (times.f64) and the spectra as raw float32/float16 rows (data.bin).
+# Blocks of spectra are appended with a single write; readers memory-map the rows and
+# slice by time and frequency range with binary searches. CSV is an export, not a format.
+
+import os
+import sys
+import json
+import argparse
+import numpy as np
+
+META_NAME = "meta.json"
+FREQS_NAME = "freqs.npy"
+TIMES_NAME = "times.f64"
+DATA_NAME = "data.bin"
+FORMAT_VERSION = 1
+DEFAULT_CSV_LIMIT = 2_000_000  # cells; larger exports must be requested explicitly
+
+
+class SpectrogramStore:
+    """
+    Time x frequency spectrogram kept as appendable binary files.
+
+    Parameters:
+    -----------
+    path : str
+        Store directory
+    mode : str
+        'r' read only, 'w' create (replacing an existing store) or 'a' append
+        to an existing store, creating it if needed
+    freqs : numpy.ndarray, optional
+        Frequency axis; required when creating a store
+    dtype : str
+        Storage type of the spectra, 'float32' or 'float16'
+    metadata : dict, optional
+        Extra JSON-serialisable values stored in meta.json (units, source, ...)
+    """
+
+    def __init__(self, path, mode='r', freqs=None, dtype='float32', metadata=None):
+        self.path = path
+        self.mode = mode
+        meta_path = os.path.join(path, META_NAME)
+        if mode == 'w' or (mode == 'a' and not os.path.exists(meta_path)):
+            if freqs is None:
+                raise ValueError("freqs are required to create a spectrogram store")
+            if np.dtype(dtype) not in (np.float32, np.float16):
+                raise ValueError(f"Unsupported storage dtype: {dtype}")
+            os.makedirs(path, exist_ok=True)
+            for name in (TIMES_NAME, DATA_NAME):
+                open(os.path.join(path, name), 'wb').close()
+            np.save(os.path.join(path, FREQS_NAME), np.asarray(freqs, dtype=np.float64))
+            meta = {'version': FORMAT_VERSION, 'n_freq': int(len(freqs)),
+                    'dtype': np.dtype(dtype).name, 'metadata': metadata or {}}
+            with open(meta_path, 'w') as f:
+                json.dump(meta, f, indent=2)
+        elif mode not in ('r', 'a'):
+            raise ValueError(f"Invalid mode: {mode}")
+
+        with open(meta_path, 'r') as f:
+            meta = json.load(f)
+        self.n_freq = meta['n_freq']
+        self.dtype = np.dtype(meta['dtype'])
+        self.metadata = meta.get('metadata', {})
+        self.freqs = np.load(os.path.join(path, FREQS_NAME))
+
+        self._times_file = self._data_file = None
+        if mode != 'r':
+            self._truncate_partial()
+            self._times_file = open(os.path.join(path, TIMES_NAME), 'ab')
+            self._data_file = open(os.path.join(path, DATA_NAME), 'ab')
+        self._times = None
+        self._data = None
+
+    def _truncate_partial(self):
+        """Drop rows left half-written by an interrupted append."""
+        n = self.n_times
+        tp, dp = (os.path.join(self.path, name) for name in (TIMES_NAME, DATA_NAME))
+        if os.path.getsize(tp) != n * 8:
+            os.truncate(tp, n * 8)
+        row = self.n_freq * self.dtype.itemsize
+        if os.path.getsize(dp) != n * row:
+            os.truncate(dp, n * row)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        for f in (self._times_file, self._data_file):
+            if f is not None:
+                f.close()
+        self._times_file = self._data_file = None
+        self._times = self._data = None
+
+    # --- writing ---
+
+    def append(self, times, spectra):
+        """
+        Append a block of spectra.
+
+        Parameters:
+        -----------
+        times : numpy.ndarray
+            Time stamp of each row, shape (n,), non-decreasing
+        spectra : numpy.ndarray
+            Spectra of shape (n, n_freq); converted to the storage dtype
+        """
+        if self._data_file is None:
+            raise IOError("Spectrogram store is not open for writing")
+        spectra = np.asarray(spectra)
+        if spectra.ndim == 1:
+            spectra = spectra[None, :]
+        times = np.atleast_1d(np.asarray(times, dtype='<f8'))
+        if spectra.shape != (len(times), self.n_freq):
+            raise ValueError(f"Expected spectra of shape ({len(times)}, {self.n_freq}), "
+                             f"got {spectra.shape}")
+        with np.errstate(over='ignore'):
+            rows = np.ascontiguousarray(spectra, dtype=self.dtype.newbyteorder('<'))
+        if rows.dtype.itemsize < spectra.dtype.itemsize and np.any(np.isinf(rows) & np.isfinite(spectra)):
+            raise ValueError(f"Spectra exceed the {self.dtype.name} range (max {np.finfo(self.dtype).max:g}); "
+                             f"store dB or normalised values, or use float32")
+        # data first: the committed row count follows the time stamps
+        self._data_file.write(rows.tobytes())
+        self._times_file.write(times.tobytes())
+        self._times = self._data = None
+
+    def flush(self):
+        for f in (self._data_file, self._times_file):
+            if f is not None:
+                f.flush()
+
+    # --- reading ---
+
+    @property
+    def n_times(self):
+        self.flush()
+        n_t = os.path.getsize(os.path.join(self.path, TIMES_NAME)) // 8
+        n_d = os.path.getsize(os.path.join(self.path, DATA_NAME)) // (self.n_freq * self.dtype.itemsize)
+        return min(n_t, n_d)
+
+    def _maps(self):
+        if self._times is None:
+            n = self.n_times
+            if n == 0:
+                self._times = np.zeros(0, dtype=np.float64)
+                self._data = np.zeros((0, self.n_freq), dtype=self.dtype)
+            else:
+                self._times = np.memmap(os.path.join(self.path, TIMES_NAME), dtype='<f8',
+                                        mode='r', shape=(n,))
+                self._data = np.memmap(os.path.join(self.path, DATA_NAME),
+                                       dtype=self.dtype.newbyteorder('<'), mode='r',
+                                       shape=(n, self.n_freq))
+        return self._times, self._data
+
+    @property
+    def times(self):
+        """Memory-mapped time stamps of all rows."""
+        return self._maps()[0]
+
+    @property
+    def data(self):
+        """Memory-mapped spectra of all rows, shape (n_times, n_freq)."""
+        return self._maps()[1]
+
+    def index_range(self, t_start=None, t_stop=None, f_start=None, f_stop=None):
+        """Row and column slices covering [t_start, t_stop] x [f_start, f_stop]."""
+        times = self.times
+        i0 = 0 if t_start is None else int(np.searchsorted(times, t_start, side='left'))
+        i1 = len(times) if t_stop is None else int(np.searchsorted(times, t_stop, side='right'))
+        freqs = self.freqs
+        ascending = len(freqs) < 2 or freqs[-1] >= freqs[0]
+        f = freqs if ascending else freqs[::-1]
+        j0 = 0 if f_start is None else int(np.searchsorted(f, f_start, side='left'))
+        j1 = len(f) if f_stop is None else int(np.searchsorted(f, f_stop, side='right'))
+        if not ascending:
+            j0, j1 = len(f) - j1, len(f) - j0
+        return slice(i0, i1), slice(j0, j1)
+
+    def read(self, t_start=None, t_stop=None, f_start=None, f_stop=None, step=1):
+        """
+        Read a time/frequency window.
+
+        Parameters:
+        -----------
+        t_start, t_stop : float, optional
+            Inclusive time range in the store's time units
+        f_start, f_stop : float, optional
+            Inclusive frequency range in the store's frequency units
+        step : int
+            Keep every step-th row (for quick looks at long ranges)
+
+        Returns:
+        --------
+        (numpy.ndarray, numpy.ndarray, numpy.ndarray)
+            Times, frequencies and the spectra window as float32
+        """
+        rows, cols = self.index_range(t_start, t_stop, f_start, f_stop)
+        rows = slice(rows.start, rows.stop, step)
+        return (np.array(self.times[rows]), self.freqs[cols],
+                np.asarray(self.data[rows, cols], dtype=np.float32))
+
+    def export_csv(self, out_path, t_start=None, t_stop=None, f_start=None, f_stop=None,
+                   db=True, max_cells=DEFAULT_CSV_LIMIT):
+        """
+        Write a window as CSV: a header row of frequencies, then one row per spectrum
+        starting with its time stamp.
+
+        Returns:
+        --------
+        int
+            Number of rows written
+        """
+        times, freqs, data = self.read(t_start, t_stop, f_start, f_stop)
+        if max_cells and data.size > max_cells:
+            raise ValueError(f"Export of {data.shape[0]} x {data.shape[1]} values exceeds "
+                             f"max_cells={max_cells}; narrow the time/frequency range")
+        stored_db = self.metadata.get('quantity') == 'power_db'
+        if db and not stored_db:
+            data = 10 * np.log10(data + 1e-12)
+        elif not db and stored_db:
+            data = 10 ** (data / 10)
+        table = np.column_stack([times, data])
+        header = 'Time,' + ','.join(f'{f:.6f}' for f in freqs)
+        np.savetxt(out_path, table, delimiter=',', fmt='%.6g', header=header, comments='')
+        return len(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect or export a spectrogram store')
+    parser.add_argument('store', help='Spectrogram store directory')
+    parser.add_argument('--t-start', type=float, help='Start time')
+    parser.add_argument('--t-stop', type=float, help='Stop time')
+    parser.add_argument('--f-start', type=float, help='Start frequency')
+    parser.add_argument('--f-stop', type=float, help='Stop frequency')
+    parser.add_argument('--csv', help='Export the selected window to this CSV file')
+    parser.add_argument('--linear', action='store_true', help='Export linear power instead of dB')
+    parser.add_argument('--force', action='store_true', help='Allow large CSV exports')
+    args = parser.parse_args()
+
+    if not os.path.exists(os.path.join(args.store, META_NAME)):
+        print(f"Error: '{args.store}' is not a spectrogram store")
+        sys.exit(1)
+    with SpectrogramStore(args.store) as store:
+        times = store.times
+        print(f"{store.n_times} spectra x {store.n_freq} bins ({store.dtype.name})")
+        if len(times):
+            print(f"Time: {times[0]:.6f} .. {times[-1]:.6f}")
+        print(f"Frequency: {store.freqs[0]:.6f} .. {store.freqs[-1]:.6f}")
+        for k, v in store.metadata.items():
+            print(f"  {k}: {v}")
+        if args.csv:
+            try:
+                n = store.export_csv(args.csv, args.t_start, args.t_stop, args.f_start,
+                                     args.f_stop, db=not args.linear,
+                                     max_cells=None if args.force else DEFAULT_CSV_LIMIT)
+            except ValueError as e:
+                print(f"Error: {e}")
+                sys.exit(1)
+            print(f"Exported {n} rows to {args.csv}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,21 +1,35 @@
-import os
 import numpy as np
 import matplotlib.pyplot as plt
 from datetime import datetime, date, time
-from tqdm import tqdm
-from matplotlib.dates import DateFormatter
+from matplotlib.dates import DateFormatter, num2date
+from trace_accumulator import TraceAccumulator
+from dump_index import DumpIndex
+from power_pyramid import PowerPyramid
 
 DUMP_DIR = "LIVE_DISPLAY_DUMP"
+PLOT_POINTS = 2000  # points per power plot; zooming re-reads the pyramid at this resolution
 
-def _list_dumps():
-    files = [f for f in os.listdir(DUMP_DIR) if f.startswith("dump_") and f.endswith(".npz")]
-    files.sort()
-    return [os.path.join(DUMP_DIR, f) for f in files]
+def _load_index():
+    # brings the persistent time index up to date (reads only new dumps)
+    index = DumpIndex(DUMP_DIR)
+    added = index.update()
+    if added:
+        print(f"Indexed {added} new records ({len(index)} in total)")
+    return index
 
-def _parse_dt(fname):
-    # fname: .../dump_YYYYMMDD_HHMMSS_ffffff.npz
-    base = os.path.basename(fname)[5:-4]
-    return datetime.strptime(base, "%Y%m%d_%H%M%S_%f")
+def _local_datetimes(time_us):
+    # POSIX microseconds -> local datetime64 for plotting
+    if len(time_us) == 0:
+        return np.array([], dtype='datetime64[us]')
+    offset = datetime.fromtimestamp(time_us[0] / 1e6).astimezone().utcoffset()
+    return (np.asarray(time_us, dtype=np.int64) + int(offset.total_seconds() * 1e6)).astype('datetime64[us]')
+
+def _level_label(width):
+    return "raw records" if width == 0 else f"{width:g} s bins (mean, min-max)"
+
+def _axis_to_posix(x):
+    # matplotlib date number of a local datetime64 -> POSIX seconds
+    return num2date(x).replace(tzinfo=None).timestamp()
 
 def mode_plot_power():
     # prompt for interval (empty → today’s start/end)
@@ -42,24 +56,18 @@ def mode_plot_power():
         print("Start time is after end time.")
         return
 
-    dumps = _list_dumps()
-    # filter dumps in interval
-    selected = []
-    for fn in dumps:
-        dt = _parse_dt(fn)
-        if start <= dt <= end:
-            selected.append((dt, fn))
-    if not selected:
+    index = _load_index()
+    sl = index.range(start, end)
+    if sl.stop <= sl.start:
         print(f"No dump files between {start_ts} and {end_ts}.")
         return
+    pyramid = PowerPyramid(index)
+    pyramid.update()
 
-    # build datetime and power lists
-    times = [dt for dt, fn in selected]
-    powers = []
-    for dt, fn in tqdm(selected, desc="Loading power data"):
-        powers.append(np.load(fn)["power"])
+    # screen-resolution power from the pyramid (raw records once zoomed in far enough)
+    q = pyramid.query(start.timestamp(), end.timestamp(), PLOT_POINTS)
     # ask reference power for 0 dB
-    default_p0 = np.median(powers)
+    default_p0 = np.median(q['mean'])
     p0_str = input(f"Enter P_0 dB reference value [default: {default_p0}]: ").strip()
     if p0_str:
         try:
@@ -69,19 +77,40 @@ def mode_plot_power():
             return
     else:
         p0 = default_p0
-    powers_db = 10 * np.log10(np.array(powers) / p0)
+
+    def to_db(x):
+        return 10 * np.log10(x / p0)
+
+    times = _local_datetimes(np.round(q['time'] * 1e6))
     plt.figure()
-    plt.plot(times, powers_db, 'o-')
+    line, = plt.plot(times, to_db(q['mean']), 'o-' if q['width'] == 0 else '-')
     ax = plt.gca()
-    if times[0].date() == times[-1].date():
+    band = [ax.fill_between(times, to_db(q['min']), to_db(q['max']), alpha=0.3)] if q['width'] else [None]
+
+    def on_xlim(ax):
+        # reload the visible range at the matching pyramid level
+        x0, x1 = ax.get_xlim()
+        q = pyramid.query(_axis_to_posix(x0), _axis_to_posix(x1), PLOT_POINTS)
+        if not len(q['time']):
+            return
+        t = _local_datetimes(np.round(q['time'] * 1e6))
+        line.set_data(t, to_db(q['mean']))
+        line.set_marker('o' if q['width'] == 0 else '')
+        if band[0] is not None:
+            band[0].remove()
+        band[0] = ax.fill_between(t, to_db(q['min']), to_db(q['max']), alpha=0.3) if q['width'] else None
+        ax.set_title(f"Recorded Power ({_level_label(q['width'])})")
+
+    if times[0].astype(datetime).date() == times[-1].astype(datetime).date():
         ax.xaxis.set_major_formatter(DateFormatter("%H:%M:%S"))
     else:
         ax.xaxis.set_major_formatter(DateFormatter("%Y-%m-%d %H:%M:%S"))
     plt.gcf().autofmt_xdate()           # format date labels
     plt.xlabel("Time")
     plt.ylabel("Power (dB re P0)")
-    plt.title(f"Recorded Power")
+    plt.title(f"Recorded Power ({_level_label(q['width'])})")
     plt.grid(True)
+    ax.callbacks.connect('xlim_changed', on_xlim)
     plt.show()
 
 def mode_avg_fft():
@@ -91,19 +120,21 @@ def mode_avg_fft():
     except ValueError:
         print("Bad format.")
         return
-    files = _list_dumps()
-    specs = []
-    freqs = None
-    for fn in files:
-        dt = _parse_dt(fn)
-        if abs((dt - target).total_seconds()) <= 10:
-            data = np.load(fn)
-            specs.append(data["fft"])
-            freqs = data["freq"]
-    if not specs:
+    index = _load_index()
+    sl = index.range(target.timestamp() - 10, target.timestamp() + 10)
+    if sl.stop <= sl.start:
         print("No dumps within ±10 s of", target)
         return
-    avg_spec = np.mean(specs, axis=0)
+    acc = None
+    freqs = None
+    for freqs, spec in index.iter_spectra(sl):
+        if acc is None:
+            acc = TraceAccumulator(len(spec), mode='average', window=sl.stop - sl.start)
+        acc.update(spec)
+    if acc is None:
+        print("No spectra stored within ±10 s of", target)
+        return
+    avg_spec = acc.trace
     plt.figure()
     plt.plot(freqs, avg_spec)
     plt.xlabel("Frequency (Hz)")
@@ -97,7 +97,10 @@ exerr(rsa.IFSTREAM_SetDiskFilePath(c_char_p(output_dir.encode('utf-8'))))  # Set
 exerr(rsa.IFSTREAM_SetDiskFilenameBase(c_char_p(b"if_capture")))
 exerr(rsa.IFSTREAM_SetDiskFilenameSuffix(c_int(1)))  # IFSSDFN_SUFFIX_TIMESTAMP
 exerr(rsa.IFSTREAM_SetDiskFileLength(c_long(observation_duration)))
-exerr(rsa.IFSTREAM_SetDiskFileMode(c_int(0)))         # StreamingModeFormatted
+# 0 = StreamingModeFormatted, 1 = StreamingModeFramed (per-frame footers with
+# sequence number, timestamp and status; check with `python r3f_reader.py <file>.r3f`)
+file_mode = 0
+exerr(rsa.IFSTREAM_SetDiskFileMode(c_int(file_mode)))
 exerr(rsa.IFSTREAM_SetDiskFileCount(c_int(num_files_to_keep)))  # Number of files to keep
 print("IF streaming parameters configured.")
 
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# trace_accumulator.py - Host-side spectral trace accumulation (average / max-hold / min-hold)
+# Mirrors the DPX TraceType modes of RSA_API.h for spectra computed in Python, plus an
+# exponential average. All state lives in preallocated arrays; each update is O(bins).
+
+import numpy as np
+
+# TraceType values from RSA_API.h, plus a host-only exponential mode
+TRACE_AVERAGE = 0
+TRACE_MAXHOLD = 1
+TRACE_MINHOLD = 2
+TRACE_EXPONENTIAL = 3
+
+MODE_NAMES = {
+    'average': TRACE_AVERAGE,
+    'boxcar': TRACE_AVERAGE,
+    'maxhold': TRACE_MAXHOLD,
+    'minhold': TRACE_MINHOLD,
+    'exponential': TRACE_EXPONENTIAL,
+}
+
+
+class TraceAccumulator:
+    """
+    Running spectral trace over a stream of equal-length spectra.
+
+    Parameters:
+    -----------
+    n_bins : int
+        Number of frequency bins per spectrum
+    mode : str or int
+        'average' (boxcar over the last `window` spectra), 'exponential',
+        'maxhold' or 'minhold', or the matching TRACE_* / TraceType value
+    window : int
+        Boxcar length; also sets the default exponential weight 2/(window+1)
+    alpha : float, optional
+        Weight of the newest spectrum in exponential mode
+    resum_every : int
+        In average mode the running sum is rebuilt from the ring buffer after
+        this many windows, so add/subtract rounding error cannot build up
+    """
+
+    def __init__(self, n_bins, mode='average', window=20, alpha=None, resum_every=64):
+        self.n_bins = n_bins
+        self.mode = MODE_NAMES[mode] if isinstance(mode, str) else int(mode)
+        if self.mode not in MODE_NAMES.values():
+            raise ValueError(f"Unknown trace mode: {mode}")
+        self.window = window
+        self.alpha = 2.0 / (window + 1) if alpha is None else alpha
+        self._resum_period = window * resum_every
+
+        self._acc = np.zeros(n_bins, dtype=np.float64)
+        self._out = np.zeros(n_bins, dtype=np.float64)
+        if self.mode == TRACE_AVERAGE:
+            self._ring = np.zeros((window, n_bins), dtype=np.float64)
+        self.reset()
+
+    def reset(self):
+        """Discard all accumulated spectra."""
+        self._acc.fill(0.0)
+        if self.mode == TRACE_AVERAGE:
+            self._ring.fill(0.0)
+        self._head = 0
+        self.count = 0
+
+    def update(self, spectrum):
+        """
+        Add one spectrum and return the current trace.
+
+        The returned array is owned by the accumulator and overwritten by the
+        next call; copy it if it must be kept.
+        """
+        spectrum = np.asarray(spectrum)
+        mode = self.mode
+        if mode == TRACE_AVERAGE:
+            slot = self._ring[self._head]
+            self._acc -= slot
+            slot[:] = spectrum
+            self._acc += slot
+            self._head = (self._head + 1) % self.window
+            self.count += 1
+            if self.count % self._resum_period == 0:
+                self._ring.sum(axis=0, out=self._acc)
+        elif self.count == 0:
+            self._acc[:] = spectrum
+            self.count = 1
+        else:
+            if mode == TRACE_MAXHOLD:
+                np.maximum(self._acc, spectrum, out=self._acc)
+            elif mode == TRACE_MINHOLD:
+                np.minimum(self._acc, spectrum, out=self._acc)
+            else:
+                self._acc += self.alpha * (spectrum - self._acc)
+            self.count += 1
+        return self.trace
+
+    def update_many(self, spectra):
+        """
+        Add a block of spectra of shape (n_spectra, n_bins), oldest first.
+
+        Hold modes reduce the block in one pass and boxcar averaging only keeps
+        the rows that remain in the window, so offline tools can feed whole
+        waterfalls at once. Returns the current trace.
+        """
+        spectra = np.asarray(spectra)
+        if len(spectra) == 0:
+            return self.trace
+        if self.mode in (TRACE_MAXHOLD, TRACE_MINHOLD):
+            reduce = np.max if self.mode == TRACE_MAXHOLD else np.min
+            n = len(spectra)
+            self.update(reduce(spectra, axis=0))
+            self.count += n - 1
+            return self.trace
+        if self.mode == TRACE_AVERAGE and len(spectra) >= self.window:
+            tail = spectra[-self.window:]
+            self._ring[:] = tail
+            self._ring.sum(axis=0, out=self._acc)
+            self._head = 0
+            self.count += len(spectra)
+            return self.trace
+        for s in spectra:
+            self.update(s)
+        return self.trace
+
+    @property
+    def trace(self):
+        """Current accumulated trace (zeros before the first update)."""
+        if self.mode == TRACE_AVERAGE:
+            n = min(self.count, self.window)
+            if n:
+                np.divide(self._acc, n, out=self._out)
+            else:
+                self._out.fill(0.0)
+        else:
+            self._out[:] = self._acc
+        return self._out
@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+# waterfall_tiles.py - Tiled multi-resolution waterfall for archived spectrograms
+# A SpectrogramStore is cut into fixed-size time x frequency tiles. Level 0 is the full
+# resolution, read straight from the store's memory-mapped rows; each further level halves
+# both axes (mean of 2 x 2 cells) until one tile covers everything. Those levels are one
+# .npy each, of shape (tiles_t, tiles_f, tile, tile) in tile-major order, so a tile is one
+# contiguous read. The viewer picks the level that
+# matches the screen resolution of the current view, loads the visible tiles in a
+# background thread and keeps a bounded LRU cache, so browsing a night's waterfall
+# touches only what is on screen.
+
+import os
+import sys
+import json
+import queue
+import argparse
+import threading
+from collections import OrderedDict
+import numpy as np
+from numpy.lib import format as npy_format
+
+from spectrogram_store import SpectrogramStore, DATA_NAME
+
+TILES_DIR = "tiles"
+META_NAME = "tiles.json"
+DEFAULT_TILE = 256
+TILES_VERSION = 2
+
+
+def _halve(block):
+    """Mean of 2 x 2 cells (NaN-aware, odd edges keep their single row/column)."""
+    n_t, n_f = block.shape
+    if n_t % 2:
+        block = np.vstack([block, np.full((1, n_f), np.nan, dtype=block.dtype)])
+    if n_f % 2:
+        block = np.hstack([block, np.full((block.shape[0], 1), np.nan, dtype=block.dtype)])
+    b = block.reshape(block.shape[0] // 2, 2, block.shape[1] // 2, 2)
+    valid = np.isfinite(b)
+    total = np.where(valid, b, 0).sum(axis=(1, 3), dtype=np.float64)
+    count = valid.sum(axis=(1, 3))
+    out = np.full(total.shape, np.nan, dtype=np.float32)
+    np.divide(total, count, out=out, where=count > 0, casting='unsafe')
+    return out
+
+
+def _halve_axis(x):
+    if len(x) % 2:
+        x = np.append(x, x[-1])
+    return x.reshape(-1, 2).mean(axis=1)
+
+
+class WaterfallTiles:
+    """
+    Tile pyramid of a spectrogram store.
+
+    Parameters:
+    -----------
+    store_path : str
+        SpectrogramStore directory; tiles are kept in <store>/tiles
+    """
+
+    def __init__(self, store_path):
+        self.store_path = store_path
+        self.path = os.path.join(store_path, TILES_DIR)
+        self.meta = None
+        meta_path = os.path.join(self.path, META_NAME)
+        if os.path.exists(meta_path):
+            with open(meta_path, 'r') as f:
+                self.meta = json.load(f)
+        self._levels = {}
+        self._store = None
+
+    def up_to_date(self):
+        if self.meta is None or self.meta.get('version') != TILES_VERSION:
+            return False
+        with SpectrogramStore(self.store_path) as store:
+            return self.meta['n_times'] == store.n_times and self.meta.get('data_mtime_ns') == \
+                os.stat(os.path.join(self.store_path, DATA_NAME)).st_mtime_ns
+
+    def build(self, tile=DEFAULT_TILE):
+        """
+        (Re)build every level above level 0 from the store.
+
+        Each level is produced from the one below, 2 x tile rows at a time, so
+        memory stays at a few tile rows whatever the length of the store.
+        Level 0 is not copied: its tiles are cut from the store on demand.
+        """
+        os.makedirs(self.path, exist_ok=True)
+        meta_path = os.path.join(self.path, META_NAME)
+        if os.path.exists(meta_path):
+            os.remove(meta_path)  # invalid until the build completes
+        store = SpectrogramStore(self.store_path)
+        n_t, n_f = store.n_times, store.n_freq
+        if n_t == 0:
+            raise ValueError(f"Spectrogram store {self.store_path} is empty")
+        times, freqs = np.asarray(store.times, dtype=np.float64), np.asarray(store.freqs, dtype=np.float64)
+        levels = [{'rows': n_t, 'cols': n_f, 'tiles_t': -(-n_t // tile), 'tiles_f': -(-n_f // tile)}]
+        for name in ('level', 'times', 'freqs'):
+            stale = os.path.join(self.path, f"{name}_0.npy")
+            if os.path.exists(stale):
+                os.remove(stale)  # level 0 of an older version
+        prev, prev_rows, prev_cols = None, n_t, n_f
+        k = 0
+        while levels[-1]['tiles_t'] > 1 or levels[-1]['tiles_f'] > 1:
+            k += 1
+            times, freqs = _halve_axis(times), _halve_axis(freqs)
+            rows, cols = len(times), len(freqs)
+            nt, nf = -(-rows // tile), -(-cols // tile)
+            out = npy_format.open_memmap(os.path.join(self.path, f"level_{k}.npy"), mode='w+',
+                                         dtype=np.float32, shape=(nt, nf, tile, tile))
+            for i in range(nt):
+                r0, r1 = i * tile, min((i + 1) * tile, rows)
+                s0, s1 = 2 * r0, min(2 * r1, prev_rows)
+                if prev is None:
+                    src = np.asarray(store.data[s0:s1], dtype=np.float32)
+                else:
+                    src = self._rows(prev, s0, s1, prev_cols, tile)
+                band = np.full((tile, nf * tile), np.nan, dtype=np.float32)
+                band[:r1 - r0, :cols] = _halve(src)
+                out[i] = band.reshape(tile, nf, tile).transpose(1, 0, 2)
+            out.flush()
+            np.save(os.path.join(self.path, f"times_{k}.npy"), times)
+            np.save(os.path.join(self.path, f"freqs_{k}.npy"), freqs)
+            levels.append({'rows': rows, 'cols': cols, 'tiles_t': nt, 'tiles_f': nf})
+            prev, prev_rows, prev_cols = out, rows, cols
+        self.meta = {'version': TILES_VERSION, 'tile': tile, 'n_times': n_t, 'n_freq': n_f,
+                     'data_mtime_ns': os.stat(os.path.join(self.store_path, DATA_NAME)).st_mtime_ns,
+                     'levels': levels, 'metadata': store.metadata}
+        store.close()
+        tmp = meta_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.meta, f, indent=2)
+        os.replace(tmp, meta_path)
+        self._levels = {}
+        self._store = None
+
+    @staticmethod
+    def _rows(level, r0, r1, cols, tile):
+        """Rows r0..r1 (all columns) of a tiled level array as a plain 2-D block."""
+        i0, i1 = r0 // tile, -(-r1 // tile)
+        band = np.asarray(level[i0:i1]).transpose(0, 2, 1, 3).reshape((i1 - i0) * tile, -1)
+        return band[r0 - i0 * tile:r1 - i0 * tile, :cols]
+
+    @property
+    def n_levels(self):
+        return len(self.meta['levels'])
+
+    @property
+    def tile(self):
+        return self.meta['tile']
+
+    def level(self, k):
+        """(data, times, freqs) of level k; level 0 data is the store's (n_times, n_freq) rows."""
+        if k not in self._levels:
+            if k == 0:
+                if self._store is None:
+                    self._store = SpectrogramStore(self.store_path)
+                n = self.meta['n_times']
+                self._levels[0] = (self._store.data[:n], self._store.times[:n], self._store.freqs)
+            else:
+                self._levels[k] = tuple(np.load(os.path.join(self.path, f"{name}_{k}.npy"), mmap_mode='r')
+                                        for name in ('level', 'times', 'freqs'))
+        return self._levels[k]
+
+    def load_tile(self, k, i, j):
+        """Tile (i, j) of level k cropped to its valid rows/columns, with its time and frequency axes."""
+        data, times, freqs = self.level(k)
+        t = self.tile
+        times = times[i * t:(i + 1) * t]
+        freqs = freqs[j * t:(j + 1) * t]
+        if k == 0:
+            block = data[i * t:i * t + len(times), j * t:j * t + len(freqs)]
+        else:
+            block = data[i, j, :len(times), :len(freqs)]
+        return np.array(times), np.array(freqs), np.array(block, dtype=np.float32)
+
+    def level_image(self, k):
+        """Whole level k as (times, freqs, 2-D float32 array); pick k with choose_level() to bound memory."""
+        data, times, freqs = self.level(k)
+        if k == 0:
+            image = np.array(data, dtype=np.float32)
+        else:
+            lv = self.meta['levels'][k]
+            image = self._rows(data, 0, lv['rows'], lv['cols'], self.tile)
+        return np.array(times), np.array(freqs), image
+
+    def choose_level(self, n_rows_visible, n_cols_visible, px_h, px_w):
+        """Finest level whose visible cells are not much more than the screen pixels."""
+        for k in range(self.n_levels):
+            scale = 2 ** k
+            if n_rows_visible / scale <= 2 * px_h and n_cols_visible / scale <= 2 * px_w:
+                return k
+        return self.n_levels - 1
+
+
+class WaterfallViewer:
+    """
+    Matplotlib waterfall browser over WaterfallTiles.
+
+    Visible tiles of the level matching the view are requested on every zoom
+    or pan and loaded by a worker thread; a canvas timer adds them to the plot.
+    The coarsest level is always drawn underneath as a placeholder.
+
+    Parameters:
+    -----------
+    tiles : WaterfallTiles
+        Built tile pyramid
+    cache_tiles : int
+        Tiles kept in memory (LRU)
+    db : bool
+        Show 10*log10 of the stored power (stores of dB values are shown as they are)
+    """
+
+    def __init__(self, tiles, cache_tiles=256, db=True):
+        import matplotlib.pyplot as plt
+        self.plt = plt
+        self.tiles = tiles
+        stored_db = tiles.meta.get('metadata', {}).get('quantity') == 'power_db'
+        self.db = db and not stored_db
+        self.cache = OrderedDict()
+        self.cache_tiles = cache_tiles
+        self.requests = queue.LifoQueue()  # newest view first
+        self.results = queue.Queue()
+        self.pending = set()
+        self.lock = threading.Lock()
+        self.images = {}
+        self.wanted = set()
+        self.t0 = float(tiles.level(0)[1][0])
+        self.worker = threading.Thread(target=self._work, daemon=True)
+        self.worker.start()
+
+        top = tiles.n_levels - 1
+        t, f, d = tiles.load_tile(top, 0, 0)
+        d = self._scale(d)
+        finite = d[np.isfinite(d)]
+        self.vmin, self.vmax = (np.percentile(finite, [1, 99.5]) if finite.size else (0, 1))
+        self.fig, self.ax = plt.subplots(figsize=(10, 6))
+        self.base = self._draw(t, f, d, zorder=0)
+        self.ax.set_autoscale_on(False)  # tiles must not move the view they were drawn for
+        self.fig.colorbar(self.base, ax=self.ax, label='Power (dB)' if db or stored_db else 'Power')
+        units = tiles.meta.get('metadata', {})
+        self.ax.set_xlabel(f"Frequency ({units.get('freq_unit', 'MHz')})")
+        self.ax.set_ylabel(f"Time since start ({units.get('time_unit', 's')})")
+        self.ax.callbacks.connect('xlim_changed', self._on_view)
+        self.ax.callbacks.connect('ylim_changed', self._on_view)
+        self.timer = self.fig.canvas.new_timer(interval=50)
+        self.timer.add_callback(self._poll)
+        self.timer.start()
+        self._on_view(self.ax)
+
+    def _scale(self, d):
+        if not self.db:
+            return d
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return 10 * np.log10(np.maximum(d, 1e-30))
+
+    def _draw(self, t, f, d, zorder=1):
+        dt = (t[-1] - t[0]) / max(len(t) - 1, 1) if len(t) > 1 else 1.0
+        df = (f[-1] - f[0]) / max(len(f) - 1, 1) if len(f) > 1 else 1.0
+        extent = [f[0] - df / 2, f[-1] + df / 2, t[0] - self.t0 - dt / 2, t[-1] - self.t0 + dt / 2]
+        return self.ax.imshow(d, origin='lower', aspect='auto', extent=extent, interpolation='nearest',
+                              vmin=self.vmin, vmax=self.vmax, zorder=zorder, cmap='viridis')
+
+    def _work(self):
+        while True:
+            key = self.requests.get()
+            if key is None:
+                return
+            with self.lock:
+                if key not in self.wanted:
+                    self.pending.discard(key)
+                    continue  # view moved on before we got to it
+            t, f, d = self.tiles.load_tile(*key)
+            self.results.put((key, (t, f, self._scale(d))))
+
+    def _visible(self):
+        """Level and tile keys covering the current view."""
+        tiles = self.tiles
+        x0, x1 = sorted(self.ax.get_xlim())
+        y0, y1 = sorted(self.ax.get_ylim())
+        _, times0, freqs0 = tiles.level(0)
+        r0, r1 = np.searchsorted(times0 - self.t0, [y0, y1])
+        asc = freqs0[-1] >= freqs0[0]
+        c0, c1 = np.searchsorted(freqs0 if asc else -freqs0, [x0, x1] if asc else [-x1, -x0])
+        bbox = self.ax.get_window_extent()
+        k = tiles.choose_level(max(r1 - r0, 1), max(c1 - c0, 1), bbox.height, bbox.width)
+        _, times, freqs = tiles.level(k)
+        t = tiles.tile
+        s = 2 ** k
+        i0, i1 = max(r0 // s - 1, 0) // t, min(-(-r1 // s) // t, tiles.meta['levels'][k]['tiles_t'] - 1)
+        j0, j1 = max(c0 // s - 1, 0) // t, min(-(-c1 // s) // t, tiles.meta['levels'][k]['tiles_f'] - 1)
+        return {(k, i, j) for i in range(i0, i1 + 1) for j in range(j0, j1 + 1)}
+
+    def _on_view(self, ax):
+        wanted = self._visible() if self.tiles.n_levels > 1 else set()
+        with self.lock:
+            self.wanted = wanted
+        for key in list(self.images):
+            if key not in wanted:
+                self.images.pop(key).remove()
+        for key in sorted(wanted, reverse=True):
+            if key in self.images:
+                continue
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                self.images[key] = self._draw(*self.cache[key])
+                continue
+            with self.lock:
+                if key in self.pending:
+                    continue
+                self.pending.add(key)
+            self.requests.put(key)
+
+    def _poll(self):
+        changed = False
+        while True:
+            try:
+                key, tile = self.results.get_nowait()
+            except queue.Empty:
+                break
+            with self.lock:
+                self.pending.discard(key)
+            self.cache[key] = tile
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.cache_tiles:
+                self.cache.popitem(last=False)
+            if key in self.wanted and key not in self.images:
+                self.images[key] = self._draw(*tile)
+                changed = True
+        if changed:
+            self.fig.canvas.draw_idle()
+
+    def show(self, title=None):
+        if title:
+            self.ax.set_title(title)
+        self.plt.show()
+        self.requests.put(None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build and browse a tiled waterfall of a spectrogram store')
+    parser.add_argument('store', nargs='?', default='IF_spectra_dump', help='SpectrogramStore directory')
+    parser.add_argument('--tile', type=int, default=DEFAULT_TILE, help='Tile size in cells')
+    parser.add_argument('--rebuild', action='store_true', help='Rebuild the tiles even if up to date')
+    parser.add_argument('--no-view', action='store_true', help='Only build the tiles')
+    parser.add_argument('--cache', type=int, default=256, help='Tiles kept in memory')
+    args = parser.parse_args()
+
+    if not os.path.exists(os.path.join(args.store, 'meta.json')):
+        print(f"Error: '{args.store}' is not a spectrogram store")
+        sys.exit(1)
+    tiles = WaterfallTiles(args.store)
+    if args.rebuild or not tiles.up_to_date():
+        print(f"Building tiles for {args.store}...")
+        tiles.build(args.tile)
+    levels = tiles.meta['levels']
+    print(f"{tiles.meta['n_times']} spectra x {tiles.meta['n_freq']} bins, {len(levels)} levels, "
+          f"{sum(l['tiles_t'] * l['tiles_f'] for l in levels)} tiles of {tiles.tile} x {tiles.tile}")
+    if not args.no_view:
+        WaterfallViewer(tiles, cache_tiles=args.cache).show(f"Waterfall ({args.store})")
+
+
+if __name__ == '__main__':
+    main()